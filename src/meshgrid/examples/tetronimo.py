@@ -128,19 +128,17 @@ class TetronimoGame(SquareGridGame):
         '''
 
         i,j = self.grid.loc[unit_id]
-        old_shape = self.grid.stats[unit_id,self.grid.STAT.SHAPE]
         new_shape = self.cw_mapper[self.grid.stats[unit_id,self.grid.STAT.SHAPE]]
 
+        token = self.grid.checkpoint()
         self.grid.remove_piece(unit_id)
-        
-        self.grid.stats[unit_id,self.grid.STAT.SHAPE] = new_shape
+        self.grid.set_stats(unit_id,self.grid.STAT.SHAPE,new_shape)
         placed = self.grid.place_piece(unit_id,i,j)
         if placed:
-            return True
+            self.grid.commit(token)
         else:
-            self.grid.stats[unit_id,self.grid.STAT.SHAPE] = old_shape
-            self.grid.place_piece(unit_id,i,j)
-            return False
+            self.grid.rollback(token) # put the piece back, in its old shape
+        return placed
     
     def rotate_piece_counterclockwise(self,unit_id):
         '''Rotate a piece with the given `unit_id` 90 degrees counterclockwise.
@@ -150,19 +148,17 @@ class TetronimoGame(SquareGridGame):
         '''
 
         i,j = self.grid.loc[unit_id]
-        old_shape = self.grid.stats[unit_id,self.grid.STAT.SHAPE]
         new_shape = self.ccw_mapper[self.grid.stats[unit_id,self.grid.STAT.SHAPE]]
 
+        token = self.grid.checkpoint()
         self.grid.remove_piece(unit_id)
-        
-        self.grid.stats[unit_id,self.grid.STAT.SHAPE] = new_shape
+        self.grid.set_stats(unit_id,self.grid.STAT.SHAPE,new_shape)
         placed = self.grid.place_piece(unit_id,i,j)
         if placed:
-            return True
+            self.grid.commit(token)
         else:
-            self.grid.stats[unit_id,self.grid.STAT.SHAPE] = old_shape
-            self.grid.place_piece(unit_id,i,j)
-            return False
+            self.grid.rollback(token) # put the piece back, in its old shape
+        return placed
     
     def new_active_piece(self):
         '''Place a new "active" piece at the top of the Board.
@@ -199,12 +195,12 @@ class TetronimoGame(SquareGridGame):
     def get_new_single_block_id(self):
         '''Get a new valid `unit_id` to use for a new "inactive" piece.
 
+        IDs come from the Grid's unit ID allocator, so this takes constant time.
+
         :return: A new unit_id value
         '''
         
-        unused_pieces = np.where(self.grid.stats[:,self.grid.STAT.VISIBLE]==0)[0]
-        unused_inactive_pieces = np.delete(unused_pieces,self.active_piece_id)
-        return unused_inactive_pieces[0]
+        return self.grid.allocate()
 
     def init_grid(self):
         '''Initialize the Grid. Used at the start of the game.'''
@@ -212,28 +208,18 @@ class TetronimoGame(SquareGridGame):
         self.grid.board[:] = -1
         self.new_active_piece()
         self.init_inactive_pieces()
+        self.grid.enable_unit_allocator(reserved=[self.active_piece_id])
         
     def remove_filled_horizontal_lines(self):
-        '''Remove filled horizontal rows and drop the board down a row.'''
-        
-        self._move_board_down_over_filled_rows()
-        self._refresh_piece_visibility_based_on_board_state()
-
-    def _move_board_down_over_filled_rows(self):
-        '''Push the board down a row. Generally used when a row is filled.'''
+        '''Remove filled horizontal rows and drop the rows above them down.
 
-        filled_rows = np.where((self.grid.board!=-1).all(axis=1))[0]
-        for filled_row in filled_rows:
-            self.grid.board[1:filled_row+1] = self.grid.board[:filled_row]
-            self.grid.board[0] = -1
-        self.grid.rebuild_loc_from_board()
-
-    def _refresh_piece_visibility_based_on_board_state(self):
-        '''Resynchronize Stats for "inactive" pieces based on Board state.'''
-
-        self.grid.stats[self.inactive_piece_ids,self.grid.STAT.VISIBLE] = 0
-        visible_pieces = self.grid.board[self.grid.board!=-1]
-        self.grid.stats[visible_pieces,self.grid.STAT.VISIBLE] = 1
+        The IDs of the inactive pieces cleared along with the rows are released for reuse.
+        '''
+        
+        filled_rows = np.flatnonzero((self.grid.board!=-1).all(axis=1))
+        cleared = self.grid.compact_rows(filled_rows,direction='down')
+        self.grid.release(cleared)
+        self.grid.stats[cleared,self.grid.STAT.VISIBLE] = 0
 
     def step(self):
         '''Run for each "tick" of the game to update the game's state.
@@ -247,8 +233,8 @@ class TetronimoGame(SquareGridGame):
             success = self.grid.move_piece(self.active_piece_id,1,0)
             if not success:
                 self.make_active_piece_inactive()
-                placed = self.new_active_piece()
                 self.remove_filled_horizontal_lines()
+                placed = self.new_active_piece()
                 if not placed:
                     self.done = True
     
@@ -1,6 +1,6 @@
 import enum
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import List, Optional, Tuple, Union
 
 from src.meshgrid.grids.square.piece import SquarePieceGrid2D
 from src.meshgrid.grids.square.piece_multilayer import SquareMultilayerPieceGrid2D
@@ -30,7 +30,7 @@ class SquareGridGame(ABC):
     :grid_height: The height of the default Grid, measured in squares
     :max_units: The maximum number of units that can be created on the default Grid
     :shape_manager: A shape manager object
-    :stats_list: The desired columns in the Grid's Stats object
+    :stats_list: The desired columns in the Grid's Stats object, as names or `(name,dtype)` pairs
     :layers: The number of layers in the game's default grid
 
     Methods
@@ -40,7 +40,7 @@ class SquareGridGame(ABC):
 
     '''
     
-    def __init__(self,grid_width:int,grid_height:int,max_units:int, shape_manager, stats_list:List[str], layers:Optional[int]=None, **kwargs):
+    def __init__(self,grid_width:int,grid_height:int,max_units:int, shape_manager, stats_list:List[Union[str,Tuple]], layers:Optional[int]=None, **kwargs):
         
         self.done = False
 
@@ -0,0 +1,228 @@
+import numpy as np
+
+class ChunkedBoard:
+    '''A sparse Board made of fixed-size square chunks that are allocated lazily.
+
+    Very large worlds are mostly empty, so a dense `(height,width)` numpy Board
+    wastes memory on blank squares. A chunked Board cuts the world into square
+    chunks that are `chunk_size` squares wide, only allocates a chunk when a
+    non-blank value is written to it, and frees it again once it's blank. Memory
+    therefore scales with the occupied area, rather than with the world's size.
+
+    Chunked Boards support the same integer (fancy) indexing that the Grids use
+    for placing, moving, and removing pieces, eg: `board[i_array,j_array]` or
+    `board[i,j,layer]`, and reading or writing these only touches the chunks
+    involved. Other kinds of indexing (slices, masks) & comparisons such as
+    `board==-1` fall back to a dense copy of the whole Board, so whole-Board
+    helpers (eg: `valid_anchor_map()`) still work, but cost dense memory & time.
+
+    Parameters
+    ----------
+    :shape: The shape of the Board, either `(height,width)` or `(height,width,layers)`
+    :chunk_size: The width & height of each chunk, measured in squares
+    :fill: The value of a blank square
+    :dtype: The numpy dtype of the Board's values
+
+    Methods
+    -------
+    :to_dense: Return the whole Board as a dense numpy array
+    :occupied: Return the indices & values of every non-blank square
+    :copy: Return a copy of the chunked Board
+    :assign: Overwrite this chunked Board's contents with another's
+    :chunk_count: Return the number of allocated chunks
+    :memory_usage: Return the number of bytes used by allocated chunks
+    '''
+
+    def __init__(self,shape,chunk_size=64,fill=-1,dtype=np.int32):
+
+        self.shape = tuple(int(n) for n in shape)
+        self.ndim = len(self.shape)
+        if self.ndim not in (2,3):
+            raise Exception("Chunked Boards must have 2 dimensions (i,j) or 3 dimensions (i,j,layer)")
+        self.chunk_size = chunk_size
+        self.fill = fill
+        self.dtype = np.dtype(dtype)
+        self.n_chunk_cols = (self.shape[1]+chunk_size-1)//chunk_size
+        self._chunk_shape = (chunk_size,chunk_size)+self.shape[2:]
+        self._chunks = {} # flat chunk index -> numpy array of `_chunk_shape`
+
+    def __len__(self):
+
+        return self.shape[0]
+
+    def _normalize(self,key):
+        '''Convert an all-integer index into flat, in-bounds index arrays.
+
+        :key: An index, as passed to `__getitem__` or `__setitem__`
+        :return: None if `key` isn't an all-integer index, else `(index arrays,shape)`
+        '''
+
+        if not isinstance(key,tuple):
+            key = (key,)
+        if len(key)!=self.ndim:
+            return None
+        arrays = [ np.asarray(k) for k in key ]
+        if not all( np.issubdtype(a.dtype,np.integer) for a in arrays ):
+            return None
+        arrays = np.broadcast_arrays(*arrays)
+        shape = arrays[0].shape
+        index = []
+        for a,dim in zip(arrays,self.shape):
+            a = a.reshape(-1).astype(np.int64)
+            a = np.where(a<0,a+dim,a) # negative indices wrap around, as in numpy
+            if ((a<0) | (a>=dim)).any():
+                raise IndexError(f"index is out of bounds for a chunked Board with shape {self.shape}")
+            index.append(a)
+        return index, shape
+
+    def _group_by_chunk(self,index):
+        '''Yield `(chunk key, positions, in-chunk index)` for every chunk touched by an index.'''
+
+        if index[0].shape[0]==0:
+            return
+        keys = (index[0]//self.chunk_size)*self.n_chunk_cols + index[1]//self.chunk_size
+        order = np.argsort(keys,kind='stable')
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True,sorted_keys[1:]!=sorted_keys[:-1]])
+        ends = np.r_[starts[1:],sorted_keys.shape[0]]
+        for start,end in zip(starts,ends):
+            positions = order[start:end]
+            local = (index[0][positions]%self.chunk_size, index[1][positions]%self.chunk_size) + tuple( a[positions] for a in index[2:] )
+            yield int(sorted_keys[start]), positions, local
+
+    def __getitem__(self,key):
+
+        normalized = self._normalize(key)
+        if normalized is None:
+            return self.to_dense()[key]
+        index,shape = normalized
+        values = np.full(index[0].shape[0],self.fill,dtype=self.dtype)
+        for chunk_key,positions,local in self._group_by_chunk(index):
+            chunk = self._chunks.get(chunk_key)
+            if chunk is not None:
+                values[positions] = chunk[local]
+        values = values.reshape(shape)
+        return values[()] if values.ndim==0 else values
+
+    def __setitem__(self,key,values):
+
+        normalized = self._normalize(key)
+        if normalized is None:
+            whole_board = (isinstance(key,slice) and key==slice(None)) or key is Ellipsis
+            if whole_board and np.ndim(values)==0 and values==self.fill:
+                self._chunks = {} # the common case of blanking the whole Board
+                return
+            dense = self.to_dense()
+            dense[key] = values
+            self._load_dense(dense)
+            return
+        index,shape = normalized
+        values = np.broadcast_to(np.asarray(values,dtype=self.dtype),shape).reshape(-1)
+        for chunk_key,positions,local in self._group_by_chunk(index):
+            chunk = self._chunks.get(chunk_key)
+            chunk_values = values[positions]
+            blanks = (chunk_values==self.fill)
+            if chunk is None:
+                if blanks.all():
+                    continue
+                chunk = np.full(self._chunk_shape,self.fill,dtype=self.dtype)
+                self._chunks[chunk_key] = chunk
+            chunk[local] = chunk_values
+            if blanks.any() and (chunk==self.fill).all():
+                del self._chunks[chunk_key] # free chunks that become blank
+
+    def _chunk_window(self,chunk_key):
+        '''Return the Board slices covered by a chunk, & the matching (clipped) chunk slices.'''
+
+        ci,cj = divmod(chunk_key,self.n_chunk_cols)
+        i0,j0 = ci*self.chunk_size, cj*self.chunk_size
+        i1,j1 = min(i0+self.chunk_size,self.shape[0]), min(j0+self.chunk_size,self.shape[1])
+        return (slice(i0,i1),slice(j0,j1)), (slice(0,i1-i0),slice(0,j1-j0))
+
+    def _load_dense(self,dense):
+        '''Replace every chunk with the contents of a dense array.'''
+
+        self._chunks = {}
+        n_chunk_rows = (self.shape[0]+self.chunk_size-1)//self.chunk_size
+        for chunk_key in range(n_chunk_rows*self.n_chunk_cols):
+            board_window,chunk_window = self._chunk_window(chunk_key)
+            if (dense[board_window]!=self.fill).any():
+                chunk = np.full(self._chunk_shape,self.fill,dtype=self.dtype)
+                chunk[chunk_window] = dense[board_window]
+                self._chunks[chunk_key] = chunk
+
+    def to_dense(self):
+        '''Return the whole Board as a dense numpy array.
+
+        :return: A numpy array with the Board's shape
+        '''
+
+        dense = np.full(self.shape,self.fill,dtype=self.dtype)
+        for chunk_key,chunk in self._chunks.items():
+            board_window,chunk_window = self._chunk_window(chunk_key)
+            dense[board_window] = chunk[chunk_window]
+        return dense
+
+    def __array__(self,dtype=None,copy=None):
+
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __eq__(self,other):
+
+        return self.to_dense()==other
+
+    def __ne__(self,other):
+
+        return self.to_dense()!=other
+
+    def reshape(self,*shape):
+
+        return self.to_dense().reshape(*shape)
+
+    def occupied(self):
+        '''Return the indices & values of every non-blank square, in row-major order.
+
+        Only allocated chunks are visited, so this scales with the occupied area.
+
+        :return: One index array per Board dimension, followed by an array of values
+        '''
+
+        found = []
+        for chunk_key,chunk in self._chunks.items():
+            board_window,chunk_window = self._chunk_window(chunk_key)
+            local = np.nonzero(chunk[chunk_window]!=self.fill)
+            index = (local[0]+board_window[0].start, local[1]+board_window[1].start) + local[2:]
+            found.append(index+(chunk[chunk_window][local],))
+        if not found:
+            return tuple( np.zeros(0,dtype=np.int64) for _ in self.shape ) + (np.zeros(0,dtype=self.dtype),)
+        columns = [ np.concatenate(column) for column in zip(*found) ]
+        order = np.lexsort(columns[:self.ndim][::-1])
+        return tuple( column[order] for column in columns )
+
+    def copy(self):
+        '''Return a copy of the chunked Board.'''
+
+        board = ChunkedBoard(self.shape,chunk_size=self.chunk_size,fill=self.fill,dtype=self.dtype)
+        board.assign(self)
+        return board
+
+    def assign(self,other):
+        '''Overwrite this chunked Board's contents with another chunked Board's contents.
+
+        :other: A chunked Board with the same shape & chunk size
+        '''
+
+        if other.shape!=self.shape or other.chunk_size!=self.chunk_size:
+            raise Exception("Chunked Boards can only be assigned from Boards with the same shape & chunk size")
+        self._chunks = { chunk_key:chunk.copy() for chunk_key,chunk in other._chunks.items() }
+
+    def chunk_count(self):
+        '''Return the number of allocated chunks.'''
+
+        return len(self._chunks)
+
+    def memory_usage(self):
+        '''Return the number of bytes used by allocated chunks.'''
+
+        return sum( chunk.nbytes for chunk in self._chunks.values() )
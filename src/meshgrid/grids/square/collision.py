@@ -0,0 +1,130 @@
+'''Vectorized collision resolution for batched piece placement & movement.
+
+Every function here works on flattened claims: one entry per board square that
+a unit wants to occupy. `owner` holds the position (in `unit_ids`) of the unit
+making each claim, and `cells` holds a flat index for the claimed square. The
+Grid classes build these arrays with fancy indexing, so the same rules apply
+to single-layer, multilayer, and batched Grids.
+
+Two conflict policies are supported:
+* "lowest_id" - claims are granted as if units were placed one-at-a-time in
+  ascending unit ID order, so the lowest unit ID wins any contested square
+* "reject" - if any unit in the batch fails, the whole batch is rejected
+'''
+
+import numpy as np
+
+CONFLICT_POLICIES = ('lowest_id','reject')
+
+def validate_batch(unit_ids,conflict):
+    '''Check that a batch has no repeated unit IDs and uses a known conflict policy.
+
+    :unit_ids: The unit IDs in the batch
+    :conflict: The conflict policy name
+    '''
+
+    if conflict not in CONFLICT_POLICIES:
+        raise Exception(f"Unknown conflict policy '{conflict}', expected one of: {', '.join(CONFLICT_POLICIES)}")
+    if np.unique(unit_ids).shape[0]!=unit_ids.shape[0]:
+        raise Exception("A unit ID may only appear once per batch")
+
+def _any_per_unit(owner,claim_mask,n_units):
+    '''Return, for each unit, whether any of its claims is set in `claim_mask`.'''
+
+    return np.bincount(owner[claim_mask],minlength=n_units)>0
+
+def claim_cells(unit_ids,owner,cells,unit_ok,conflict='lowest_id'):
+    '''Grant claims on board squares, resolving contested squares by the conflict policy.
+
+    With the "lowest_id" policy this gives the same result as granting claims one
+    unit at a time in ascending unit ID order, but each round is a numpy pass: the
+    units whose every square has no lower-ID contender win, and units that touch
+    a square won in an earlier round lose.
+
+    :unit_ids: The unit IDs in the batch
+    :owner: For every claim, the position in `unit_ids` of the claiming unit
+    :cells: For every claim, the flat index of the claimed square
+    :unit_ok: For every unit, whether it is allowed to claim squares at all
+    :conflict: The conflict policy ("lowest_id" or "reject")
+    :return: A boolean mask of the units whose claims were granted
+    '''
+
+    n_units = unit_ids.shape[0]
+    if conflict=='reject':
+        contested = np.bincount(np.unique(cells,return_inverse=True)[1].reshape(-1))>1
+        if unit_ok.all() and not contested.any():
+            return np.ones(n_units,dtype=bool)
+        return np.zeros(n_units,dtype=bool)
+
+    _,cell_idx = np.unique(cells,return_inverse=True)
+    cell_idx = cell_idx.reshape(-1)
+    claim_ids = unit_ids[owner]
+    taken = np.zeros(cell_idx.max()+1 if cell_idx.shape[0] else 0,dtype=bool)
+    accepted = np.zeros(n_units,dtype=bool)
+    undecided = unit_ok.copy()
+    while undecided.any():
+        live = undecided[owner]
+        undecided &= ~_any_per_unit(owner,live&taken[cell_idx],n_units)  # squares already won by lower IDs
+        live = undecided[owner]
+        lowest = np.full(taken.shape[0],np.iinfo(np.int64).max,dtype=np.int64)
+        np.minimum.at(lowest,cell_idx[live],claim_ids[live])
+        winners = undecided & ~_any_per_unit(owner,live&(lowest[cell_idx]!=claim_ids),n_units)
+        accepted |= winners
+        undecided &= ~winners
+        taken[cell_idx[winners[owner]]] = True
+    return accepted
+
+def resolve_placements(unit_ids,owner,cells,occupant,unit_ok,conflict='lowest_id',blank_square=-1):
+    '''Decide which units of a batch can be placed.
+
+    A unit can be placed if all of its squares are on the Board and each square is
+    either blank or already holds that unit, and it wins any contested squares.
+
+    :unit_ids: The unit IDs in the batch
+    :owner: For every claim, the position in `unit_ids` of the claiming unit
+    :cells: For every claim, the flat index of the claimed square
+    :occupant: For every claim, the current Board value of the claimed square
+    :unit_ok: For every unit, whether all of its squares are on the Board
+    :conflict: The conflict policy ("lowest_id" or "reject")
+    :blank_square: The value on the Board of an empty square
+    :return: A boolean mask of the units that can be placed
+    '''
+
+    blocked = (occupant!=blank_square) & (occupant!=unit_ids[owner])
+    unit_ok = unit_ok & ~_any_per_unit(owner,blocked,unit_ids.shape[0])
+    return claim_cells(unit_ids,owner,cells,unit_ok,conflict=conflict)
+
+def resolve_moves(unit_ids,owner,cells,occupant,unit_ok,conflict='lowest_id',blank_square=-1):
+    '''Decide which units of a batch can move, treating all moves as simultaneous.
+
+    A unit can move if all of its new squares are on the Board, and each new square
+    is blank or held by a unit of the batch that also moves, and it wins any contested
+    squares. Units that fail stay where they are, which can block other units; this
+    repeats until no new unit fails. A unit that fails is never reconsidered.
+
+    :unit_ids: The unit IDs in the batch
+    :owner: For every claim, the position in `unit_ids` of the claiming unit
+    :cells: For every claim, the flat index of the claimed (new) square
+    :occupant: For every claim, the current Board value of the claimed square
+    :unit_ok: For every unit, whether it is on the Board & all of its new squares are too
+    :conflict: The conflict policy ("lowest_id" or "reject")
+    :blank_square: The value on the Board of an empty square
+    :return: A boolean mask of the units that can move
+    '''
+
+    n_units = unit_ids.shape[0]
+    order = np.argsort(unit_ids)
+    position = np.searchsorted(unit_ids[order],occupant)
+    position = np.minimum(position,n_units-1)
+    occupant_pos = np.where(unit_ids[order][position]==occupant,order[position],-1) # batch position or -1
+    occupied = (occupant!=blank_square)
+
+    failed = ~unit_ok
+    while True:
+        blocked = occupied & ( (occupant_pos<0) | failed[np.maximum(occupant_pos,0)] )
+        ok = ~failed & ~_any_per_unit(owner,blocked,n_units)
+        accepted = claim_cells(unit_ids,owner,cells,ok,conflict=conflict)
+        now_failed = failed | ~accepted
+        if conflict=='reject' or (now_failed==failed).all():
+            return accepted
+        failed = now_failed
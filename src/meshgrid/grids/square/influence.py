@@ -0,0 +1,146 @@
+import numpy as np
+
+def rasterize_sides(i,j,side,weight,height,width):
+    '''Add up the weight of each side's pieces into one plane per side.
+
+    :i: An array of i-locations (vertical), one per piece
+    :j: An array of j-locations (horizontal), one per piece
+    :side: An array of non-negative STAT.SIDE values, one per piece
+    :weight: An array of weights, one per piece
+    :height: The height of the Board
+    :width: The width of the Board
+    :return: A 3D float64 numpy array with indices `(side,i,j)`, with one plane for every side up to the highest
+    '''
+
+    n_sides = int(side.max())+1 if side.shape[0]>0 else 0
+    if side.shape[0]>0 and side.min()<0:
+        raise Exception("Influence maps need every living piece's STAT.SIDE to be non-negative")
+    planes = np.zeros((n_sides,height,width),dtype=np.float64)
+    np.add.at(planes,(side,i,j),weight)
+    return planes
+
+def spread_influence(planes,decay,radius):
+    '''Spread each plane out with the separable kernel `decay**(|di|+|dj|)`, cut off at `radius`.
+
+    Spreading is done along the i-axis and then along the j-axis, with one shifted
+    slice per distance, so it costs `O(radius)` vectorized passes over the planes
+    instead of `O(radius^2)`.
+
+    :planes: A 3D numpy array with indices `(side,i,j)`
+    :decay: How much influence is multiplied by with every square it spreads
+    :radius: The furthest an influence spreads along each axis, measured in squares
+    :return: A 3D float64 numpy array with the same shape as `planes`
+    '''
+
+    spread = np.asarray(planes,dtype=np.float64)
+    for axis in (1,2):
+        source, spread = spread, spread.copy()
+        length = source.shape[axis]
+        for d in range(1,min(radius,length-1)+1):
+            near, far = [slice(None)]*3, [slice(None)]*3
+            near[axis], far[axis] = slice(0,length-d), slice(d,length)
+            spread[tuple(far)] += decay**d*source[tuple(near)]
+            spread[tuple(near)] += decay**d*source[tuple(far)]
+    return spread
+
+def manhattan_distance_planes(planes):
+    '''Return the Manhattan distance from every square to the nearest non-zero square of its plane.
+
+    This is an exact distance transform, made of a forward & backward scan along each
+    axis, where each step of a scan is vectorized over every plane at once. Obstacles
+    are ignored. See `distance_field()` on the piece Grids for distances around them.
+
+    :planes: A 3D numpy array with indices `(side,i,j)`
+    :return: A 3D int32 numpy array with the same shape, with -1 for planes that are all zero
+    '''
+
+    n_sides,height,width = planes.shape
+    far = height+width # further than any square on the Board
+    distance = np.where(planes!=0,0,far).astype(np.int32)
+    for n in range(1,height):
+        np.minimum(distance[:,n],distance[:,n-1]+1,out=distance[:,n])
+    for n in range(height-2,-1,-1):
+        np.minimum(distance[:,n],distance[:,n+1]+1,out=distance[:,n])
+    for n in range(1,width):
+        np.minimum(distance[:,:,n],distance[:,:,n-1]+1,out=distance[:,:,n])
+    for n in range(width-2,-1,-1):
+        np.minimum(distance[:,:,n],distance[:,:,n+1]+1,out=distance[:,:,n])
+    distance[distance>=far] = -1
+    return distance
+
+class SquareInfluenceMaps:
+    '''Settings & cached per-side influence and distance maps for a piece Grid.
+
+    Influence maps answer questions like "how contested is this square?" for every
+    square at once: each side's living pieces are rasterized (weighted by a stat,
+    eg: DMG) into a plane per side, which is then spread out with a decaying kernel.
+    Maps are a snapshot, only recomputed on the first read after `refresh()` is called
+    (eg: once per tick), so reading them for every unit in a tick costs a single
+    recompute plus `O(1)` lookups, even while units move during the tick. See
+    `enable_influence()` & `refresh_influence()` on the piece Grids.
+
+    Parameters
+    ----------
+    :weight_stat: The stat index each piece is weighted by, or None to weigh every piece as 1
+    :decay: How much influence is multiplied by with every square it spreads
+    :radius: The furthest an influence spreads along each axis, measured in squares
+
+    Methods
+    -------
+    :refresh: Recompute the maps on their next read
+    :influence: Return the (cached) influence maps
+    :distance: Return the (cached) Manhattan distance maps
+    '''
+
+    def __init__(self,weight_stat=None,decay=0.5,radius=8):
+
+        self.weight_stat = weight_stat
+        self.decay = decay
+        self.radius = radius
+        self._stale = True # whether the maps must be recomputed on their next read
+        self._pieces = None
+        self._influence = None
+        self._distance = None
+
+    def refresh(self):
+        '''Throw away the maps, so that they're recomputed on their next read.'''
+
+        self._stale = True
+
+    def _sources(self,sources):
+        '''Throw away stale maps, and return `(i,j,side,weight,height,width)` for every living piece.
+
+        :sources: A function returning `(i,j,side,weight,height,width)` for every living piece
+        '''
+
+        if self._stale:
+            self._stale = False
+            self._influence = self._distance = None
+            self._pieces = sources()
+        return self._pieces
+
+    def influence(self,sources):
+        '''Return the influence maps, recomputing them only if they were refreshed since the last read.
+
+        :sources: A function returning `(i,j,side,weight,height,width)` for every living piece
+        :return: A read-only 3D float64 numpy array with indices `(side,i,j)`
+        '''
+
+        pieces = self._sources(sources)
+        if self._influence is None:
+            self._influence = spread_influence(rasterize_sides(*pieces),self.decay,self.radius)
+            self._influence.flags.writeable = False
+        return self._influence
+
+    def distance(self,sources):
+        '''Return the Manhattan distance maps, recomputing them only if they were refreshed since the last read.
+
+        :sources: A function returning `(i,j,side,weight,height,width)` for every living piece
+        :return: A read-only 3D int32 numpy array with indices `(side,i,j)`
+        '''
+
+        i,j,side,weight,height,width = self._sources(sources)
+        if self._distance is None:
+            self._distance = manhattan_distance_planes(rasterize_sides(i,j,side,np.ones_like(weight),height,width))
+            self._distance.flags.writeable = False
+        return self._distance
@@ -0,0 +1,93 @@
+'''Breadth-first distance fields ("flow fields") for moving pieces on square Grids.
+
+A distance field holds, for every anchor `(i,j)` on the Board, the number of
+single-square moves a piece needs to reach one of the source anchors. It is
+computed once with a multi-source breadth-first search, after which any number
+of pieces can follow it downhill, so many pieces chasing the same target share
+one search instead of searching one-by-one.
+
+The search works on anchors rather than on squares: `passable` marks the
+anchors where the moving piece's whole shape fits, so fields respect the shape
+of the pieces following them. Unreachable anchors hold -1.
+'''
+
+import numpy as np
+
+DIRECTIONS = ((1,0),(-1,0),(0,1),(0,-1))
+
+def bfs_distance_field(passable,sources,max_dist=None):
+    '''Return the number of single-square moves from each anchor to the nearest source.
+
+    The search expands one whole frontier per numpy pass, holding the frontier as
+    a sparse array of flat indexes, so the cost grows with the number of reachable
+    anchors rather than with the number of passes over the Board.
+
+    :passable: A 2D boolean numpy array of the anchors a piece may occupy
+    :sources: A 2D boolean numpy array of the anchors the distances are measured to
+    :max_dist: If not None, stop searching past this distance (further anchors hold -1)
+    :return: A 2D int32 numpy array of distances, with -1 for unreachable anchors
+    '''
+
+    height,width = passable.shape
+    flat_passable = passable.reshape(-1)
+    dist = np.full(height*width,-1,dtype=np.int32)
+    frontier = np.flatnonzero(sources.reshape(-1) & flat_passable)
+    dist[frontier] = 0
+
+    d = 0
+    while frontier.shape[0]>0 and (max_dist is None or d<max_dist):
+        d += 1
+        fi = frontier//width
+        fj = frontier-fi*width
+        neighbors = np.concatenate((frontier[fi>0]-width, frontier[fi<height-1]+width,
+                                    frontier[fj>0]-1, frontier[fj<width-1]+1))
+        neighbors = neighbors[flat_passable[neighbors] & (dist[neighbors]<0)]
+        frontier = np.unique(neighbors)
+        dist[frontier] = d
+    return dist.reshape(height,width)
+
+def descend_field(dist,i,j,directions=DIRECTIONS):
+    '''Choose, for each piece, the single-square move that goes furthest downhill in a field.
+
+    A piece only moves to a neighboring anchor with a strictly smaller distance than
+    its own (any reachable anchor is smaller than an unreachable one). Ties go to the
+    earliest direction in `directions`. Pieces that are already at a source, or that
+    have no downhill neighbor, get a move of `(0,0)`.
+
+    :dist: A 2D distance field from `bfs_distance_field()`
+    :i: An array of piece i-locations (vertical)
+    :j: An array of piece j-locations (horizontal)
+    :directions: The `(di,dj)` moves to consider, in order of preference
+    :return: The arrays `di` & `dj` of moves, one per piece
+    '''
+
+    height,width = dist.shape
+    i = np.asarray(i,dtype=np.int64)
+    j = np.asarray(j,dtype=np.int64)
+    best = dist[i,j].astype(np.int64)
+    best[best<0] = np.iinfo(np.int64).max
+    di = np.zeros(i.shape[0],dtype=np.int64)
+    dj = np.zeros(i.shape[0],dtype=np.int64)
+    for step_i,step_j in directions:
+        ni,nj = i+step_i, j+step_j
+        in_bounds = (ni>=0) & (ni<height) & (nj>=0) & (nj<width)
+        neighbor = np.where(in_bounds,dist[np.where(in_bounds,ni,0),np.where(in_bounds,nj,0)],-1)
+        better = (neighbor>=0) & (neighbor<best)
+        best[better] = neighbor[better]
+        di[better] = step_i
+        dj[better] = step_j
+    return di, dj
+
+def touching_squares(occupied):
+    '''Return the squares that share an edge with an occupied square.
+
+    :occupied: A 2D boolean numpy array of occupied squares
+    :return: A 2D boolean numpy array, True next to (but not on) occupied squares
+    '''
+
+    touching = np.zeros_like(occupied)
+    touching[1:,:] |= occupied[:-1,:]
+    touching[:-1,:] |= occupied[1:,:]
+    touching[:,1:] |= occupied[:,:-1]
+    touching[:,:-1] |= occupied[:,1:]
+    return touching & ~occupied
@@ -0,0 +1,362 @@
+import enum
+import numpy as np
+
+from src.meshgrid.grids.square.piece import SquarePieceGrid2D
+from src.meshgrid.grids.square.stats import StatsTable, parse_stats_list, make_stats, stats_list_spec
+from src.meshgrid.grids.square.collision import validate_batch, resolve_moves, resolve_placements
+
+class BatchedSquarePieceGrid2D:
+    '''Many independent two-dimensional square-based Grids with Pieces, stepped in lockstep.
+
+    This Grid class holds N separate games ("environments") in stacked numpy arrays
+    with a leading environment dimension, so that a single call can place, move,
+    remove, or query pieces in every environment at once. This is useful for
+    training & balance sweeps, where Python overhead should be paid once per batch
+    rather than once per game.
+
+    Each environment behaves like its own `SquarePieceGrid2D`: pieces in different
+    environments never collide, and unit IDs are local to their environment. Batched
+    methods take parallel arrays of environment IDs and unit IDs, one pair per piece.
+
+    The three most important internal objects are:
+    * Board - A 3D numpy array where the indices are `(env,i,j)`
+    * Loc - A 3D numpy array where the indices are `(env,unit_id,[i,j])`
+    * Stats - A 3D numpy array where the indices are `(env,unit_id,STAT_ENUM)`
+
+    Environments that finish are flagged in the `done` mask. `auto_reset()` clears
+    them and calls the `on_reset` callback so that new games can be set up.
+
+    Parameters
+    ----------
+    :n_envs: The number of environments
+    :grid_width: The width of each Board, measured in squares
+    :grid_height: The height of each Board, measured in squares
+    :max_units: The maximum number of units per environment
+    :shape_manager: A shape manager object
+    :stats_list: The desired columns in the Grid's Stats object, as names or `(name,dtype)` pairs (default dtype int32)
+    :on_reset: An optional function `on_reset(grid,env_ids)` called after environments are reset
+
+    Methods
+    -------
+    :env_grid: Get a `SquarePieceGrid2D` that views a single environment's arrays
+    :reset: Clear the Board, Loc, Stats, & done flag of some environments
+    :auto_reset: Reset every environment flagged as done
+    :get_dist: The Manhattan distances between pairs of pieces in the same environments
+    :get_nearest_enemies: Get the nearest living enemy of many pieces at once
+    :get_nearest_allies: Get the nearest living ally of many pieces at once
+    :move_pieces: Move many pieces at once, resolving collisions per environment
+    :place_pieces: Place many pieces at once, resolving collisions per environment
+    :remove_pieces: Remove many pieces at once
+    :piece_can_be_placed_here: Determine if pieces can be placed at the given locations
+    '''
+
+    def __init__(self,n_envs,grid_width,grid_height,max_units,
+                 shape_manager,stats_list,on_reset=None):
+
+        self.loc_dims = 2 # dimensions = (i,j)
+        self.n_envs = n_envs
+        self.width = grid_width
+        self.height = grid_height
+        self.max_units = max_units
+
+        stat_names,_ = parse_stats_list(stats_list)
+        self.STAT = enum.IntEnum('StatsEnum', { stat:e for e,stat in enumerate(stat_names) })
+        self.stats_list = stats_list_spec(stats_list)
+
+        self.board = np.zeros((n_envs,self.height,self.width),dtype=np.int32)-1
+        self.loc = np.zeros((n_envs,max_units,self.loc_dims),dtype=np.int32)-1
+        self.stats = make_stats((n_envs,max_units),stats_list,np.int32)
+        self.done = np.zeros(n_envs,dtype=bool)
+        self.shape = shape_manager
+        self.on_reset = on_reset
+
+    def env_grid(self,env_id):
+        '''Return a `SquarePieceGrid2D` whose Board, Loc, & Stats are views into one environment.
+
+        Changes made through the returned Grid are made to this batched Grid, which is
+        handy for per-environment logic & visualization. Don't hold on to the returned
+        Grid across `reset()` calls if you've enabled any of its caches or indexes.
+
+        :env_id: The environment to view
+        :return: A `SquarePieceGrid2D` object
+        '''
+
+        if isinstance(self.stats,StatsTable):
+            stats = StatsTable([ column[env_id] for column in self.stats.columns ])
+        else:
+            stats = self.stats[env_id]
+        arrays = {'board':self.board[env_id],'loc':self.loc[env_id],'stats':stats}
+        return SquarePieceGrid2D(self.width,self.height,self.max_units,self.shape,self.stats_list,arrays=arrays)
+
+    def reset(self,env_ids=None):
+        '''Clear the Board, Loc, Stats, & done flag of some environments, then call `on_reset`.
+
+        :env_ids: The environments to reset (default: every environment)
+        '''
+
+        env_ids = np.arange(self.n_envs) if env_ids is None else np.asarray(env_ids,dtype=np.int64).reshape(-1)
+        self.board[env_ids] = -1
+        self.loc[env_ids] = -1
+        self.stats[env_ids] = 0
+        self.done[env_ids] = False
+        if self.on_reset is not None:
+            self.on_reset(self,env_ids)
+
+    def auto_reset(self):
+        '''Reset every environment flagged in the `done` mask.
+
+        :return: The IDs of the environments that were reset
+        '''
+
+        env_ids = np.flatnonzero(self.done)
+        if env_ids.shape[0]>0:
+            self.reset(env_ids)
+        return env_ids
+
+    def _batch_ids(self,env_ids,unit_ids):
+        '''Broadcast environment IDs & unit IDs against one another into flat int64 arrays.'''
+
+        env_ids,unit_ids = np.broadcast_arrays(np.asarray(env_ids,dtype=np.int64),np.asarray(unit_ids,dtype=np.int64))
+        return env_ids.reshape(-1), unit_ids.reshape(-1)
+
+    def _global_ids(self,env_ids,unit_ids):
+        '''Number every piece uniquely across environments, keeping unit ID order within each.'''
+
+        return env_ids*self.max_units+unit_ids
+
+    def get_dist(self,env_ids,a,b):
+        '''Return the Manhattan distances between pairs of pieces in the same environments.
+
+        :env_ids: The environment of each pair
+        :a: The first unit ID of each pair
+        :b: The second unit ID of each pair
+        :return: An array of Manhattan distances
+        '''
+
+        return np.abs(self.loc[env_ids,a].astype(np.int64)-self.loc[env_ids,b]).sum(axis=-1)
+
+    def get_nearest_enemies(self,env_ids,unit_ids,chunk_size=1024):
+        '''Get the nearest living enemy (different STAT.SIDE) of many pieces at once.
+
+        :env_ids: The environment of each piece
+        :unit_ids: The unit IDs to find the nearest enemies of
+        :chunk_size: The number of pieces compared against Loc in a single numpy pass
+        :return: An array of nearest enemy IDs (or -1) & an array of their distances (or 1e10)
+        '''
+
+        return self._get_nearest_by_side(env_ids,unit_ids,allies=False,chunk_size=chunk_size)
+
+    def get_nearest_allies(self,env_ids,unit_ids,chunk_size=1024):
+        '''Get the nearest living ally (same STAT.SIDE) of many pieces at once.
+
+        :env_ids: The environment of each piece
+        :unit_ids: The unit IDs to find the nearest allies of
+        :chunk_size: The number of pieces compared against Loc in a single numpy pass
+        :return: An array of nearest ally IDs (or -1) & an array of their distances (or 1e10)
+        '''
+
+        return self._get_nearest_by_side(env_ids,unit_ids,allies=True,chunk_size=chunk_size)
+
+    def _get_nearest_by_side(self,env_ids,unit_ids,allies,chunk_size=1024,not_found=1e10):
+        '''Find the nearest living ally or enemy of each piece within its own environment.
+
+        Ties are broken in favor of the smallest unit ID, as in `SquarePieceGrid2D`.
+
+        :env_ids: The environment of each piece
+        :unit_ids: The unit IDs to find the nearest pieces for
+        :allies: Set to True to match pieces on the same side, and False to match enemies
+        :chunk_size: The number of pieces compared against Loc in a single numpy pass
+        :not_found: The distance returned when no matching piece exists
+        :return: An array of nearest unit IDs & an array of the distances of those units
+        '''
+
+        env_ids,unit_ids = self._batch_ids(env_ids,unit_ids)
+        best_ids = np.full(unit_ids.shape[0],-1,dtype=np.int64)
+        best_dists = np.full(unit_ids.shape[0],not_found,dtype=np.float64)
+        candidates = np.arange(self.max_units)
+
+        for start in range(0,unit_ids.shape[0],chunk_size):
+            envs = env_ids[start:start+chunk_size]
+            ids = unit_ids[start:start+chunk_size]
+            candidate_loc = self.loc[envs].astype(np.int64)                                 # (chunk,max_units,2)
+            dist = np.abs(self.loc[envs,ids][:,None,:]-candidate_loc).sum(axis=2)            # Manhattan distance
+            same_side = (self.stats[envs,:,self.STAT.SIDE]==self.stats[envs,ids,self.STAT.SIDE][:,None])
+            valid = (self.stats[envs,:,self.STAT.ALIVE]!=0)                                  # no dead pieces
+            if allies:
+                valid &= same_side & (candidates[None,:]!=ids[:,None])                        # no self-matching
+            else:
+                valid &= ~same_side
+            valid &= (dist<not_found)
+            dist = np.where(valid,dist,np.iinfo(np.int64).max)
+            nearest = np.argmin(dist,axis=1)
+            rows = np.arange(ids.shape[0])
+            found = valid[rows,nearest]
+            best_ids[start:start+chunk_size] = np.where(found,nearest,-1)
+            best_dists[start:start+chunk_size] = np.where(found,dist[rows,nearest],not_found)
+        return best_ids, best_dists
+
+    def _gather_piece_cells(self,env_ids,unit_ids,i,j):
+        '''Return the Board squares every given piece would cover if anchored at `(i,j)`.
+
+        :env_ids: The environment of each piece
+        :unit_ids: An array of piece IDs
+        :i: An array of anchor i-locations (vertical), one per piece
+        :j: An array of anchor j-locations (horizontal), one per piece
+        :return: The arrays `owner`, `ce`, `ci`, `cj`, & per-piece `in_bounds`
+        '''
+
+        owner,si,sj = self.shape.gather_cells(self.stats[env_ids,unit_ids,self.STAT.SHAPE])
+        ce = env_ids[owner]
+        ci = i[owner]+si
+        cj = j[owner]+sj
+        cell_in_bounds = (ci>=0) & (ci<self.height) & (cj>=0) & (cj<self.width)
+        in_bounds = np.bincount(owner[~cell_in_bounds],minlength=unit_ids.shape[0])==0
+        return owner, ce, np.where(cell_in_bounds,ci,0), np.where(cell_in_bounds,cj,0), in_bounds
+
+    def _claims(self,env_ids,unit_ids,owner,ce,ci,cj):
+        '''Return the global piece IDs, flat claimed squares, & global occupants for `collision`.'''
+
+        global_ids = self._global_ids(env_ids,unit_ids)
+        cells = (ce*self.height+ci)*self.width+cj
+        occupant = self.board[ce,ci,cj].astype(np.int64)
+        occupant = np.where(occupant==-1,-1,ce*self.max_units+occupant)
+        return global_ids, cells, occupant
+
+    def _reject_failed_envs(self,env_ids,ok):
+        '''Turn per-piece results into all-or-nothing results per environment.'''
+
+        failed_envs = np.zeros(self.n_envs,dtype=bool)
+        failed_envs[env_ids[~ok]] = True
+        return ok & ~failed_envs[env_ids]
+
+    def move_pieces(self,env_ids,unit_ids,di,dj,conflict='lowest_id'):
+        '''Move many pieces at once, as if all of the moves happened simultaneously.
+
+        Each piece follows the same rules as `SquarePieceGrid2D.move_pieces()`, within its
+        own environment. Collisions are resolved by the `conflict` policy:
+        * "lowest_id" - the lowest unit ID wins a contested square, and losing pieces stay put
+        * "reject" - if any piece can't move then no piece in the same environment moves
+
+        :env_ids: The environment(s) of the pieces, either one value or one per piece
+        :unit_ids: An array of piece IDs to move (each piece may only appear once)
+        :di: The change(s) in the i-direction (vertical), either one value or one per piece
+        :dj: The change(s) in the j-direction (horizontal), either one value or one per piece
+        :conflict: The conflict policy, either "lowest_id" or "reject"
+        :return: A boolean array for the success or failure of each piece's move
+        '''
+
+        env_ids,unit_ids = self._batch_ids(env_ids,unit_ids)
+        validate_batch(self._global_ids(env_ids,unit_ids),conflict)
+        if unit_ids.shape[0]==0:
+            return np.zeros(0,dtype=bool)
+        di = np.broadcast_to(np.asarray(di,dtype=np.int64),unit_ids.shape)
+        dj = np.broadcast_to(np.asarray(dj,dtype=np.int64),unit_ids.shape)
+        old_i = self.loc[env_ids,unit_ids,0].astype(np.int64)
+        old_j = self.loc[env_ids,unit_ids,1].astype(np.int64)
+
+        owner,ce,ci,cj,in_bounds = self._gather_piece_cells(env_ids,unit_ids,old_i+di,old_j+dj)
+        global_ids,cells,occupant = self._claims(env_ids,unit_ids,owner,ce,ci,cj)
+        # environments never share squares, so "lowest_id" resolves each environment independently
+        moved = resolve_moves(global_ids,owner,cells,occupant,in_bounds & (old_i>=0))
+        if conflict=='reject':
+            moved = self._reject_failed_envs(env_ids,moved)
+
+        claims = moved[owner]
+        self._set_cells(ce[claims],ci[claims]-di[owner][claims],cj[claims]-dj[owner][claims],-1)
+        self._set_cells(ce[claims],ci[claims],cj[claims],unit_ids[owner][claims])
+        self._set_locs(env_ids[moved],unit_ids[moved],old_i[moved]+di[moved],old_j[moved]+dj[moved])
+        return moved
+
+    def place_pieces(self,env_ids,unit_ids,i,j,conflict='lowest_id'):
+        '''Place many pieces at once, at the given `(i,j)` locations.
+
+        Collisions are resolved by the `conflict` policy:
+        * "lowest_id" - the lowest unit ID wins a contested square, and losing pieces aren't placed
+        * "reject" - if any piece can't be placed then no piece in the same environment is placed
+
+        :env_ids: The environment(s) of the pieces, either one value or one per piece
+        :unit_ids: An array of piece IDs to place (each piece may only appear once)
+        :i: The i-location(s) (vertical), either one value or one per piece
+        :j: The j-location(s) (horizontal), either one value or one per piece
+        :conflict: The conflict policy, either "lowest_id" or "reject"
+        :return: A boolean array for the success or failure of each piece's placement
+        '''
+
+        env_ids,unit_ids = self._batch_ids(env_ids,unit_ids)
+        validate_batch(self._global_ids(env_ids,unit_ids),conflict)
+        if unit_ids.shape[0]==0:
+            return np.zeros(0,dtype=bool)
+        i = np.broadcast_to(np.asarray(i,dtype=np.int64),unit_ids.shape)
+        j = np.broadcast_to(np.asarray(j,dtype=np.int64),unit_ids.shape)
+
+        owner,ce,ci,cj,in_bounds = self._gather_piece_cells(env_ids,unit_ids,i,j)
+        global_ids,cells,occupant = self._claims(env_ids,unit_ids,owner,ce,ci,cj)
+        placed = resolve_placements(global_ids,owner,cells,occupant,in_bounds)
+        if conflict=='reject':
+            placed = self._reject_failed_envs(env_ids,placed)
+
+        claims = placed[owner]
+        self._set_cells(ce[claims],ci[claims],cj[claims],unit_ids[owner][claims])
+        self._set_locs(env_ids[placed],unit_ids[placed],i[placed],j[placed])
+        return placed
+
+    def remove_pieces(self,env_ids,unit_ids):
+        '''Remove many pieces from the Board & from Loc at once.
+
+        :env_ids: The environment(s) of the pieces, either one value or one per piece
+        :unit_ids: An array of piece IDs to remove
+        :return: A boolean array of which pieces were on the Board (and so were removed)
+        '''
+
+        env_ids,unit_ids = self._batch_ids(env_ids,unit_ids)
+        on_board = self.loc[env_ids,unit_ids,0]>=0
+        env_ids,unit_ids = env_ids[on_board],unit_ids[on_board]
+        owner,ce,ci,cj,_ = self._gather_piece_cells(env_ids,unit_ids,self.loc[env_ids,unit_ids,0],self.loc[env_ids,unit_ids,1])
+        self._set_cells(ce,ci,cj,-1)
+        self._set_locs(env_ids,unit_ids,-1,-1)
+        return on_board
+
+    def piece_can_be_placed_here(self,env_ids,unit_ids,i,j,blank_square=-1):
+        '''Determine, for many pieces at once, if each could be placed at its `(i,j)` location.
+
+        Pieces are checked independently of one another (like calling
+        `SquarePieceGrid2D.piece_can_be_placed_here()` once per piece).
+
+        :env_ids: The environment(s) of the pieces, either one value or one per piece
+        :unit_ids: An array of piece IDs
+        :i: The i-location(s) (vertical), either one value or one per piece
+        :j: The j-location(s) (horizontal), either one value or one per piece
+        :blank_square: The value on the Board of an empty square
+        :return: A boolean array of whether each piece fits
+        '''
+
+        env_ids,unit_ids = self._batch_ids(env_ids,unit_ids)
+        i = np.broadcast_to(np.asarray(i,dtype=np.int64),unit_ids.shape)
+        j = np.broadcast_to(np.asarray(j,dtype=np.int64),unit_ids.shape)
+        owner,ce,ci,cj,in_bounds = self._gather_piece_cells(env_ids,unit_ids,i,j)
+        occupant = self.board[ce,ci,cj]
+        blocked = (occupant!=blank_square) & (occupant!=unit_ids[owner])
+        return in_bounds & (np.bincount(owner[blocked],minlength=unit_ids.shape[0])==0)
+
+    def _set_locs(self,env_ids,unit_ids,i,j):
+        '''Write many pieces' `(i,j)` locations to Loc.
+
+        :env_ids: The environment of each piece
+        :unit_ids: An array of piece IDs
+        :i: The new i-locations (vertical), or -1 for pieces that are off the Board
+        :j: The new j-locations (horizontal), or -1 for pieces that are off the Board
+        '''
+
+        self.loc[env_ids,unit_ids,0] = i
+        self.loc[env_ids,unit_ids,1] = j
+
+    def _set_cells(self,e,i,j,values):
+        '''Write values to Board squares with numpy fancy indexing.
+
+        :e: An array of environment IDs
+        :i: An array of i-locations (vertical)
+        :j: An array of j-locations (horizontal)
+        :values: The value(s) to write to the squares
+        '''
+
+        self.board[e,i,j] = values
@@ -1,6 +1,18 @@
 import enum
 import numpy as np
 
+from src.meshgrid.grids.square.spatial import SquareSpatialIndex
+from src.meshgrid.grids.square.visibility import SquareFieldOfView, shadowcast
+from src.meshgrid.grids.square.influence import SquareInfluenceMaps
+from src.meshgrid.grids.square.allocator import UnitIDAllocator
+from src.meshgrid.grids.square.chunked import ChunkedBoard
+from src.meshgrid.grids.square.storage import save_arrays, open_arrays
+from src.meshgrid.grids.square.stats import StatsTable, parse_stats_list, make_stats, stats_list_spec, stats_to_arrays, stats_from_arrays
+from src.meshgrid.grids.square.sampling import random_grid_locs, AnchorSampler
+from src.meshgrid.grids.square.pathfinding import bfs_distance_field, descend_field, touching_squares
+from src.meshgrid.search.zobrist import board_keys, stats_keys, xor_keys
+from src.meshgrid.grids.square.collision import validate_batch, resolve_moves, resolve_placements
+
 class SquareMultilayerPieceGrid2D:
     '''A two-dimensional square-based Grid class with Pieces with multiple layers.
     
@@ -22,27 +34,72 @@ class SquareMultilayerPieceGrid2D:
     :grid_height: The height of the Board, measured in squares
     :max_units: The maximum number of units that can be stored by Loc & Stats
     :shape_manager: A shape manager object
-    :stats_list: The desired columns in the Grid's Stats object
+    :stats_list: The desired columns in the Grid's Stats object, as names or `(name,dtype)` pairs (default dtype int32)
     :layers: The number of layers to specify on the Board
+    :board_backend: Either "dense" (a numpy array) or "chunked" (a sparse `ChunkedBoard`)
+    :chunk_size: The width & height of each chunk, when using the "chunked" Board backend
+    :arrays: Optional pre-made `board`, `loc`, & `stats` arrays (eg: memory maps) to use instead of allocating them
 
     Methods
     -------
     :random_grid_locs: Returns random `(i,j)` locations for each piece (layer not specified)
-    :place_pieces_randomly: Place pieces randomly, retrying on failure (layer is specified)
+    :place_pieces_randomly: Place pieces randomly, retrying on failure or sampling free locations (layer is specified)
     :get_dist: The Manhattan distance between two unit IDs (layer is ignored)
     :get_nearest_enemy: Get the ID of the nearest living enemy piece (different side)
     :get_nearest_ally: Get the ID of the nearest living ally piece (same side)
+    :get_nearest_enemies: Batched `get_nearest_enemy` over many unit IDs at once
+    :get_nearest_allies: Batched `get_nearest_ally` over many unit IDs at once
+    :get_units_in_rect: Get the IDs of pieces located inside a rectangle
+    :get_units_within_dist: Get the IDs of pieces within a Manhattan distance of `(i,j)`
+    :valid_anchor_map: Get a boolean map of every `(i,j)` where a shape can be placed
+    :cached_valid_anchor_map: Like `valid_anchor_map`, but cached until the Board changes
+    :distance_field: Get a cached BFS distance field toward a side or a single piece
+    :invalidate_caches: Mark cached results stale after editing the Board by hand
+    :enable_spatial_index: Track pieces per side in buckets to speed up proximity queries
+    :rebuild_spatial_index: Clear the spatial index and rebuild it from Loc
+    :enable_fov: Cache field-of-view results, choosing which pieces & layers block sight
+    :visible_squares: Get a boolean map of every square one piece can see
+    :visible_from: Get a boolean map of every square any of many pieces can see (eg: a whole side)
+    :enable_influence: Cache per-side influence & distance maps, with pieces weighted by a stat
+    :influence_maps: Get every side's influence over every square
+    :distance_maps: Get the Manhattan distance from every square to every side's nearest piece
+    :get_influence: Look up one side's influence over one square
+    :get_threat: Look up the influence of every other side over a piece's square
+    :refresh_influence: Recompute the influence & distance maps on their next read, eg: once per tick
+    :enable_unit_allocator: Track which unit IDs are in use, to hand out free ones in constant time
+    :allocate: Take one free unit ID
+    :allocate_many: Take several free unit IDs at once
+    :release: Remove pieces from the Board and return their unit IDs to the allocator
+    :set_stats: Write to one Stats column, recording the write if a checkpoint is open
+    :checkpoint: Start recording Board, Loc, & Stats writes, and return a token
+    :rollback: Undo every recorded write since a checkpoint
+    :commit: Keep every recorded write since a checkpoint, and stop recording if none remain
+    :enable_zobrist: Maintain a 64-bit Zobrist hash of the Board (and some Stats) in `zobrist`
+    :rebuild_zobrist: Recompute the Zobrist hash from scratch
+    :snapshot: Copy the Board, Loc, & Stats into reusable buffers
+    :restore: Copy the Board, Loc, & Stats back from the last snapshot
+    :save: Save the Board, Loc, & Stats to a directory of `.npy` files
+    :open: Open a saved Grid, memory-mapping its Board, Loc, & Stats
+    :flush: Write changes to a Grid opened with `mode="r+"` back to disk
     :move_piece: Move a piece by specifying how much to shift its `(i,j)` location
     :place_piece: Place a piece at a precise `(i,j)` location
     :remove_piece: Remove a piece by its unit ID
+    :move_pieces: Move many pieces at once, resolving collisions between them
+    :place_pieces: Place many pieces at once, resolving collisions between them
+    :remove_pieces: Remove many pieces at once
+    :compact_rows: Delete whole rows and shift the Board over the gap (eg: line clears)
+    :compact_cols: Delete whole columns and shift the Board over the gap
     :piece_can_be_placed_here: Determine if a given unit ID can be placed here
     :rebuild_loc_from_board: Clear Loc and rebuild it from piece locations on Board
     :rebuild_board_from_loc: Clear Board and rebuild it from piece locations on Loc
+    :mark_dirty: Mark hand-edited Board squares (or pieces) whose Loc may be out of date
+    :sync: Update Loc for only the pieces marked dirty since the last sync
     :step_closer: Move one unit a single non-diagonal square closer to another unit
+    :step_along_field: Move many units one square along shared distance fields, around obstacles
     '''
     
     def __init__(self,grid_width,grid_height,max_units,
-                 shape_manager,stats_list,layers=1):
+                 shape_manager,stats_list,layers=1,board_backend='dense',chunk_size=64,arrays=None):
         
         self.loc_dims = 3 # dimensions = (i,j,layer)
         self.width = grid_width
@@ -50,13 +107,69 @@ class SquareMultilayerPieceGrid2D:
         self.layers = layers
         self.max_units = max_units
         
-        self.STAT = enum.IntEnum('StatsEnum', { stat:e for e,stat in enumerate(stats_list) })
+        stat_names,_ = parse_stats_list(stats_list)
+        self.STAT = enum.IntEnum('StatsEnum', { stat:e for e,stat in enumerate(stat_names) })
+        self.stats_list = stats_list_spec(stats_list)
         
-        self.board = np.zeros((self.height,self.width,self.layers),dtype=np.int32)-1
-        self.loc = np.zeros((max_units,self.loc_dims),dtype=np.int32)-1
-        self.stats = np.zeros((max_units,len(self.STAT)),dtype=np.int32)
+        if arrays is None:
+            self.board = self._make_board((self.height,self.width,self.layers),board_backend,chunk_size)
+            self.loc = np.zeros((max_units,self.loc_dims),dtype=np.int32)-1
+            self.stats = make_stats((max_units,),stats_list,np.int32)
+        else:
+            self.board, self.loc, self.stats = arrays['board'], arrays['loc'], arrays['stats']
+            if ( self.board.shape!=(self.height,self.width,self.layers) or self.loc.shape!=(max_units,self.loc_dims) or
+                 self.stats.shape!=(max_units,len(self.STAT)) ):
+                raise Exception("The given Board, Loc, & Stats arrays don't match the Grid's dimensions")
         self.shape = shape_manager
+        self.spatial = None
+        self.fov = None          # settings & cached results for line of sight, see `enable_fov()`
+        self.influence = None    # settings & cached per-side maps, see `enable_influence()`
+        self.allocator = None    # hands out free unit IDs, see `enable_unit_allocator()`
+        self.board_version = 0 # incremented whenever the Board changes, to invalidate cached results
+        self._anchor_cache = {}
+        self._field_cache = {}
+        self._field_cache_version = None
+        self._journal = None     # recorded writes, while a checkpoint is open
+        self._checkpoints = []   # open checkpoints, as (token,journal position) pairs
+        self._checkpoint_token = 0
+        self._snapshot = None
+        self._dirty_cells = []   # Board squares edited by hand, see `mark_dirty()`
+        self._dirty_units = []   # pieces whose Loc may be out of date, see `mark_dirty()`
+        self.zobrist = None      # a 64-bit hash of the Board (and some Stats), see `enable_zobrist()`
+        self._zobrist_stats = ()
     
+    def _make_board(self,shape,board_backend,chunk_size):
+        '''Allocate a blank Board using the requested backend.
+
+        The "dense" backend is a numpy array. The "chunked" backend is a `ChunkedBoard`,
+        which only allocates memory for the parts of a very large world that hold pieces.
+
+        :shape: The shape of the Board
+        :board_backend: Either "dense" or "chunked"
+        :chunk_size: The width & height of each chunk (only used by the "chunked" backend)
+        :return: A blank Board
+        '''
+
+        if board_backend=='dense':
+            return np.zeros(shape,dtype=np.int32)-1
+        elif board_backend=='chunked':
+            return ChunkedBoard(shape,chunk_size=chunk_size,fill=-1,dtype=np.int32)
+        raise Exception(f"Unknown Board backend '{board_backend}', expected 'dense' or 'chunked'")
+
+    def _occupied_cells(self,blank_square=-1):
+        '''Return the indices & values of every non-blank Board square, in row-major order.
+
+        Chunked Boards only visit their allocated chunks, so this scales with occupied area.
+
+        :blank_square: The value on the Board of an empty square
+        :return: One index array per Board dimension, followed by an array of values
+        '''
+
+        if isinstance(self.board,ChunkedBoard) and self.board.fill==blank_square:
+            return self.board.occupied()
+        mask = (self.board!=blank_square)
+        return np.nonzero(mask) + (self.board[mask],)
+
     def random_grid_locs(self):
         '''Select random locations for every possible piece, assuming pieces are 1x1.
         
@@ -68,21 +181,32 @@ class SquareMultilayerPieceGrid2D:
         :return: A Loc-like 2d numpy array of new location values for every piece
         '''
         
-        choices = np.random.choice(self.width*self.height,self.max_units)
-        return np.vstack((choices//self.width, choices-choices//self.width*self.width)).T
+        return random_grid_locs(self.height,self.width,self.max_units)
 
-    def place_pieces_randomly(self,attempts=10,layer=0):
-        '''Place pieces randomly on one layer, but highly inefficiently.
+    def place_pieces_randomly(self,attempts=10,layer=0,mode='retry'):
+        '''Place every piece randomly on one layer.
         
-        This function places pieces randomly, and retries if it fails. Since it places
-        pieces one-at-a-time this function is suitable for pieces that take up more than
-        a 1x1 square on the Board. if your pieces take up only one square use 
+        With `mode="retry"` this function picks random locations, and retries if it fails,
+        which is highly inefficient on crowded boards. With `mode="anchors"` it instead
+        samples each location from the squares where the piece currently fits (see
+        `valid_anchor_map()`), updating those as pieces are placed, so it only fails
+        when a piece no longer fits anywhere.
+
+        Since it places pieces one-at-a-time this function is suitable for pieces that take 
+        up more than a 1x1 square on the Board. if your pieces take up only one square use 
         `random_grid_locs()` instead.
         
-        :attempts: The number of piece placement attempts before the function errors out
+        :attempts: The number of piece placement attempts before the function errors out ("retry" mode only)
         :layer: The layer to place the pieces
+        :mode: Either "retry" or "anchors"
         '''
         
+        if mode=='anchors':
+            self._place_pieces_from_anchors(np.arange(self.stats.shape[0]),layer)
+            return
+        elif mode!='retry':
+            raise Exception(f"Unknown placement mode '{mode}', expected 'retry' or 'anchors'")
+
         for unit_id in range(self.stats.shape[0]):
             success = False
             for _ in range(attempts):
@@ -93,6 +217,30 @@ class SquareMultilayerPieceGrid2D:
                     break
             if not success:
                 raise Exception(f"Failed to place a unit")
+
+    def _place_pieces_from_anchors(self,unit_ids,layer):
+        '''Place pieces one-at-a-time at random locations (on one layer) where they currently fit.
+
+        One `AnchorSampler` is kept per shape. After each placement, every sampler drops
+        the anchors that would overlap the newly placed piece.
+
+        :unit_ids: The IDs of the pieces to place, in placement order
+        :layer: The layer to place the pieces on
+        '''
+
+        samplers = {}
+        for unit_id in unit_ids:
+            shape_id = int(self.stats[unit_id,self.STAT.SHAPE])
+            if shape_id not in samplers:
+                samplers[shape_id] = AnchorSampler(self.shape,shape_id,self.valid_anchor_map(shape_id,layer=layer))
+            anchor = samplers[shape_id].sample()
+            if anchor is None:
+                raise Exception(f"Failed to place a unit: no location remains where unit {unit_id} fits")
+            i,j = anchor
+            self._place_piece_without_checking_if_it_can_be_placed(unit_id,i,j,layer=layer)
+            si,sj,_ = self.shape.footprints[shape_id]
+            for sampler in samplers.values():
+                sampler.occupy(i+si,j+sj)
     
     def get_dist(self,a,b):
         '''Get the distance betwen two `(i,j)` locations (ignoring layers)
@@ -113,19 +261,8 @@ class SquareMultilayerPieceGrid2D:
         :return: The ID of the nearest enemy & the distance of that enemy
         '''
 
-        dist = float(1e10)
-        best_dist = float(1e10)
-        best_id = -1
-        
-        for _id in range(self.loc.shape[0]):
-            if self.stats[_id,self.STAT.ALIVE]:                                             # no dead pieces
-                if ignore_layer or (self.loc[_id,-1]==self.loc[unit_id,-1]):                # must be on same layer
-                    if self.stats[_id,self.STAT.SIDE]!=self.stats[unit_id,self.STAT.SIDE]:  # only match enemies
-                        dist = self.get_dist(unit_id,_id)
-                        if dist < best_dist:
-                            best_dist = dist
-                            best_id = _id
-        return best_id, best_dist
+        best_ids,best_dists = self.get_nearest_enemies([unit_id],ignore_layer=ignore_layer)
+        return int(best_ids[0]), float(best_dists[0])
 
     def get_nearest_ally(self,unit_id,ignore_layer=False):
         '''Return the nearest unit with the same STAT.SIDE as the given unit.
@@ -135,20 +272,910 @@ class SquareMultilayerPieceGrid2D:
         :return: The ID of the nearest ally & the distance of that ally
         '''
 
-        dist = float(1e10)
-        best_dist = float(1e10)
-        best_id = -1
-        
-        for _id in range(self.loc.shape[0]):
-            if self.stats[_id,self.STAT.ALIVE]:                                            # no dead pieces
-                if ignore_layer or (self.loc[_id,-1]==self.loc[unit_id,-1]):               # must be on same layer
-                    if self.stats[_id,self.STAT.SIDE]==self.stats[unit_id,self.STAT.SIDE]: # only match allies
-                        if _id!=unit_id:                                                   # no self-matching
-                            dist = self.get_dist(unit_id,_id)
-                            if dist < best_dist:
-                                best_dist = dist
-                                best_id = _id
-        return best_id, best_dist
+        best_ids,best_dists = self.get_nearest_allies([unit_id],ignore_layer=ignore_layer)
+        return int(best_ids[0]), float(best_dists[0])
+
+    def get_nearest_enemies(self,unit_ids,ignore_layer=False,chunk_size=1024):
+        '''Return the nearest enemy for many units at once.
+
+        This is the batched version of `get_nearest_enemy()`. Ties are broken in favor
+        of the smallest unit ID, and units without any enemy get the ID -1 and the
+        distance 1e10.
+
+        :unit_ids: The unit IDs to find the nearest enemies for
+        :ignore_layer: Set to True to allow finding enemies on different layers from the unit
+        :chunk_size: The number of units compared against Loc in a single numpy pass
+        :return: An array of nearest enemy IDs & an array of the distances of those enemies
+        '''
+
+        return self._get_nearest_by_side(unit_ids,allies=False,ignore_layer=ignore_layer,chunk_size=chunk_size)
+
+    def get_nearest_allies(self,unit_ids,ignore_layer=False,chunk_size=1024):
+        '''Return the nearest ally for many units at once.
+
+        This is the batched version of `get_nearest_ally()`. Ties are broken in favor
+        of the smallest unit ID, and units without any ally get the ID -1 and the
+        distance 1e10.
+
+        :unit_ids: The unit IDs to find the nearest allies for
+        :ignore_layer: Set to True to allow finding allies on different layers from the unit
+        :chunk_size: The number of units compared against Loc in a single numpy pass
+        :return: An array of nearest ally IDs & an array of the distances of those allies
+        '''
+
+        return self._get_nearest_by_side(unit_ids,allies=True,ignore_layer=ignore_layer,chunk_size=chunk_size)
+
+    def _get_nearest_by_side(self,unit_ids,allies,ignore_layer=False,chunk_size=1024,not_found=1e10):
+        '''Find the nearest living ally or enemy of each unit with numpy broadcasting.
+
+        Candidates are kept in ascending unit ID order, so `argmin` returns the smallest
+        unit ID among equally distant candidates.
+
+        :unit_ids: The unit IDs to find the nearest pieces for
+        :allies: Set to True to match pieces on the same side, and False to match enemies
+        :ignore_layer: Set to True to allow matching pieces on different layers from the unit
+        :chunk_size: The number of units compared against Loc in a single numpy pass
+        :not_found: The distance returned when no matching piece exists
+        :return: An array of nearest unit IDs & an array of the distances of those units
+        '''
+
+        unit_ids = np.asarray(unit_ids,dtype=np.int64).reshape(-1)
+        best_ids = np.full(unit_ids.shape[0],-1,dtype=np.int64)
+        best_dists = np.full(unit_ids.shape[0],not_found,dtype=np.float64)
+
+        if self.spatial is not None:
+            alive = self.stats[:,self.STAT.ALIVE]
+            for n,unit_id in enumerate(unit_ids):
+                i,j,layer = self.loc[unit_id]
+                side = self.stats[unit_id,self.STAT.SIDE]
+                sides = [side] if allies else [ key for key in self.spatial.keys() if key!=side ]
+                best_ids[n],best_dists[n] = self.spatial.nearest(i,j,sides,layer=None if ignore_layer else layer,
+                                                                 exclude=unit_id,alive=alive,not_found=not_found)
+            return best_ids, best_dists
+
+        candidates = np.flatnonzero(self.stats[:,self.STAT.ALIVE])                   # no dead pieces
+        if candidates.shape[0]==0:
+            return best_ids, best_dists
+        candidate_loc = self.loc[candidates,:-1].astype(np.int64)
+        candidate_layer = self.loc[candidates,-1]
+        candidate_side = self.stats[candidates,self.STAT.SIDE]
+
+        for start in range(0,unit_ids.shape[0],chunk_size):
+            ids = unit_ids[start:start+chunk_size]
+            dist = np.abs(self.loc[ids,None,:-1].astype(np.int64)-candidate_loc[None,:,:]).sum(axis=2) # Manhattan distance
+            same_side = (candidate_side[None,:]==self.stats[ids,self.STAT.SIDE][:,None])
+            if allies:
+                valid = same_side & (candidates[None,:]!=ids[:,None])                 # no self-matching
+            else:
+                valid = ~same_side
+            if not ignore_layer:
+                valid &= (candidate_layer[None,:]==self.loc[ids,-1][:,None])          # must be on same layer
+            valid &= (dist<not_found)
+            dist = np.where(valid,dist,np.iinfo(np.int64).max)
+            nearest = np.argmin(dist,axis=1)
+            rows = np.arange(ids.shape[0])
+            found = valid[rows,nearest]
+            best_ids[start:start+chunk_size] = np.where(found,candidates[nearest],-1)
+            best_dists[start:start+chunk_size] = np.where(found,dist[rows,nearest],not_found)
+        return best_ids, best_dists
+
+    def get_units_in_rect(self,i0,j0,i1,j1,side=None,layer=None):
+        '''Return the pieces whose `(i,j)` location is inside the rectangle `[i0,i1]x[j0,j1]`.
+
+        Only pieces on the Board are returned. Bounds are inclusive.
+
+        :i0: The smallest i-location (vertical) of the rectangle
+        :j0: The smallest j-location (horizontal) of the rectangle
+        :i1: The largest i-location (vertical) of the rectangle
+        :j1: The largest j-location (horizontal) of the rectangle
+        :side: If not None, only pieces with this STAT.SIDE are returned
+        :layer: If not None, only pieces on this layer are returned
+        :return: A sorted array of unit IDs
+        '''
+
+        if self.spatial is not None:
+            sides = None if side is None else [side]
+            return np.array(self.spatial.query_rect(i0,j0,i1,j1,keys=sides,layer=layer),dtype=np.int64)
+
+        mask = ( (self.loc[:,0]>=max(i0,0)) & (self.loc[:,0]<=i1) &
+                 (self.loc[:,1]>=max(j0,0)) & (self.loc[:,1]<=j1) )
+        if side is not None:
+            mask &= (self.stats[:,self.STAT.SIDE]==side)
+        if layer is not None:
+            mask &= (self.loc[:,2]==layer)
+        return np.flatnonzero(mask)
+
+    def get_units_within_dist(self,i,j,dist,side=None,layer=None):
+        '''Return the pieces whose `(i,j)` location is within a Manhattan distance of `(i,j)`.
+
+        :i: The i-location (vertical) to measure from
+        :j: The j-location (horizontal) to measure from
+        :dist: The largest Manhattan distance allowed (inclusive)
+        :side: If not None, only pieces with this STAT.SIDE are returned
+        :layer: If not None, only pieces on this layer are returned
+        :return: A sorted array of unit IDs
+        '''
+
+        unit_ids = self.get_units_in_rect(i-dist,j-dist,i+dist,j+dist,side=side,layer=layer)
+        within = np.abs(self.loc[unit_ids,0]-i)+np.abs(self.loc[unit_ids,1]-j) <= dist
+        return unit_ids[within]
+
+    def valid_anchor_map(self,shape_id,layer=0,unit_id=None,blank_square=-1):
+        '''Return a boolean map of every `(i,j)` location where a shape can be placed right now.
+
+        A location is valid if every square of the shape, anchored there on the given layer,
+        is on the Board and empty. The map is computed in one vectorized erosion of the
+        layer's empty squares.
+
+        :shape_id: The shape to place
+        :layer: The layer to place the shape on
+        :unit_id: If not None, squares occupied by this unit also count as empty
+        :blank_square: The value on the Board of an empty square
+        :return: A 2D boolean numpy array with the same `(i,j)` size as the Board
+        '''
+
+        free = (self.board[:,:,layer]==blank_square)
+        if unit_id is not None:
+            free |= (self.board[:,:,layer]==unit_id)
+        return self.shape.valid_anchors(shape_id,free)
+
+    def cached_valid_anchor_map(self,shape_id,layer=0):
+        '''Return `valid_anchor_map(shape_id,layer)`, reusing the last result until the Board changes.
+
+        The returned array is read-only, since it is shared between callers. Call
+        `invalidate_caches()` after editing the Board by hand.
+
+        :shape_id: The shape to place
+        :layer: The layer to place the shape on
+        :return: A read-only 2D boolean numpy array with the same `(i,j)` size as the Board
+        '''
+
+        version,anchors = self._anchor_cache.get((shape_id,layer),(None,None))
+        if version!=self.board_version:
+            anchors = self.valid_anchor_map(shape_id,layer=layer)
+            anchors.flags.writeable = False
+            self._anchor_cache[(shape_id,layer)] = (self.board_version,anchors)
+        return anchors
+
+    def distance_field(self,shape_id,layer=0,target_side=None,target_id=None,mover_side=None):
+        '''Return a BFS distance field toward a side or a single piece, cached until the Board changes.
+
+        Each anchor `(i,j)` of the field holds the number of single-square moves that a
+        piece with shape `shape_id` needs to get from there to an anchor where it touches
+        a target on one layer, or -1 if no path exists. Squares held by pieces on `mover_side`
+        don't block (they're expected to move too), and every other piece does.
+
+        Fields are shared between callers until the Board changes, so the returned array
+        is read-only. Call `invalidate_caches()` after editing the Board or Stats by hand.
+
+        :shape_id: The shape of the moving pieces
+        :layer: The layer the moving pieces are on
+        :target_side: Target every living piece with this STAT.SIDE (exclusive with `target_id`)
+        :target_id: Target a single piece (exclusive with `target_side`)
+        :mover_side: The STAT.SIDE of the moving pieces, or None if every piece blocks
+        :return: A read-only 2D int32 numpy array with the same `(i,j)` size as the Board
+        '''
+
+        if 'SIDE' not in dir(self.STAT):
+            raise Exception("The following stats are required when using distance fields: SIDE")
+        if (target_side is None)==(target_id is None):
+            raise Exception("Exactly one of target_side or target_id must be given")
+        if self._field_cache_version!=self.board_version:
+            self._field_cache = {}
+            self._field_cache_version = self.board_version
+
+        key = (shape_id,layer,target_side,target_id,mover_side)
+        field = self._field_cache.get(key)
+        if field is None:
+            field = self._compute_distance_field(shape_id,layer,target_side,target_id,mover_side)
+            field.flags.writeable = False
+            self._field_cache[key] = field
+        return field
+
+    def _compute_distance_field(self,shape_id,layer,target_side,target_id,mover_side,blank_square=-1):
+        '''Run the BFS behind `distance_field()`, without caching.'''
+
+        board = self.board[:,:,layer]
+        occupied = (board!=blank_square)
+        owner = np.where(occupied,board,0)
+        if target_id is not None:
+            target = (board==target_id)
+        else:
+            target = occupied & (self.stats[owner,self.STAT.SIDE]==target_side)
+            if 'ALIVE' in dir(self.STAT):
+                target &= (self.stats[owner,self.STAT.ALIVE]!=0)
+
+        free = ~occupied
+        if mover_side is not None:
+            free |= occupied & (self.stats[owner,self.STAT.SIDE]==mover_side)
+        free &= ~target
+        passable = self.shape.valid_anchors(shape_id,free)
+        sources = passable & ~self.shape.valid_anchors(shape_id,~touching_squares(target)) # the shape touches a target
+        return bfs_distance_field(passable,sources)
+
+    def invalidate_caches(self):
+        '''Mark every cached result as stale. Call this after editing the Board by hand.'''
+
+        self.board_version += 1
+        if self.fov is not None:
+            self.fov.clear()
+
+    def enable_spatial_index(self,bucket_size=8):
+        '''Track pieces per STAT.SIDE in buckets, to speed up proximity queries.
+
+        Once enabled, the index is kept in sync by `place_piece()`, `move_piece()`, and
+        `remove_piece()`, and is used by the nearest-piece and rectangle/distance queries.
+        Only pieces on the Board are indexed. If you edit Loc, the Board, or STAT.SIDE by
+        hand then call `rebuild_spatial_index()` afterwards.
+
+        :bucket_size: The width & height of each bucket, measured in squares
+        '''
+
+        if 'SIDE' not in dir(self.STAT):
+            raise Exception("The following stats are required when using a spatial index: SIDE")
+        self.spatial = SquareSpatialIndex(self.height,self.width,bucket_size=bucket_size)
+        self.rebuild_spatial_index()
+
+    def disable_spatial_index(self):
+        '''Stop maintaining the spatial index, and go back to scanning every piece.'''
+
+        self.spatial = None
+
+    def rebuild_spatial_index(self):
+        '''Clear the spatial index and rebuild it from Loc (over all layers).'''
+
+        if self.spatial is None:
+            return
+        self.spatial.clear()
+        for unit_id in np.flatnonzero(self.loc[:,0]>=0):
+            i,j,layer = self.loc[unit_id]
+            self.spatial.update(unit_id,i,j,self.stats[unit_id,self.STAT.SIDE],layer=layer)
+
+    def enable_fov(self,radius,blocking_stats=(),blocking_layers=None):
+        '''Start caching field-of-view results, for line of sight & fog of war.
+
+        Pieces on `blocking_layers` block sight, except that if `blocking_stats` are given
+        then only pieces with a non-zero value in one of those stats do (eg: "OPAQUE").
+        A square blocks sight if it does on any blocking layer. Results are cached per
+        viewer position & shape, and are only recomputed after a square that blocks (or
+        used to block) sight changes within `radius` of the viewer. Changes made through
+        the Grid's methods (including `set_stats()`) are tracked automatically. Call
+        `invalidate_caches()` after editing the Board or Stats by hand.
+
+        :radius: The furthest (Euclidean) distance that can be seen, measured in squares
+        :blocking_stats: The names of stats that make a piece block sight when non-zero
+        :blocking_layers: The layers whose pieces can block sight, or None for every layer
+        '''
+
+        missing = [ stat for stat in blocking_stats if stat not in dir(self.STAT) ]
+        if missing:
+            raise Exception(f"The following stats are required when using them to block sight: {', '.join(missing)}")
+        if blocking_layers is None:
+            blocking_layers = range(self.layers)
+        if any( layer<0 or layer>=self.layers for layer in blocking_layers ):
+            raise Exception(f"Blocking layers must be between 0 and {self.layers-1}")
+        self.fov = SquareFieldOfView(radius,blocking_stats=[ self.STAT[stat] for stat in blocking_stats ],
+                                     blocking_layers=blocking_layers)
+
+    def disable_fov(self):
+        '''Stop caching field-of-view results.'''
+
+        self.fov = None
+
+    def _blocks_sight(self,values,blank_square=-1):
+        '''Return which Board squares block sight, given their values (ignoring their layers).
+
+        :values: A numpy array of Board values
+        :return: A boolean numpy array with the same shape as `values`
+        '''
+
+        values = np.asarray(values)
+        opaque = (values!=blank_square)
+        if self.fov.blocking_stats:
+            owners = values[opaque]
+            opaque[opaque] = np.any([ self.stats[owners,stat]!=0 for stat in self.fov.blocking_stats ],axis=0)
+        return opaque
+
+    def _visible_window(self,unit_id):
+        '''Return the (cached) squares a piece can see, as `(i0,j0,window)`.
+
+        The window only covers the squares within `radius` of the piece, and `(i0,j0)`
+        is the Board location of its top-left square.
+        '''
+
+        i,j,layer = ( int(n) for n in self.loc[unit_id] )
+        key = (i,j,layer,int(self.stats[unit_id,self.STAT.SHAPE]))
+        cached = self.fov.get(key)
+        if cached is None:
+            r = int(np.ceil(self.fov.radius))
+            i0,j0 = max(i-r,0), max(j-r,0)
+            wi,wj = np.mgrid[i0:min(i+r+1,self.height),j0:min(j+r+1,self.width)]
+            values = np.asarray(self.board[wi[...,None],wj[...,None],np.array(self.fov.blocking_layers)])
+            opaque = ( self._blocks_sight(values) & (values!=unit_id) ).any(axis=2) # a piece doesn't block its own sight
+            cached = (i0,j0,shadowcast(opaque,i-i0,j-j0,self.fov.radius))
+            self.fov.store(key,*cached)
+        return cached
+
+    def visible_squares(self,unit_id):
+        '''Return every `(i,j)` square one piece can see from its `(i,j)` location.
+
+        Squares that block sight are visible themselves, but hide whatever is behind
+        them. Sight is symmetric: if A can see B's square then B can see A's square.
+
+        :unit_id: The ID of the viewing piece, which must be on the Board
+        :return: A 2D boolean numpy array with the same `(i,j)` size as the Board
+        '''
+
+        if self.fov is None:
+            raise Exception("Call enable_fov() before asking what pieces can see")
+        if self.loc[unit_id,0]<0:
+            raise Exception(f"Unit {unit_id} isn't on the Board")
+        visible = np.zeros((self.height,self.width),dtype=bool)
+        i0,j0,window = self._visible_window(unit_id)
+        visible[i0:i0+window.shape[0],j0:j0+window.shape[1]] = window
+        return visible
+
+    def visible_from(self,unit_ids):
+        '''Return every `(i,j)` square that any of many pieces can see, eg: a whole side's fog of war.
+
+        Pieces that aren't on the Board see nothing.
+
+        :unit_ids: An array of viewing piece IDs
+        :return: A 2D boolean numpy array with the same `(i,j)` size as the Board
+        '''
+
+        if self.fov is None:
+            raise Exception("Call enable_fov() before asking what pieces can see")
+        visible = np.zeros((self.height,self.width),dtype=bool)
+        for unit_id in np.atleast_1d(unit_ids):
+            if self.loc[unit_id,0]<0:
+                continue
+            i0,j0,window = self._visible_window(unit_id)
+            visible[i0:i0+window.shape[0],j0:j0+window.shape[1]] |= window
+        return visible
+
+    def enable_influence(self,weight_stat=None,decay=0.5,radius=8):
+        '''Start caching per-side influence & distance maps, eg: for AIs asking how contested squares are.
+
+        Each living piece adds its weight to its side's plane at its `(i,j)` location,
+        and influence spreads out from there, multiplied by `decay` with every square.
+        Maps are a snapshot, taken on the first read after `refresh_influence()` is called.
+        Call it once per tick, so that reading the maps for every piece in a tick costs one
+        recompute plus `O(1)` lookups, even while pieces move or their Stats change.
+
+        :weight_stat: The name of the stat each piece is weighted by (eg: "DMG"), or None to weigh every piece as 1
+        :decay: How much influence is multiplied by with every square it spreads
+        :radius: The furthest an influence spreads along each axis, measured in squares
+        '''
+
+        required = ['SIDE'] if weight_stat is None else ['SIDE',weight_stat]
+        missing = [ stat for stat in required if stat not in dir(self.STAT) ]
+        if missing:
+            raise Exception(f"The following stats are required when using influence maps: {', '.join(missing)}")
+        self.influence = SquareInfluenceMaps(None if weight_stat is None else self.STAT[weight_stat],decay=decay,radius=radius)
+
+    def disable_influence(self):
+        '''Stop caching influence & distance maps.'''
+
+        self.influence = None
+
+    def refresh_influence(self):
+        '''Recompute the influence & distance maps on their next read. Call this once per tick.'''
+
+        if self.influence is not None:
+            self.influence.refresh()
+
+    def _influence_sources(self):
+        '''Return `(i,j,side,weight,height,width)` for every living piece on the Board, for influence maps.'''
+
+        placed = np.flatnonzero(self.loc[:,0]>=0)
+        if 'ALIVE' in dir(self.STAT):
+            placed = placed[self.stats[placed,self.STAT.ALIVE]!=0]
+        side = self.stats[placed,self.STAT.SIDE].astype(np.int64)
+        if self.influence.weight_stat is None:
+            weight = np.ones(placed.shape[0])
+        else:
+            weight = self.stats[placed,self.influence.weight_stat].astype(np.float64)
+        return self.loc[placed,0], self.loc[placed,1], side, weight, self.height, self.width
+
+    def influence_maps(self):
+        '''Return every side's influence over every `(i,j)` square, as of the last `refresh_influence()`.
+
+        :return: A read-only 3D float64 numpy array with indices `(side,i,j)`, with a plane for every side up to the highest
+        '''
+
+        if self.influence is None:
+            raise Exception("Call enable_influence() before reading influence maps")
+        return self.influence.influence(self._influence_sources)
+
+    def distance_maps(self):
+        '''Return the Manhattan distance from every `(i,j)` square to every side's nearest living piece, as of the last `refresh_influence()`.
+
+        Distances ignore obstacles, see `distance_field()` for distances around them.
+
+        :return: A read-only 3D int32 numpy array with indices `(side,i,j)`, holding -1 for sides with no living pieces
+        '''
+
+        if self.influence is None:
+            raise Exception("Call enable_influence() before reading distance maps")
+        return self.influence.distance(self._influence_sources)
+
+    def get_influence(self,side,i,j):
+        '''Return one side's influence over the square `(i,j)`.'''
+
+        maps = self.influence_maps()
+        return float(maps[side,i,j]) if 0<=side<maps.shape[0] else 0.0
+
+    def get_threat(self,unit_id):
+        '''Return the total influence of every other side over a piece's `(i,j)` location.'''
+
+        if self.loc[unit_id,0]<0:
+            raise Exception(f"Unit {unit_id} isn't on the Board")
+        maps = self.influence_maps()
+        i,j = self.loc[unit_id,0], self.loc[unit_id,1]
+        return float(maps[:,i,j].sum()) - self.get_influence(int(self.stats[unit_id,self.STAT.SIDE]),i,j)
+
+    def enable_unit_allocator(self,reserved=()):
+        '''Track which unit IDs are in use, so `allocate()` can hand out free ones in constant time.
+
+        IDs of pieces already on the Board, and any `reserved` IDs, start out in use.
+        Allocations aren't recorded by checkpoints or snapshots, so rolling back or
+        restoring the Grid doesn't free IDs allocated since.
+
+        :reserved: Unit IDs to keep out of the allocator, eg: IDs a game manages itself
+        '''
+
+        in_use = np.union1d(np.flatnonzero(self.loc[:,0]>=0),np.asarray(reserved,dtype=np.int64))
+        self.allocator = UnitIDAllocator(self.max_units,in_use=in_use)
+
+    def _unit_allocator(self):
+        '''Return the unit ID allocator, raising if it hasn't been enabled.'''
+
+        if self.allocator is None:
+            raise Exception("Call `enable_unit_allocator()` before allocating or releasing unit IDs")
+        return self.allocator
+
+    def allocate(self):
+        '''Take one free unit ID. Its Stats row keeps whatever values it was last given.
+
+        :return: An unused unit ID
+        '''
+
+        return self._unit_allocator().allocate()
+
+    def allocate_many(self,k):
+        '''Take `k` free unit IDs at once.
+
+        :k: The number of unit IDs to take
+        :return: A numpy array of unused unit IDs
+        '''
+
+        return self._unit_allocator().allocate_many(k)
+
+    def release(self,unit_ids):
+        '''Remove pieces from the Board (if they're on it) and free their unit IDs for reuse.
+
+        :unit_ids: A unit ID, or an array of unit IDs, that were allocated
+        '''
+
+        unit_ids = np.atleast_1d(np.asarray(unit_ids,dtype=np.int64))
+        self._unit_allocator().release(unit_ids) # raises before changing anything if an ID isn't in use
+        self.remove_pieces(unit_ids)
+
+    def set_stats(self,unit_ids,stat,values):
+        '''Write values to one Stats column for some pieces.
+
+        Unlike editing `stats` by hand, writes made here are recorded while a checkpoint
+        is open (see `checkpoint()`), mark cached results stale, keep the spatial index
+        in sync when STAT.SIDE changes, and update the Zobrist hash of hashed columns.
+
+        :unit_ids: The piece ID(s) to write to (an int, array, slice, or boolean mask)
+        :stat: The Stats column to write to (eg: `STAT.HP`)
+        :values: The value(s) to write
+        '''
+
+        unit_ids = np.arange(self.stats.shape[0])[unit_ids]
+        old = self.stats[unit_ids,stat].copy()
+        if self._journal is not None:
+            self._journal.append(('stats',(np.array(unit_ids),stat),old))
+        hashed = None
+        if self.zobrist is not None and stat in self._zobrist_stats:
+            hashed = np.unique(unit_ids) # repeated IDs would XOR their keys out again
+            self.zobrist ^= xor_keys(stats_keys(hashed,stat,self.stats[hashed,stat]))
+        self.stats[unit_ids,stat] = values
+        self.board_version += 1
+        if hashed is not None:
+            self.zobrist ^= xor_keys(stats_keys(hashed,stat,self.stats[hashed,stat]))
+        if self.spatial is not None and stat==self.STAT.SIDE:
+            for unit_id in np.atleast_1d(unit_ids):
+                self._index_piece(unit_id)
+        if self.fov is not None and stat in self.fov.blocking_stats:
+            placed = np.atleast_1d(unit_ids)
+            placed = placed[self.loc[placed,0]>=0]
+            _,ci,cj,cl,_ = self._gather_piece_cells(placed,self.loc[placed,0],self.loc[placed,1],self.loc[placed,2])
+            on_blocking_layer = np.isin(cl,self.fov.blocking_layers)
+            self.fov.invalidate(ci[on_blocking_layer],cj[on_blocking_layer])
+
+    def checkpoint(self):
+        '''Start recording writes to the Board, Loc, & Stats, and return a token for `rollback()`.
+
+        Checkpoints can be nested. Only writes made through the Grid's methods (including
+        `set_stats()`) are recorded, so undoing them costs time proportional to what changed
+        rather than to the size of the Board. Every checkpoint should eventually be closed
+        with either `rollback()` or `commit()`, after which recording stops.
+
+        :return: A token identifying this checkpoint
+        '''
+
+        if self._journal is None:
+            self._journal = []
+        self._checkpoint_token += 1
+        self._checkpoints.append((self._checkpoint_token,len(self._journal)))
+        return self._checkpoint_token
+
+    def rollback(self,token):
+        '''Undo every recorded write since the given checkpoint, and close it.
+
+        Any checkpoints opened after this one are closed too.
+
+        :token: A token returned by `checkpoint()`
+        '''
+
+        position = self._close_checkpoint(token)
+        journal,self._journal = self._journal,None # the undo writes themselves aren't recorded
+        for kind,index,old in reversed(journal[position:]):
+            if kind=='cells':
+                self._set_cells(*index,old)
+            elif kind=='locs':
+                self._set_locs(index,*old.T)
+            else:
+                self.set_stats(*index,old)
+        del journal[position:]
+        self._journal = journal if self._checkpoints else None
+
+    def commit(self,token):
+        '''Keep every recorded write since the given checkpoint, and close it.
+
+        Any checkpoints opened after this one are closed too. Recording stops once no
+        checkpoint remains open.
+
+        :token: A token returned by `checkpoint()`
+        '''
+
+        self._close_checkpoint(token)
+        if not self._checkpoints:
+            self._journal = None
+
+    def _close_checkpoint(self,token):
+        '''Close a checkpoint (and every later one), returning its position in the journal.'''
+
+        for n,(open_token,position) in enumerate(self._checkpoints):
+            if open_token==token:
+                del self._checkpoints[n:]
+                return position
+        raise Exception(f"Checkpoint {token} is not open, it was already rolled back or committed")
+
+    def enable_zobrist(self,stats_list=()):
+        '''Maintain a 64-bit Zobrist hash of the Grid's state in `zobrist`.
+
+        The hash covers which piece occupies every Board square, plus the values of any
+        Stats columns named in `stats_list`. It is updated by XOR whenever pieces are
+        placed, moved, or removed, or when hashed columns are written with `set_stats()`,
+        so it's cheap enough to use as a key for memoizing search results (see
+        `TranspositionTable`). Call `rebuild_zobrist()` after editing the Board or
+        hashed Stats by hand.
+
+        :stats_list: The names of the Stats columns to include in the hash (eg: `['HP']`)
+        '''
+
+        missing = [ stat for stat in stats_list if stat not in dir(self.STAT) ]
+        if missing:
+            raise Exception(f"The following stats are required when hashing them: {', '.join(missing)}")
+        self._zobrist_stats = tuple( self.STAT[stat] for stat in stats_list )
+        self.zobrist = 0
+        self.rebuild_zobrist()
+
+    def disable_zobrist(self):
+        '''Stop maintaining the Zobrist hash.'''
+
+        self.zobrist = None
+        self._zobrist_stats = ()
+
+    def rebuild_zobrist(self,blank_square=-1):
+        '''Recompute the Zobrist hash from scratch (if it's enabled).
+
+        :blank_square: The value on the Board of an empty square
+        '''
+
+        if self.zobrist is None:
+            return
+        i,j,layer,values = self._occupied_cells(blank_square)
+        zobrist = xor_keys(board_keys(self._flat_cells(i,j,layer),values))
+        for stat in self._zobrist_stats:
+            zobrist ^= xor_keys(stats_keys(np.arange(self.stats.shape[0]),stat,self.stats[:,stat]))
+        self.zobrist = zobrist
+
+    def _rehash_cells(self,cells,old,new,blank_square=-1):
+        '''XOR the keys of changed Board squares out of (old values) & into (new values) the hash.
+
+        :cells: The flat indexes of the changed squares (each square may only appear once)
+        :old: The values of the squares before the change
+        :new: The values of the squares after the change
+        :blank_square: The value on the Board of an empty square
+        '''
+
+        cells,old,new = np.broadcast_arrays(np.atleast_1d(cells),np.atleast_1d(old),np.atleast_1d(new))
+        changed = (old!=new)
+        removed = changed & (old!=blank_square)
+        added = changed & (new!=blank_square)
+        self.zobrist ^= xor_keys(board_keys(cells[removed],old[removed])) ^ xor_keys(board_keys(cells[added],new[added]))
+
+    def snapshot(self):
+        '''Copy the Board, Loc, & Stats into buffers that are allocated once and then reused.
+
+        Only one snapshot is kept. Taking a new snapshot overwrites the last one. Chunked
+        Boards copy only their allocated chunks.
+        '''
+
+        arrays = (self.board,self.loc,self.stats)
+        if ( self._snapshot is None or 
+             any( type(buffer)!=type(array) or buffer.shape!=array.shape for buffer,array in zip(self._snapshot,arrays) ) ):
+            self._snapshot = tuple( array.copy() for array in arrays )
+            return
+        for buffer,array in zip(self._snapshot,arrays):
+            if isinstance(array,(ChunkedBoard,StatsTable)):
+                buffer.assign(array)
+            else:
+                np.copyto(buffer,array)
+
+    def restore(self):
+        '''Copy the Board, Loc, & Stats back from the last `snapshot()`.
+
+        The arrays are overwritten in place. Restoring closes every open checkpoint,
+        since their recorded writes no longer apply.
+        '''
+
+        if self._snapshot is None:
+            raise Exception("A snapshot must be taken before it can be restored")
+        for buffer,array in zip(self._snapshot,(self.board,self.loc,self.stats)):
+            if isinstance(array,(ChunkedBoard,StatsTable)):
+                array.assign(buffer)
+            else:
+                np.copyto(array,buffer)
+        self._journal = None
+        self._checkpoints = []
+        self.invalidate_caches()
+        self.rebuild_spatial_index()
+        self.rebuild_zobrist()
+
+    def save(self,path):
+        '''Save the Board, Loc, & Stats to a directory, along with a small JSON header.
+
+        The directory holds one `.npy` file per array, so it can be reopened with `open()`
+        without reading it all into memory. Chunked Boards are saved as dense arrays.
+
+        :path: The directory to save to. It's created if it doesn't exist
+        '''
+
+        save_arrays(path,self._storage_header(),self._storage_arrays())
+
+    @classmethod
+    def open(cls,path,shape_manager,mode='r'):
+        '''Open a Grid saved with `save()`, memory-mapping its Board, Loc, & Stats.
+
+        Nothing is read up front: pages are loaded from disk as they're touched, so
+        very large worlds open instantly, and many processes can map the same files.
+        Grids opened with `mode="r"` can be queried but not changed.
+
+        :path: The directory the Grid was saved to
+        :shape_manager: A shape manager object
+        :mode: "r" for read-only, "r+" to write changes back to disk, or "c" for copy-on-write
+        :return: The opened Grid
+        '''
+
+        header,arrays = open_arrays(path,mode)
+        return cls._from_storage(header,shape_manager,arrays)
+
+    def _storage_header(self):
+        '''Return a JSON-serializable description of the Grid, for saving or sharing it.'''
+
+        return {'grid':type(self).__name__,'width':self.width,'height':self.height,'layers':self.layers,
+                'max_units':self.max_units,'stats':self.stats_list}
+
+    def _storage_arrays(self):
+        '''Return the arrays that hold the Grid's state, by name. Chunked Boards are made dense.'''
+
+        return {'board':np.asarray(self.board),'loc':self.loc,**stats_to_arrays('stats',self.stats,self.stats_list)}
+
+    @classmethod
+    def _from_storage(cls,header,shape_manager,arrays):
+        '''Build a Grid over existing arrays, using a header from `_storage_header()`.'''
+
+        if header['grid']!=cls.__name__:
+            raise Exception(f"The stored Grid is a {header['grid']}, not a {cls.__name__}")
+        arrays = {'board':arrays['board'],'loc':arrays['loc'],'stats':stats_from_arrays('stats',arrays,header['stats'])}
+        return cls(header['width'],header['height'],header['max_units'],shape_manager,header['stats'],header['layers'],arrays=arrays)
+
+    def flush(self):
+        '''Write changes to the Board, Loc, & Stats back to disk, for Grids opened with `mode="r+"`.'''
+
+        for array in (self.board,self.loc,*stats_to_arrays('stats',self.stats,self.stats_list).values()):
+            if isinstance(array,np.memmap):
+                array.flush()
+
+    def _set_loc(self,unit_id,i,j,layer):
+        '''Write a piece's `(i,j,layer)` location to Loc, keeping the spatial index in sync.
+
+        :unit_id: The ID of the piece
+        :i: The new i-location (vertical), or -1 if the piece is off the Board
+        :j: The new j-location (horizontal), or -1 if the piece is off the Board
+        :layer: The new layer, or -1 if the piece is off the Board
+        '''
+
+        if self._journal is not None:
+            self._journal.append(('locs',np.array([unit_id]),self.loc[[unit_id]].copy()))
+        self.loc[unit_id,0] = i
+        self.loc[unit_id,1] = j
+        self.loc[unit_id,2] = layer
+        self._index_piece(unit_id)
+
+    def _set_locs(self,unit_ids,i,j,layer):
+        '''Write many pieces' `(i,j,layer)` locations to Loc, keeping the spatial index in sync.
+
+        :unit_ids: An array of piece IDs
+        :i: The new i-locations (vertical), or -1 for pieces that are off the Board
+        :j: The new j-locations (horizontal), or -1 for pieces that are off the Board
+        :layer: The new layers, or -1 for pieces that are off the Board
+        '''
+
+        if self._journal is not None:
+            self._journal.append(('locs',np.array(unit_ids),self.loc[unit_ids].copy()))
+        self.loc[unit_ids,0] = i
+        self.loc[unit_ids,1] = j
+        self.loc[unit_ids,2] = layer
+        if self.spatial is not None:
+            for unit_id in unit_ids:
+                self._index_piece(unit_id)
+
+    def _index_piece(self,unit_id):
+        '''Update a piece's entry in the spatial index (if there is one) from Loc.'''
+
+        if self.spatial is None:
+            return
+        i,j,layer = self.loc[unit_id]
+        if i<0:
+            self.spatial.remove(unit_id)
+        else:
+            self.spatial.update(unit_id,i,j,self.stats[unit_id,self.STAT.SIDE],layer=layer)
+
+    def _set_cells(self,i,j,layer,values):
+        '''Write values to Board squares with numpy fancy indexing.
+
+        :i: An array of i-locations (vertical)
+        :j: An array of j-locations (horizontal)
+        :layer: An array of layers
+        :values: The value(s) to write to the squares
+        '''
+
+        old = self.board[i,j,layer].copy()
+        if self._journal is not None:
+            self._journal.append(('cells',(np.array(i),np.array(j),np.array(layer)),old))
+        self.board[i,j,layer] = values
+        self.board_version += 1
+        if self.zobrist is not None:
+            self._rehash_cells(self._flat_cells(np.asarray(i),np.asarray(j),np.asarray(layer)),old,self.board[i,j,layer])
+        if self.fov is not None:
+            i,j,layer,old = np.broadcast_arrays(i,j,layer,old)
+            changed = (self._blocks_sight(old) | self._blocks_sight(self.board[i,j,layer])) & np.isin(layer,self.fov.blocking_layers)
+            self.fov.invalidate(i[changed],j[changed])
+
+    def _gather_piece_cells(self,unit_ids,i,j,layer):
+        '''Return the Board squares every given piece would cover if anchored at `(i,j,layer)`.
+
+        :unit_ids: An array of piece IDs
+        :i: An array of anchor i-locations (vertical), one per piece
+        :j: An array of anchor j-locations (horizontal), one per piece
+        :layer: An array of layers, one per piece
+        :return: The arrays `owner`, `ci`, `cj`, `cl`, & per-piece `in_bounds` (see `SquareShapeManager.gather_cells`)
+        '''
+
+        owner,si,sj = self.shape.gather_cells(self.stats[unit_ids,self.STAT.SHAPE])
+        ci = i[owner]+si
+        cj = j[owner]+sj
+        cl = layer[owner]
+        cell_in_bounds = ( (ci>=0) & (ci<self.board.shape[0]) & (cj>=0) & (cj<self.board.shape[1]) &
+                           (cl>=0) & (cl<self.board.shape[2]) )
+        in_bounds = np.bincount(owner[~cell_in_bounds],minlength=unit_ids.shape[0])==0
+        return ( owner, np.where(cell_in_bounds,ci,0), np.where(cell_in_bounds,cj,0),
+                 np.where(cell_in_bounds,cl,0), in_bounds )
+
+    def _flat_cells(self,ci,cj,cl):
+        '''Convert `(i,j,layer)` Board squares to flat indices.'''
+
+        return (ci*self.board.shape[1]+cj)*self.board.shape[2]+cl
+
+    def move_pieces(self,unit_ids,di,dj,conflict='lowest_id'):
+        '''Move many pieces at once, as if all of the moves happened simultaneously.
+
+        Each piece originally located at `(i,j)` tries to move to `(i+di,j+dj)`, staying
+        on its own layer. A piece may move into squares that other moving pieces leave.
+        Collisions are resolved by the `conflict` policy:
+        * "lowest_id" - the lowest unit ID wins a contested square, and losing pieces stay put
+        * "reject" - if any piece can't move then no piece moves
+
+        :unit_ids: An array of piece IDs to move (each ID may only appear once)
+        :di: The change(s) in the i-direction (vertical), either one value or one per piece
+        :dj: The change(s) in the j-direction (horizontal), either one value or one per piece
+        :conflict: The conflict policy, either "lowest_id" or "reject"
+        :return: A boolean array for the success or failure of each piece's move
+        '''
+
+        unit_ids = np.asarray(unit_ids,dtype=np.int64).reshape(-1)
+        validate_batch(unit_ids,conflict)
+        if unit_ids.shape[0]==0:
+            return np.zeros(0,dtype=bool)
+        di = np.broadcast_to(np.asarray(di,dtype=np.int64),unit_ids.shape)
+        dj = np.broadcast_to(np.asarray(dj,dtype=np.int64),unit_ids.shape)
+        old_i = self.loc[unit_ids,0].astype(np.int64)
+        old_j = self.loc[unit_ids,1].astype(np.int64)
+        layer = self.loc[unit_ids,2].astype(np.int64)
+
+        owner,ci,cj,cl,in_bounds = self._gather_piece_cells(unit_ids,old_i+di,old_j+dj,layer)
+        unit_ok = in_bounds & (old_i>=0)
+        moved = resolve_moves(unit_ids,owner,self._flat_cells(ci,cj,cl),self.board[ci,cj,cl],unit_ok,conflict=conflict)
+
+        claims = moved[owner]
+        self._set_cells(ci[claims]-di[owner][claims],cj[claims]-dj[owner][claims],cl[claims],-1)
+        self._set_cells(ci[claims],cj[claims],cl[claims],unit_ids[owner][claims])
+        self._set_locs(unit_ids[moved],old_i[moved]+di[moved],old_j[moved]+dj[moved],layer[moved])
+        return moved
+
+    def place_pieces(self,unit_ids,i,j,layer=0,conflict='lowest_id'):
+        '''Place many pieces at once, at the given `(i,j,layer)` locations.
+
+        Collisions are resolved by the `conflict` policy:
+        * "lowest_id" - the lowest unit ID wins a contested square, and losing pieces aren't placed
+        * "reject" - if any piece can't be placed then no piece is placed
+
+        :unit_ids: An array of piece IDs to place (each ID may only appear once)
+        :i: The i-location(s) (vertical), either one value or one per piece
+        :j: The j-location(s) (horizontal), either one value or one per piece
+        :layer: The layer(s) to place the pieces on, either one value or one per piece
+        :conflict: The conflict policy, either "lowest_id" or "reject"
+        :return: A boolean array for the success or failure of each piece's placement
+        '''
+
+        unit_ids = np.asarray(unit_ids,dtype=np.int64).reshape(-1)
+        validate_batch(unit_ids,conflict)
+        if unit_ids.shape[0]==0:
+            return np.zeros(0,dtype=bool)
+        i = np.broadcast_to(np.asarray(i,dtype=np.int64),unit_ids.shape)
+        j = np.broadcast_to(np.asarray(j,dtype=np.int64),unit_ids.shape)
+        layer = np.broadcast_to(np.asarray(layer,dtype=np.int64),unit_ids.shape)
+
+        owner,ci,cj,cl,in_bounds = self._gather_piece_cells(unit_ids,i,j,layer)
+        placed = resolve_placements(unit_ids,owner,self._flat_cells(ci,cj,cl),self.board[ci,cj,cl],in_bounds,conflict=conflict)
+
+        claims = placed[owner]
+        self._set_cells(ci[claims],cj[claims],cl[claims],unit_ids[owner][claims])
+        self._set_locs(unit_ids[placed],i[placed],j[placed],layer[placed])
+        return placed
+
+    def remove_pieces(self,unit_ids):
+        '''Remove many pieces from the Board & from Loc at once.
+
+        :unit_ids: An array of piece IDs to remove
+        :return: A boolean array of which pieces were on the Board (and so were removed)
+        '''
+
+        unit_ids = np.asarray(unit_ids,dtype=np.int64).reshape(-1)
+        on_board = self.loc[unit_ids,0]>=0
+        removed_ids = unit_ids[on_board]
+        owner,ci,cj,cl,_ = self._gather_piece_cells(removed_ids,self.loc[removed_ids,0],
+                                                    self.loc[removed_ids,1],self.loc[removed_ids,2])
+        self._set_cells(ci,cj,cl,-1)
+        self._set_locs(removed_ids,-1,-1,-1)
+        return on_board
 
     def move_piece(self,unit_id,di,dj,layer=0):
         '''Move a piece with `unit_id` to location `(i+di,j+dj)`.
@@ -157,7 +1184,11 @@ class SquareMultilayerPieceGrid2D:
         the piece was originally located at `(i,j)` then its new location is `(i+di,j+dj)`.
         
         If the piece cannot move, this function will not move the piece, and return False.
-        If the piece can move, this function will move the piece and return True.
+        If the piece can move, this function will move the piece and return True. Pieces
+        that aren't on the Board can't move (use `place_piece()` instead).
+
+        Single-square moves only check & rewrite the squares entering and leaving the
+        piece's footprint (see the Shape Manager's `edges`).
 
         A unit's layer can also be changed via this function.
 
@@ -169,11 +1200,44 @@ class SquareMultilayerPieceGrid2D:
         '''
 
         i,j,layer = self.loc[unit_id]
+        if i<0:
+            return False # pieces that aren't on the Board can't move
+        if abs(di)+abs(dj)==1:
+            return self._step_piece(unit_id,i,j,layer,di,dj)
         if self.piece_can_be_placed_here(unit_id,i+di,j+dj,layer=layer):
             self._move_piece_without_checking_if_it_can_be_placed(unit_id,di,dj,layer=layer)
             return True
         else:
             return False
+
+    def _step_piece(self,unit_id,i,j,layer,di,dj,blank_square=-1):
+        '''Move a piece on the Board by a single non-diagonal square, within its layer.
+
+        Only the squares entering the piece's footprint are checked, and only the squares
+        entering & leaving the footprint are written, using the Shape Manager's edge tables.
+
+        :unit_id: The ID of the piece to move
+        :i: The current i-location (vertical) of the piece
+        :j: The current j-location (horizontal) of the piece
+        :layer: The current layer of the piece
+        :di: The change in the i-direction (vertical), one of -1, 0, or 1
+        :dj: The change in the j-direction (horizontal), one of -1, 0, or 1
+        :blank_square: The value on the Board of an empty square
+        :return: A boolean value for the success or failure of the attempted move
+        '''
+
+        edges = self.shape.edges[self.stats[unit_id,self.STAT.SHAPE]][self.shape.DIRECTION_INDEX[(di,dj)]]
+        enter_si,enter_sj,(i_min,j_min,i_max,j_max),leave_si,leave_sj = edges
+        if ( i+i_min<0 or i+i_max>=self.board.shape[0] or 
+             j+j_min<0 or j+j_max>=self.board.shape[1] ):
+            return False
+        squares = self.board[i+enter_si,j+enter_sj,layer]
+        if not np.all((squares==blank_square) | (squares==unit_id)):
+            return False
+        self._set_cells(i+leave_si,j+leave_sj,layer,blank_square)
+        self._set_cells(i+enter_si,j+enter_sj,layer,unit_id)
+        self._set_loc(unit_id,i+di,j+dj,layer)
+        return True
     
     def _move_piece_without_checking_if_it_can_be_placed(self,unit_id,di,dj,layer=None):
         '''Move a piece with `unit_id` to location `(i+di,j+dj)`, without safety checks.
@@ -188,20 +1252,12 @@ class SquareMultilayerPieceGrid2D:
         :layer: The layer to move the piece to
         '''
 
-        si,sj = 0,0
         i,j,old_layer = self.loc[unit_id]
         new_layer = old_layer if layer is None else layer # don't move between layers if layer arg isn't specified
-        shape_start = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.START]
-        shape_end   = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.END]
-        for s in range(shape_start,shape_end):
-            si,sj = self.shape.mask[s]
-            self.board[i+si,j+sj,old_layer] = -1
-        for s in range(shape_start,shape_end):
-            si,sj = self.shape.mask[s]
-            self.board[i+si+di,j+sj+dj,new_layer] = unit_id
-        self.loc[unit_id,0] += di
-        self.loc[unit_id,1] += dj
-        self.loc[unit_id,2] = new_layer
+        si,sj,_ = self.shape.footprints[self.stats[unit_id,self.STAT.SHAPE]]
+        self._set_cells(i+si,j+sj,old_layer,-1)
+        self._set_cells(i+si+di,j+sj+dj,new_layer,unit_id)
+        self._set_loc(unit_id,i+di,j+dj,new_layer)
 
     def place_piece(self,unit_id,i,j,layer=0):
         '''Place a piece with `unit_id` to location `(i,j)`, optionally specifying a layer.
@@ -236,15 +1292,9 @@ class SquareMultilayerPieceGrid2D:
         :layer: The layer to move the piece to
         '''
         
-        si,sj = 0,0
-        shape_start = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.START]
-        shape_end   = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.END]
-        for s in range(shape_start,shape_end):
-            si,sj = self.shape.mask[s]
-            self.board[i+si,j+sj,layer] = unit_id
-        self.loc[unit_id,0] = i
-        self.loc[unit_id,1] = j
-        self.loc[unit_id,2] = layer
+        si,sj,_ = self.shape.footprints[self.stats[unit_id,self.STAT.SHAPE]]
+        self._set_cells(i+si,j+sj,layer,unit_id)
+        self._set_loc(unit_id,i,j,layer)
             
     def remove_piece(self,unit_id):
         '''Remove the piece with the given `unit_id` from the Board & from Loc.
@@ -252,14 +1302,12 @@ class SquareMultilayerPieceGrid2D:
         :unit_id: The piece to remove from the Board & Loc
         '''
 
-        si,sj = 0,0
         i,j,layer = self.loc[unit_id]
-        shape_start = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.START]
-        shape_end   = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.END]
-        for s in range(shape_start,shape_end):
-            si,sj = self.shape.mask[s]
-            self.board[i+si,j+sj,layer] = -1
-        self.loc[unit_id,:] = -1
+        if i<0:
+            return # the piece is already off the Board
+        si,sj,_ = self.shape.footprints[self.stats[unit_id,self.STAT.SHAPE]]
+        self._set_cells(i+si,j+sj,layer,-1)
+        self._set_loc(unit_id,-1,-1,-1)
     
     def piece_can_be_placed_here(self,unit_id,i,j,layer=0):
         '''Check if the piece with the given `unit_id` can be placed to `(i,j)`.
@@ -272,20 +1320,92 @@ class SquareMultilayerPieceGrid2D:
         :return: A boolean value for whether or not the piece can be placed here
         '''
 
-        if layer<0 or layer>=self.board.shape[0]:
+        if layer<0 or layer>=self.board.shape[2]:
             return False
-        shape_start = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.START]
-        shape_end   = self.shape.info[self.stats[unit_id,self.STAT.SHAPE],self.shape.END]
-        for s in range(shape_start,shape_end):
-            si,sj = self.shape.mask[s]
-            if ( i+si<0 or i+si>=self.board.shape[0] or 
-                 j+sj<0 or j+sj>=self.board.shape[1] ):
-                return False
-            elif ( self.board[i+si,j+sj,layer] != -1 and
-                   self.board[i+si,j+sj,layer] != unit_id ):
-                return False
-        return True
+        si,sj,(i_min,j_min,i_max,j_max) = self.shape.footprints[self.stats[unit_id,self.STAT.SHAPE]]
+        if ( i+i_min<0 or i+i_max>=self.board.shape[0] or 
+             j+j_min<0 or j+j_max>=self.board.shape[1] ):
+            return False
+        squares = self.board[i+si,j+sj,layer]
+        return bool(np.all((squares==-1) | (squares==unit_id)))
     
+    def compact_rows(self,rows,direction='down',blank_square=-1):
+        '''Delete whole rows of the Board, and shift the rows above (or below) them to close the gap.
+
+        Pieces with any square in a deleted row are removed from the Board. Pieces that
+        shift have only their Loc rows updated, and only the rows between the deleted rows
+        and the edge the Board is shifted away from are read & written. The rows span every layer.
+
+        :rows: The rows to delete
+        :direction: "down" shifts the rows above the gap down, "up" shifts the rows below it up
+        :blank_square: The value on the Board of an empty square
+        :return: An array of the IDs of pieces removed along with the rows
+        '''
+
+        if direction not in ('down','up'):
+            raise Exception(f"Unknown direction '{direction}', expected 'down' or 'up'")
+        return self._compact_lines(rows,0,direction=='down',blank_square)
+
+    def compact_cols(self,cols,direction='right',blank_square=-1):
+        '''Delete whole columns of the Board, and shift the columns beside them to close the gap.
+
+        Works like `compact_rows()`, but on columns. The columns span every layer.
+
+        :cols: The columns to delete
+        :direction: "right" shifts the columns left of the gap right, "left" shifts the columns right of it left
+        :blank_square: The value on the Board of an empty square
+        :return: An array of the IDs of pieces removed along with the columns
+        '''
+
+        if direction not in ('right','left'):
+            raise Exception(f"Unknown direction '{direction}', expected 'right' or 'left'")
+        return self._compact_lines(cols,1,direction=='right',blank_square)
+
+    def _compact_lines(self,lines,axis,toward_end,blank_square=-1):
+        '''Delete rows (`axis=0`) or columns (`axis=1`) and shift the Board over the gap.
+
+        :lines: The rows or columns to delete
+        :axis: 0 for rows, 1 for columns
+        :toward_end: Whether lines shift toward the end of the axis (down/right) or the start (up/left)
+        :blank_square: The value on the Board of an empty square
+        :return: An array of the IDs of pieces removed along with the lines
+        '''
+
+        size = self.board.shape[axis]
+        lines = np.unique(np.asarray(lines,dtype=np.int64))
+        if lines.shape[0]==0:
+            return lines
+        if lines[0]<0 or lines[-1]>=size:
+            raise Exception("Can't compact lines that are off the Board")
+
+        # remove every piece touching a deleted line, wherever its other squares are
+        deleted = np.asarray(self.board[(slice(None),)*axis+(lines,)])
+        removed = np.unique(deleted[deleted!=blank_square])
+        self.remove_pieces(removed)
+
+        # only the lines between the far edge and the last deleted line move
+        start,stop = (0,lines[-1]+1) if toward_end else (lines[0],size)
+        old = np.moveaxis(np.asarray(self.board[(slice(None),)*axis+(slice(start,stop),)]),axis,0)
+        kept = np.setdiff1d(np.arange(start,stop),lines)-start
+        new = np.full_like(old,blank_square)
+        if toward_end:
+            new[new.shape[0]-kept.shape[0]:] = old[kept]
+        else:
+            new[:kept.shape[0]] = old[kept]
+        changed = np.nonzero(new!=old)
+        cells = list(changed[1:])
+        cells.insert(axis,changed[0]+start)
+        self._set_cells(*cells,new[changed])
+
+        moved = np.unique(old[old!=blank_square])
+        loc = self.loc[moved].copy()
+        if toward_end:
+            loc[:,axis] += lines.shape[0]-np.searchsorted(lines,loc[:,axis],side='right')
+        else:
+            loc[:,axis] -= np.searchsorted(lines,loc[:,axis],side='left')
+        self._set_locs(moved,*loc.T)
+        return removed
+
     def rebuild_loc_from_board(self,blank_square=-1,off_board=-1):
         '''Clear Loc and fill it in using piece locations on the Board.
         
@@ -298,10 +1418,16 @@ class SquareMultilayerPieceGrid2D:
         :off_board: The value assigned to Loc values when a piece has no location
         '''
 
+        i,j,layer,piece_ids = self._occupied_cells(blank_square)
+        unit_ids = np.unique(piece_ids)
+        anchor_i,anchor_j,anchor_layer = self._anchors_from_cells(unit_ids,i,j,layer,piece_ids,off_board)
         self.loc[:] = off_board
-        piece_mask = (self.board!=blank_square)
-        piece_ids = self.board[piece_mask]
-        self.loc[piece_ids] = np.vstack(np.where(piece_mask)).T
+        self.loc[unit_ids,0] = anchor_i
+        self.loc[unit_ids,1] = anchor_j
+        self.loc[unit_ids,2] = anchor_layer
+        self._dirty_cells, self._dirty_units = [], []
+        self.rebuild_spatial_index()
+        self.rebuild_zobrist()
 
     def rebuild_board_from_loc(self,blank_square=-1,off_board=-1):
         '''Clear Board and fill it in using piece locations on Loc.
@@ -316,7 +1442,94 @@ class SquareMultilayerPieceGrid2D:
         '''
 
         self.board[:] = blank_square
-        self.board[self.loc[:,0],self.loc[:,1],self.loc[:,2]] = np.arange(self.loc.shape[0])
+        unit_ids = np.flatnonzero(self.loc[:,0]>=0)
+        owner,ci,cj,cl,in_bounds = self._gather_piece_cells(unit_ids,self.loc[unit_ids,0],self.loc[unit_ids,1],self.loc[unit_ids,2])
+        drawn = in_bounds[owner]
+        self.board[ci[drawn],cj[drawn],cl[drawn]] = unit_ids[owner[drawn]]
+        self._dirty_cells, self._dirty_units = [], []
+        self.invalidate_caches()
+        self.rebuild_spatial_index()
+        self.rebuild_zobrist()
+
+    def _anchors_from_cells(self,unit_ids,i,j,layer,values,off_board=-1):
+        '''Find pieces' anchors from the Board squares they cover.
+
+        A piece's anchor is the smallest i & j of its squares, less the offsets of its
+        shape's bounding box, so multi-square pieces get back the anchor they were
+        placed at, whichever of their squares are listed first.
+
+        :unit_ids: A sorted array of piece IDs to find anchors for
+        :i: An array of Board square i-locations (vertical)
+        :j: An array of Board square j-locations (horizontal)
+        :layer: An array of Board square layers
+        :values: The values on those squares. Squares not holding one of `unit_ids` are ignored
+        :off_board: The location given to pieces that don't cover any of the squares
+        :return: The arrays of anchor i-locations, j-locations, & layers, one per piece
+        '''
+
+        found = np.isin(values,unit_ids)
+        position = np.searchsorted(unit_ids,values[found])
+        not_found = np.iinfo(np.int64).max
+        min_i = np.full(unit_ids.shape[0],not_found,dtype=np.int64)
+        min_j = np.full(unit_ids.shape[0],not_found,dtype=np.int64)
+        np.minimum.at(min_i,position,np.asarray(i)[found])
+        np.minimum.at(min_j,position,np.asarray(j)[found])
+        anchor_layer = np.full(unit_ids.shape[0],off_board,dtype=np.int64)
+        anchor_layer[position] = np.asarray(layer)[found] # every square of a piece is on one layer
+        bbox = self.shape.bbox[self.stats[unit_ids,self.STAT.SHAPE]]
+        on_board = (min_i!=not_found)
+        return np.where(on_board,min_i-bbox[:,0],off_board), np.where(on_board,min_j-bbox[:,1],off_board), anchor_layer
+
+    def mark_dirty(self,i=None,j=None,layer=None,unit_ids=None):
+        '''Mark Board squares edited by hand (and/or pieces) so `sync()` can update their Loc.
+
+        The pieces on the given squares are marked when this is called, so marking the
+        squares both before & after an edit also catches pieces the edit erased. You can
+        instead pass the IDs of pieces that were erased or overwritten as `unit_ids`.
+
+        :i: An array of i-locations (vertical) of edited squares
+        :j: An array of j-locations (horizontal) of edited squares
+        :layer: An array of layers of edited squares
+        :unit_ids: An array of piece IDs whose Loc may be out of date
+        '''
+
+        if i is not None:
+            i,j,layer = ( np.asarray(a,dtype=np.int64).reshape(-1) for a in np.broadcast_arrays(i,j,layer) )
+            self._dirty_cells.append((i,j,layer))
+            self._dirty_units.append(np.asarray(self.board[i,j,layer]).reshape(-1))
+        if unit_ids is not None:
+            self._dirty_units.append(np.atleast_1d(np.asarray(unit_ids,dtype=np.int64)))
+
+    def sync(self,blank_square=-1):
+        '''Update Loc for the pieces marked by `mark_dirty()`, from the Board squares they cover.
+
+        Unlike `rebuild_loc_from_board()` this only reads the marked squares, and the squares
+        the marked pieces covered before, since every other square is unchanged. The Board
+        is also treated as edited, so caches are invalidated and the Zobrist hash (if it's
+        enabled) is recomputed.
+
+        :blank_square: The value on the Board of an empty square
+        :return: An array of the IDs of the pieces that were updated
+        '''
+
+        if not self._dirty_cells and not self._dirty_units:
+            return np.zeros(0,dtype=np.int64)
+        cells = [ np.concatenate(axis) for axis in zip(*self._dirty_cells) ] or [np.zeros(0,dtype=np.int64)]*3
+        unit_ids = np.concatenate(self._dirty_units+[np.asarray(self.board[cells[0],cells[1],cells[2]]).reshape(-1)])
+        unit_ids = np.unique(unit_ids[unit_ids!=blank_square])
+        self._dirty_cells, self._dirty_units = [], []
+
+        # a piece can only cover squares that were edited, or that it covered before
+        placed = unit_ids[self.loc[unit_ids,0]>=0]
+        _,ci,cj,cl,_ = self._gather_piece_cells(placed,self.loc[placed,0],self.loc[placed,1],self.loc[placed,2])
+        flat = np.unique(np.concatenate((self._flat_cells(*cells),self._flat_cells(ci,cj,cl))))
+        ci,rest = np.divmod(flat,self.board.shape[1]*self.board.shape[2])
+        cj,cl = np.divmod(rest,self.board.shape[2])
+        anchor_i,anchor_j,anchor_layer = self._anchors_from_cells(unit_ids,ci,cj,cl,np.asarray(self.board[ci,cj,cl]))
+        self._set_locs(unit_ids,anchor_i,anchor_j,anchor_layer)
+        self.invalidate_caches()
+        self.rebuild_zobrist()
+        return unit_ids
 
     def step_closer(self,unit_id,target_id):
         '''Convenience function to move one unit a single square closer to another.
@@ -329,7 +1542,8 @@ class SquareMultilayerPieceGrid2D:
         (eg: if you're 3 squares away horizontally and 1 square away vertically,
         then this function will move you horizontally preferentially, since 3>1).
 
-        This function does not let pieces move diagonally as a single move.
+        This function does not let pieces move diagonally as a single move, and doesn't
+        path around obstacles. Use `step_along_field()` to do so.
 
         Layers are ignored by this function.
 
@@ -339,6 +1553,7 @@ class SquareMultilayerPieceGrid2D:
         '''
 
         di,dj = self.loc[unit_id,:-1]-self.loc[target_id,:-1]
+        result = False
         if np.abs(di)>=np.abs(dj):
             if di<0:
                 result = self.move_piece(unit_id,1,0) # down
@@ -352,6 +1567,44 @@ class SquareMultilayerPieceGrid2D:
         
         return result
 
+    def step_along_field(self,unit_ids,target_side=None,target_id=None,conflict='lowest_id'):
+        '''Move many pieces one square each along shared distance fields toward a target.
+
+        Unlike `step_closer()`, pieces path around obstacles instead of jamming against
+        them. Pieces with the same shape & side share one `distance_field()`, so a whole
+        army chasing one side costs one BFS per tick. Each piece moves to the neighboring
+        anchor with the smallest distance (if it's smaller than its own), and then all of
+        the moves are made together with `move_pieces()`. Pieces already touching a
+        target, or with no path, stay put.
+
+        Pieces stay on their own layer, and only follow targets on that layer.
+
+        :unit_ids: An array of piece IDs to move (each ID may only appear once)
+        :target_side: Move toward the living pieces with this STAT.SIDE (exclusive with `target_id`)
+        :target_id: Move toward this single piece (exclusive with `target_side`)
+        :conflict: The conflict policy used by `move_pieces()`
+        :return: A boolean array for whether each piece moved
+        '''
+
+        unit_ids = np.asarray(unit_ids,dtype=np.int64).reshape(-1)
+        di = np.zeros(unit_ids.shape[0],dtype=np.int64)
+        dj = np.zeros(unit_ids.shape[0],dtype=np.int64)
+        movers = (self.loc[unit_ids,0]>=0) & (unit_ids!=(-1 if target_id is None else target_id))
+        groups = np.stack((self.stats[unit_ids,self.STAT.SHAPE],self.stats[unit_ids,self.STAT.SIDE],self.loc[unit_ids,2]),axis=1)
+
+        # every field is built before any piece moves, since moves invalidate the cache
+        for group in np.unique(groups[movers],axis=0):
+            shape_id,side,layer = (int(value) for value in group)
+            members = movers & (groups==group).all(axis=1)
+            field = self.distance_field(shape_id,layer=layer,target_side=target_side,target_id=target_id,mover_side=side)
+            di[members],dj[members] = descend_field(field,self.loc[unit_ids[members],0],self.loc[unit_ids[members],1],
+                                                    directions=self.shape.DIRECTIONS)
+
+        moved = np.zeros(unit_ids.shape[0],dtype=bool)
+        stepping = (di!=0) | (dj!=0)
+        moved[stepping] = self.move_pieces(unit_ids[stepping],di[stepping],dj[stepping],conflict=conflict)
+        return moved
+
     def pixels_to_grid(self,x,y,scale):
         '''Convert from screen coordinates to a grid `(i,j)` location.'''
 
@@ -0,0 +1,94 @@
+import numpy as np
+
+def sample_without_replacement(population,k):
+    '''Select `k` distinct random integers from `range(population)`, in random order.
+
+    `np.random.choice(population,k,replace=False)` shuffles the whole population, which
+    is slow and memory hungry for very large boards. When `k` is small compared to the
+    population this draws with replacement instead, dropping repeats until `k` distinct
+    values remain, so the cost scales with `k` rather than with `population`.
+
+    :population: The number of values to choose from
+    :k: The number of distinct values to choose
+    :return: A 1D numpy array of `k` distinct integers
+    '''
+
+    if k>population:
+        raise Exception(f"Cannot select {k} distinct locations from only {population} squares")
+    if 2*k>=population:
+        return np.random.permutation(population)[:k]
+
+    chosen = np.zeros(0,dtype=np.int64)
+    while chosen.shape[0]<k:
+        draws = np.random.randint(0,population,size=2*(k-chosen.shape[0]),dtype=np.int64)
+        chosen = np.concatenate((chosen,draws))
+        _,first = np.unique(chosen,return_index=True)
+        chosen = chosen[np.sort(first)] # drop repeats, keeping the random draw order
+    return chosen[:k]
+
+def random_grid_locs(grid_height,grid_width,k):
+    '''Select `k` distinct random `(i,j)` locations on a Board.
+
+    :grid_height: The height of the Board, measured in squares
+    :grid_width: The width of the Board, measured in squares
+    :k: The number of locations to select
+    :return: A Loc-like 2d numpy array with `k` rows of `[i,j]` locations
+    '''
+
+    choices = sample_without_replacement(grid_height*grid_width,k)
+    return np.vstack((choices//grid_width, choices%grid_width)).T
+
+class AnchorSampler:
+    '''Sample random valid anchors for one shape, updating them as pieces are placed.
+
+    The sampler keeps the shape's valid anchor map along with an array of candidate
+    anchors. Candidates that stop being valid are removed lazily, with a swap-remove,
+    the next time they're drawn. Each draw is therefore uniform over the anchors that
+    are still valid, and the total work is proportional to the number of anchors
+    invalidated rather than to the number of retries.
+
+    Parameters
+    ----------
+    :shape_manager: The shape manager holding the sampled shape
+    :shape_id: The shape to sample anchors for
+    :anchors: A 2D boolean numpy array of currently valid anchors (it will be modified)
+
+    Methods
+    -------
+    :sample: Return a random valid `(i,j)` anchor, or None if no valid anchor remains
+    :occupy: Invalidate the anchors that would overlap newly occupied squares
+    '''
+
+    def __init__(self,shape_manager,shape_id,anchors):
+
+        self.shape = shape_manager
+        self.shape_id = shape_id
+        self.anchors = anchors
+        self._candidates = np.flatnonzero(anchors)
+        self._n = self._candidates.shape[0]
+
+    def sample(self):
+        '''Return a random valid `(i,j)` anchor, or None if no valid anchor remains.'''
+
+        width = self.anchors.shape[1]
+        while self._n>0:
+            k = np.random.randint(self._n)
+            flat = self._candidates[k]
+            if self.anchors[flat//width,flat%width]:
+                return int(flat//width), int(flat%width)
+            self._n -= 1
+            self._candidates[k] = self._candidates[self._n]
+        return None
+
+    def occupy(self,i,j):
+        '''Invalidate every anchor whose footprint would overlap the given squares.
+
+        :i: An array of newly occupied i-locations (vertical)
+        :j: An array of newly occupied j-locations (horizontal)
+        '''
+
+        si,sj,_ = self.shape.footprints[self.shape_id]
+        ai = (np.asarray(i)[:,None]-si[None,:]).ravel()
+        aj = (np.asarray(j)[:,None]-sj[None,:]).ravel()
+        on_board = (ai>=0) & (ai<self.anchors.shape[0]) & (aj>=0) & (aj<self.anchors.shape[1])
+        self.anchors[ai[on_board],aj[on_board]] = False
@@ -0,0 +1,199 @@
+'''Back Grids with `multiprocessing.shared_memory`, so many processes can use one Grid.
+
+One process (the writer) creates a shared Grid with `create_shared_grid()` and
+runs the game on it. Other processes (eg: AI planners or analytics) attach to
+the same memory by name with `attach_shared_grid()`, so no Board, Loc, or Stats
+data is copied between processes.
+
+Each shared block starts with a sequence number used as a seqlock. The writer
+wraps each update (eg: one `step()`) in `with block.writing():`, which makes the
+sequence number odd while the update runs and even again afterwards. Readers
+call `block.read(fn)`, which runs `fn` & retries it if the sequence number was
+odd or changed meanwhile, so `fn` sees a consistent state without the writer
+ever waiting and without copying more than `fn` itself copies.
+'''
+
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+
+ALIGNMENT = 64 # bytes, so every array starts on its own cache line
+
+class SharedGridMemory:
+    '''A shared memory block holding a Grid's named arrays, a header, & a seqlock.
+
+    The block's layout is a sequence number (uint64), the length of a JSON header
+    (uint64), the JSON header itself, and then each array at an aligned offset. The
+    header records the Grid's description plus each array's offset, shape, & dtype,
+    so processes can attach knowing only the block's name.
+
+    Parameters
+    ----------
+    :shm: A `SharedMemory` object
+    :owner: Whether this process created the block (and so should `unlink()` it)
+
+    Methods
+    -------
+    :create: Allocate a new block and copy arrays into it
+    :attach: Attach to an existing block by name
+    :writing: Context manager marking an update to the arrays, for readers to detect
+    :read: Run a function on the arrays, retrying until it sees a consistent state
+    :close: Release this process's view of the block
+    :unlink: Free the block (called by its creator once every process is done)
+    '''
+
+    def __init__(self,shm,owner=False):
+
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self._seq = np.ndarray((1,),dtype=np.uint64,buffer=shm.buf,offset=0)
+        header_size = int(np.ndarray((1,),dtype=np.uint64,buffer=shm.buf,offset=8)[0])
+        self.header = json.loads(bytes(shm.buf[16:16+header_size]).decode())
+        self.arrays = {
+            name:np.ndarray(tuple(spec['shape']),dtype=np.dtype(spec['dtype']),buffer=shm.buf,offset=spec['offset'])
+            for name,spec in self.header['arrays'].items()
+        }
+
+    @classmethod
+    def create(cls,header,arrays,name=None):
+        '''Allocate a new shared memory block and copy arrays into it.
+
+        :header: A JSON-serializable dict describing the Grid
+        :arrays: A dict of array names to numpy arrays
+        :name: The name of the block, or None to let the system choose one
+        :return: A `SharedGridMemory` object that owns the new block
+        '''
+
+        arrays = { name:np.asarray(array) for name,array in arrays.items() }
+        header = dict(header)
+        header['arrays'] = { name:{'shape':list(array.shape),'dtype':array.dtype.str,'offset':0} for name,array in arrays.items() }
+        header_size = len(json.dumps(header))+32*len(arrays) # room for the offsets filled in below
+        offset = 16+header_size
+        for spec in header['arrays'].values():
+            offset = -(-offset//ALIGNMENT)*ALIGNMENT
+            spec['offset'] = offset
+            offset += int(np.prod(spec['shape']))*np.dtype(spec['dtype']).itemsize
+        encoded = json.dumps(header).encode().ljust(header_size)
+
+        shm = shared_memory.SharedMemory(name=name,create=True,size=max(offset,1))
+        np.ndarray((2,),dtype=np.uint64,buffer=shm.buf)[:] = (0,header_size)
+        shm.buf[16:16+header_size] = encoded
+        block = cls(shm,owner=True)
+        for name,array in arrays.items():
+            block.arrays[name][...] = array
+        return block
+
+    @classmethod
+    def attach(cls,name):
+        '''Attach to an existing shared memory block by name.
+
+        Attached processes never free the block, only its creator does.
+
+        :name: The name of the block, from `block.name` in the creating process
+        :return: A `SharedGridMemory` object
+        '''
+
+        return cls(_open_untracked(name),owner=False)
+
+    @property
+    def sequence(self):
+        '''The seqlock's sequence number: odd during a write, and +2 after every write.'''
+
+        return int(self._seq[0])
+
+    @contextmanager
+    def writing(self):
+        '''Mark an update to the arrays, so readers can tell their view may be torn.
+
+        Only one process should write to a block.
+        '''
+
+        self._seq[0] += 1
+        try:
+            yield self.arrays
+        finally:
+            self._seq[0] += 1
+
+    def read(self,fn,retries=1000,wait=1e-4):
+        '''Run `fn(arrays)`, retrying until no write overlapped it, and return its result.
+
+        `fn` should copy whatever it needs out of the arrays (eg: a slice of the Board),
+        since anything it keeps a reference to can change after it returns.
+
+        :fn: A function taking the dict of arrays
+        :retries: How many times to retry before giving up
+        :wait: Seconds to sleep while a write is in progress
+        :return: The result of `fn`
+        '''
+
+        for _ in range(retries):
+            before = self.sequence
+            if before%2==1:
+                time.sleep(wait)
+                continue
+            result = fn(self.arrays)
+            if self.sequence==before:
+                return result
+        raise Exception(f"Couldn't get a consistent read of the shared Grid after {retries} tries")
+
+    def close(self):
+        '''Release this process's view of the block.
+
+        Grids built over the block must be deleted first, since they hold its arrays.
+        '''
+
+        self._seq = None
+        self.arrays = {}
+        self.shm.close()
+
+    def unlink(self):
+        '''Free the block. Only its creator should call this, after every process closes it.'''
+
+        if not self.owner:
+            raise Exception("Only the process that created a shared Grid can unlink it")
+        self.shm.unlink()
+
+def _open_untracked(name):
+    '''Open an existing shared memory block without registering it with the resource tracker.
+
+    The tracker frees every block registered with it once its processes exit, but
+    only the process that created a shared Grid should free it. Python 3.13 added
+    `track=False` for this; older versions register every block they open.
+    '''
+
+    try:
+        return shared_memory.SharedMemory(name=name,track=False)
+    except TypeError:
+        pass
+    register = resource_tracker.register
+    resource_tracker.register = lambda name,rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def create_shared_grid(grid,name=None):
+    '''Copy a Grid into a new shared memory block, and return a Grid backed by it.
+
+    :grid: A Grid, eg: a `SquarePieceGrid2D`, `SquareMultilayerPieceGrid2D`, or `SquareTileGrid2D`
+    :name: The name of the block, or None to let the system choose one
+    :return: The shared Grid, and its `SharedGridMemory` block
+    '''
+
+    block = SharedGridMemory.create(grid._storage_header(),grid._storage_arrays(),name=name)
+    return type(grid)._from_storage(block.header,grid.shape,block.arrays), block
+
+def attach_shared_grid(grid_class,name,shape_manager):
+    '''Attach to a shared Grid created (by any process) with `create_shared_grid()`.
+
+    :grid_class: The class of the shared Grid, eg: `SquarePieceGrid2D`
+    :name: The name of the block, from `block.name` in the creating process
+    :shape_manager: A shape manager object
+    :return: The shared Grid, and its `SharedGridMemory` block
+    '''
+
+    block = SharedGridMemory.attach(name)
+    return grid_class._from_storage(block.header,shape_manager,block.arrays), block
@@ -0,0 +1,204 @@
+class SquareSpatialIndex:
+    '''A bucketed spatial index of piece locations on a square Grid, grouped by side.
+
+    Spatial indexes answer proximity questions (eg: "who is the nearest enemy?")
+    without scanning every unit. The Board is cut into square buckets that are
+    `bucket_size` squares wide, and every indexed unit is stored in the bucket
+    that holds its `(i,j)` location. Queries then only visit the buckets near
+    the query location, so their cost depends on how crowded that area is,
+    rather than on the total number of units.
+
+    Units are grouped by a key (in practice, their STAT.SIDE value) and can
+    optionally carry a layer, which is used by multilayer Grids.
+
+    Grid objects keep their spatial index in sync automatically when pieces are
+    placed, moved, or removed. See `enable_spatial_index()` on the piece Grids.
+
+    Parameters
+    ----------
+    :grid_height: The height of the indexed Board, measured in squares
+    :grid_width: The width of the indexed Board, measured in squares
+    :bucket_size: The width & height of each bucket, measured in squares
+
+    Methods
+    -------
+    :clear: Remove every unit from the index
+    :update: Insert a unit, or update the location of an already indexed unit
+    :remove: Remove a unit from the index
+    :nearest: Search outward ring-by-ring for the nearest unit with one of the given keys
+    :query_rect: Return the units whose location is inside a rectangle
+    '''
+
+    def __init__(self,grid_height,grid_width,bucket_size=8):
+
+        self.height = grid_height
+        self.width = grid_width
+        self.bucket_size = bucket_size
+        self.n_bucket_rows = (grid_height+bucket_size-1)//bucket_size
+        self.n_bucket_cols = (grid_width+bucket_size-1)//bucket_size
+        self.clear()
+
+    def clear(self):
+        '''Remove every unit from the index.'''
+
+        self._buckets = {} # key -> {(bi,bj): set of unit IDs}
+        self._where = {}   # unit ID -> (key,(bi,bj),i,j,layer)
+
+    def __len__(self):
+        '''The length of a spatial index is the number of units stored in it.'''
+
+        return len(self._where)
+
+    def __contains__(self,unit_id):
+
+        return int(unit_id) in self._where
+
+    def keys(self):
+        '''Return the keys (eg: sides) that currently have units in the index.'''
+
+        return [ key for key,buckets in self._buckets.items() if buckets ]
+
+    def update(self,unit_id,i,j,key,layer=0):
+        '''Insert a unit, or update the location of an already indexed unit.
+
+        :unit_id: The unit to insert or update
+        :i: The i-location (vertical) of the unit
+        :j: The j-location (horizontal) of the unit
+        :key: The group the unit belongs to (eg: its side)
+        :layer: The layer of the unit (only meaningful on multilayer Grids)
+        '''
+
+        unit_id,i,j,key,layer = int(unit_id),int(i),int(j),int(key),int(layer)
+        bucket = (i//self.bucket_size,j//self.bucket_size)
+        old = self._where.get(unit_id)
+        if old is not None and (old[0],old[1])!=(key,bucket):
+            self._discard(unit_id,old[0],old[1])
+            old = None
+        if old is None:
+            self._buckets.setdefault(key,{}).setdefault(bucket,set()).add(unit_id)
+        self._where[unit_id] = (key,bucket,i,j,layer)
+
+    def remove(self,unit_id):
+        '''Remove a unit from the index. Units that are not indexed are ignored.
+
+        :unit_id: The unit to remove
+        '''
+
+        old = self._where.pop(int(unit_id),None)
+        if old is not None:
+            self._discard(int(unit_id),old[0],old[1])
+
+    def _discard(self,unit_id,key,bucket):
+        '''Remove a unit from one bucket, dropping the bucket if it becomes empty.'''
+
+        members = self._buckets[key][bucket]
+        members.discard(unit_id)
+        if not members:
+            del self._buckets[key][bucket]
+
+    def nearest(self,i,j,keys,layer=None,exclude=None,alive=None,not_found=1e10):
+        '''Return the nearest indexed unit to `(i,j)`, searching outward ring-by-ring.
+
+        Distances are Manhattan distances between unit locations, and ties are broken
+        in favor of the smallest unit ID. A ring of buckets is only searched if it
+        could hold a unit at least as close as the best unit found so far.
+
+        :i: The i-location (vertical) to search from
+        :j: The j-location (horizontal) to search from
+        :keys: The keys (eg: sides) of units that may be returned
+        :layer: If not None, only units on this layer may be returned
+        :exclude: A unit ID that may not be returned (eg: the unit searching)
+        :alive: An optional array, indexed by unit ID, of which units may be returned
+        :not_found: The distance returned when no unit matches
+        :return: The ID of the nearest unit & the distance to that unit
+        '''
+
+        i,j = int(i),int(j)
+        bucket_maps = [ self._buckets[key] for key in keys if self._buckets.get(key) ]
+        n_buckets = sum( len(buckets) for buckets in bucket_maps )
+        best = (not_found,-1)
+        if n_buckets==0:
+            return best[1], best[0]
+
+        bi,bj = i//self.bucket_size, j//self.bucket_size
+        max_ring = max(bi+1,bj+1,self.n_bucket_rows-bi,self.n_bucket_cols-bj)
+        ring = 0
+        while ring<=max_ring:
+            if ring>0 and (ring-1)*self.bucket_size+1 > best[0]:
+                break # nothing in this ring (or beyond) can beat the best unit so far
+            if 8*ring >= n_buckets:
+                # the ring is larger than the number of occupied buckets, so finish by
+                # visiting the remaining occupied buckets directly
+                for buckets in bucket_maps:
+                    for (ci,cj),members in buckets.items():
+                        if max(abs(ci-bi),abs(cj-bj))>=ring:
+                            best = self._best_in_bucket(members,i,j,layer,exclude,alive,best)
+                break
+            for bucket in self._ring(bi,bj,ring):
+                for buckets in bucket_maps:
+                    members = buckets.get(bucket)
+                    if members:
+                        best = self._best_in_bucket(members,i,j,layer,exclude,alive,best)
+            ring += 1
+        return best[1], best[0]
+
+    def _best_in_bucket(self,members,i,j,layer,exclude,alive,best):
+        '''Compare every unit in a bucket against the best `(dist,unit_id)` found so far.'''
+
+        for unit_id in members:
+            if unit_id==exclude:
+                continue
+            _,_,ui,uj,ulayer = self._where[unit_id]
+            if layer is not None and ulayer!=layer:
+                continue
+            if alive is not None and not alive[unit_id]:
+                continue
+            candidate = (abs(ui-i)+abs(uj-j),unit_id)
+            if candidate<best:
+                best = candidate
+        return best
+
+    def _ring(self,bi,bj,ring):
+        '''Yield the bucket coordinates whose Chebyshev distance from `(bi,bj)` is `ring`.'''
+
+        if ring==0:
+            yield (bi,bj)
+            return
+        for cj in range(bj-ring,bj+ring+1):
+            yield (bi-ring,cj)
+            yield (bi+ring,cj)
+        for ci in range(bi-ring+1,bi+ring):
+            yield (ci,bj-ring)
+            yield (ci,bj+ring)
+
+    def query_rect(self,i0,j0,i1,j1,keys=None,layer=None):
+        '''Return the units whose location is inside the rectangle `[i0,i1]x[j0,j1]`.
+
+        :i0: The smallest i-location (vertical) of the rectangle, inclusive
+        :j0: The smallest j-location (horizontal) of the rectangle, inclusive
+        :i1: The largest i-location (vertical) of the rectangle, inclusive
+        :j1: The largest j-location (horizontal) of the rectangle, inclusive
+        :keys: The keys (eg: sides) of units that may be returned (default: all keys)
+        :layer: If not None, only units on this layer may be returned
+        :return: A sorted list of unit IDs
+        '''
+
+        keys = self.keys() if keys is None else keys
+        b0 = (max(i0,0)//self.bucket_size, max(j0,0)//self.bucket_size)
+        b1 = (max(i1,0)//self.bucket_size, max(j1,0)//self.bucket_size)
+        n_rect_buckets = (b1[0]-b0[0]+1)*(b1[1]-b0[1]+1)
+
+        found = []
+        for key in keys:
+            buckets = self._buckets.get(key,{})
+            if n_rect_buckets < len(buckets):
+                candidate_buckets = ( buckets.get((ci,cj)) for ci in range(b0[0],b1[0]+1) for cj in range(b0[1],b1[1]+1) )
+            else:
+                candidate_buckets = ( members for (ci,cj),members in buckets.items()
+                                      if b0[0]<=ci<=b1[0] and b0[1]<=cj<=b1[1] )
+            for members in candidate_buckets:
+                for unit_id in members or ():
+                    _,_,ui,uj,ulayer = self._where[unit_id]
+                    if i0<=ui<=i1 and j0<=uj<=j1 and (layer is None or ulayer==layer):
+                        found.append(unit_id)
+        return sorted(found)
@@ -0,0 +1,179 @@
+import numpy as np
+
+def parse_stats_list(stats_list):
+    '''Split a stats list into stat names & dtypes.
+
+    Each entry of a stats list is either a stat name, eg: `'HP'`, or a pair of a
+    stat name and a numpy dtype, eg: `('ALIVE',np.bool_)` or `('HP',np.int16)`.
+
+    :stats_list: A list of stat names or `(name,dtype)` pairs
+    :return: A list of names, and a list of dtypes (None for entries without one)
+    '''
+
+    names, dtypes = [], []
+    for entry in stats_list:
+        if isinstance(entry,str):
+            names.append(entry)
+            dtypes.append(None)
+        else:
+            name,dtype = entry
+            names.append(name)
+            dtypes.append(np.dtype(dtype))
+    return names, dtypes
+
+def make_stats(shape,stats_list,default_dtype):
+    '''Allocate zeroed storage for stats, shaped `shape+(number of stats,)`.
+
+    If no entry in `stats_list` has a dtype this is a plain numpy array of
+    `default_dtype`. Otherwise it's a columnar `StatsTable`, where entries without
+    a dtype use `default_dtype`.
+
+    :shape: The shape of each stat, eg: `(max_units,)` or `(height,width)`
+    :stats_list: A list of stat names or `(name,dtype)` pairs
+    :default_dtype: The dtype of stats that don't specify one
+    :return: A numpy array or a `StatsTable`
+    '''
+
+    names,dtypes = parse_stats_list(stats_list)
+    if all( dtype is None for dtype in dtypes ):
+        return np.zeros(tuple(shape)+(len(names),),dtype=default_dtype)
+    return StatsTable([ np.zeros(shape,dtype=default_dtype if dtype is None else dtype) for dtype in dtypes ])
+
+def stats_list_spec(stats_list):
+    '''Return a JSON-serializable copy of a stats list, for saving a Grid.'''
+
+    names,dtypes = parse_stats_list(stats_list)
+    return [ name if dtype is None else [name,dtype.str] for name,dtype in zip(names,dtypes) ]
+
+class StatsTable:
+    '''Columnar Stats storage, where every stat has its own numpy dtype.
+
+    A plain Stats array gives every stat the same dtype, so a boolean like `ALIVE`
+    costs as much memory (and cache bandwidth) as `HP`. A Stats table instead keeps
+    one numpy array per stat, so each can use the smallest dtype that fits.
+
+    Stats tables are indexed like the arrays they replace, with the stat as the last
+    index, eg: `stats[:,STAT.HP]` or `stats[unit_ids,STAT.ALIVE] = False`. Selecting
+    a single stat reads & writes its column directly (slices are views). Selecting
+    several stats at once, eg: `stats[unit_id]`, stacks them into a new array.
+
+    Parameters
+    ----------
+    :columns: A list of numpy arrays with the same shape, one per stat
+
+    Methods
+    -------
+    :copy: Return a copy of the Stats table
+    :assign: Overwrite this Stats table's contents with another's
+    :to_array: Return all stats stacked into one numpy array
+    '''
+
+    def __init__(self,columns):
+
+        self.columns = list(columns)
+        if any( column.shape!=self.columns[0].shape for column in self.columns ):
+            raise Exception("Every column of a Stats table must have the same shape")
+        self.shape = self.columns[0].shape+(len(self.columns),)
+        self.ndim = len(self.shape)
+        self.dtypes = [ column.dtype for column in self.columns ]
+        self.dtype = np.result_type(*self.dtypes)
+
+    def __len__(self):
+
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+
+        return sum( column.nbytes for column in self.columns )
+
+    def _split(self,key):
+        '''Split an index into the index within each column, and the selected stats.
+
+        :key: An index, as passed to `__getitem__` or `__setitem__`
+        :return: The index within each column, and either one stat or a list of stats
+        '''
+
+        if not isinstance(key,tuple):
+            key = (key,)
+        if any( k is Ellipsis for k in key ):
+            e = next( n for n,k in enumerate(key) if k is Ellipsis )
+            key = key[:e] + (slice(None),)*(self.ndim-len(key)+1) + key[e+1:]
+        key = key + (slice(None),)*(self.ndim-len(key))
+        index,stat = key[:-1], key[-1]
+        if isinstance(stat,(int,np.integer)):
+            return index, int(stat)
+        return index, list(range(len(self.columns))[stat]) if isinstance(stat,slice) else [ int(s) for s in stat ]
+
+    def __getitem__(self,key):
+
+        index,stat = self._split(key)
+        if isinstance(stat,int):
+            return self.columns[stat][index]
+        return np.stack([ self.columns[s][index] for s in stat ],axis=-1)
+
+    def __setitem__(self,key,values):
+
+        index,stat = self._split(key)
+        if isinstance(stat,int):
+            self.columns[stat][index] = values
+            return
+        values = np.asarray(values)
+        for n,s in enumerate(stat):
+            self.columns[s][index] = values if values.ndim==0 else values[...,n]
+
+    def __array__(self,dtype=None,copy=None):
+
+        array = self.to_array()
+        return array if dtype is None else array.astype(dtype)
+
+    def to_array(self):
+        '''Return all stats stacked into one numpy array, using a dtype that fits every stat.'''
+
+        return np.stack(self.columns,axis=-1)
+
+    def copy(self):
+        '''Return a copy of the Stats table.'''
+
+        return StatsTable([ column.copy() for column in self.columns ])
+
+    def assign(self,other):
+        '''Overwrite this Stats table's contents with another Stats table's contents.
+
+        :other: A Stats table with the same shape
+        '''
+
+        if other.shape!=self.shape:
+            raise Exception("Stats tables can only be assigned from Stats tables with the same shape")
+        for column,other_column in zip(self.columns,other.columns):
+            np.copyto(column,other_column)
+
+def stats_to_arrays(name,stats,stats_list):
+    '''Return the arrays holding some stats by name, for saving or sharing a Grid.
+
+    A Stats table is split into one array per stat, named `<name>.<stat name>`.
+
+    :name: The name of the stats, eg: "stats"
+    :stats: A numpy array or a `StatsTable`
+    :stats_list: The list of stat names or `(name,dtype)` pairs the stats were made with
+    :return: A dict of array names to numpy arrays
+    '''
+
+    if not isinstance(stats,StatsTable):
+        return {name:stats}
+    names,_ = parse_stats_list(stats_list)
+    return { f'{name}.{stat}':column for stat,column in zip(names,stats.columns) }
+
+def stats_from_arrays(name,arrays,stats_list):
+    '''Rebuild stats from arrays returned by `stats_to_arrays()`.
+
+    :name: The name of the stats, eg: "stats"
+    :arrays: A dict of array names to numpy arrays
+    :stats_list: The list of stat names or `(name,dtype)` pairs the stats were made with
+    :return: A numpy array or a `StatsTable`
+    '''
+
+    if name in arrays:
+        return arrays[name]
+    names,_ = parse_stats_list(stats_list)
+    return StatsTable([ arrays[f'{name}.{stat}'] for stat in names ])
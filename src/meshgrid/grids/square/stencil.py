@@ -0,0 +1,203 @@
+import numpy as np
+
+# kernels are centered on the square being updated, and are usually an odd number of squares wide & tall
+VON_NEUMANN = np.array([[0,1,0],[1,0,1],[0,1,0]])
+MOORE = np.array([[1,1,1],[1,0,1],[1,1,1]])
+REDUCTIONS = ('sum','max','min')
+
+class StencilRule:
+    '''One cellular automaton rule, updating a stat plane of a Tile from its neighbors.
+
+    Each tick a rule reduces the `source` stat plane over the neighbors given by
+    `kernel`, eg: the weighted sum of the heat around each square, or the highest
+    fire level next to each square. Then it writes one of these to the `target`
+    stat plane:
+    * the neighborhood value itself (eg: heat diffusion with a blurring kernel)
+    * `value`, wherever the neighborhood value is at least `threshold` (eg: fire spreading)
+    * `combine(current,neighborhood)`, for any other rule (eg: Conway's Game of Life)
+
+    Parameters
+    ----------
+    :target: The name of the stat plane to write to
+    :source: The name of the stat plane to read neighbors from (default: `target`)
+    :kernel: A 2D array of weights, centered on the square being updated (default: `MOORE`)
+    :reduce: How to combine neighbors: "sum" of the weighted neighbors, or "max" or "min" of the neighbors with non-zero weights
+    :threshold: If given, only write `value` where the neighborhood value is at least this
+    :value: The value written where `threshold` is met
+    :combine: A function of the current target values & the neighborhood values, returning new target values
+    :where: The name of a stat plane, so that the rule only updates squares where that stat is non-zero
+    :fill: The value of every square beyond the edge of the Tile
+    '''
+
+    def __init__(self,target,source=None,kernel=MOORE,reduce='sum',threshold=None,value=1,combine=None,where=None,fill=0):
+
+        if reduce not in REDUCTIONS:
+            raise Exception(f"Unknown reduction '{reduce}', expected one of {REDUCTIONS}")
+        if threshold is not None and combine is not None:
+            raise Exception("Only one of threshold or combine can be given")
+        self.target = target
+        self.source = target if source is None else source
+        self.kernel = np.asarray(kernel)
+        if self.kernel.ndim!=2:
+            raise Exception("A stencil kernel must be a 2D array")
+        self.radius = (self.kernel.shape[0]//2,self.kernel.shape[1]//2)
+        self.reduce = reduce
+        self.threshold = threshold
+        self.value = value
+        self.combine = combine
+        self.where = where
+        self.fill = fill
+
+    def stats(self):
+        '''Return the names of every stat plane the rule reads or writes.'''
+
+        return [ stat for stat in (self.target,self.source,self.where) if stat is not None ]
+
+    def neighborhood(self,plane,i0,i1,j0,j1):
+        '''Reduce a stat plane over the kernel, for the squares in rows `i0:i1` and columns `j0:j1`.
+
+        Each kernel square becomes one shifted slice of the (padded) plane, so the cost
+        is one vectorized pass over the window per non-zero kernel weight.
+
+        :plane: A 2D numpy array
+        :return: A 2D numpy array with the shape of the window
+        '''
+
+        ri,rj = self.radius
+        height,width = plane.shape
+        padded = np.full((i1-i0+2*ri,j1-j0+2*rj),self.fill,dtype=np.result_type(plane.dtype,self.kernel.dtype))
+        ci0,cj0 = max(i0-ri,0), max(j0-rj,0)
+        ci1,cj1 = min(i1+ri,height), min(j1+rj,width)
+        padded[ci0-(i0-ri):ci1-(i0-ri),cj0-(j0-rj):cj1-(j0-rj)] = plane[ci0:ci1,cj0:cj1]
+
+        result = None
+        for ki,kj in np.argwhere(self.kernel!=0):
+            shifted = padded[ki:ki+i1-i0,kj:kj+j1-j0]
+            if self.reduce=='sum':
+                shifted = shifted*self.kernel[ki,kj]
+                result = shifted if result is None else result+shifted
+            elif self.reduce=='max':
+                result = shifted.copy() if result is None else np.maximum(result,shifted)
+            else:
+                result = shifted.copy() if result is None else np.minimum(result,shifted)
+        if result is None:
+            result = np.zeros((i1-i0,j1-j0),dtype=padded.dtype)
+        return result
+
+    def apply(self,front,back,STAT,i0,i1,j0,j1):
+        '''Update the target plane of `back` in a window, reading neighbors from `front`.'''
+
+        neighborhood = self.neighborhood(front[:,:,STAT[self.source]],i0,i1,j0,j1)
+        current = back[i0:i1,j0:j1,STAT[self.target]]
+        if self.combine is not None:
+            updated = self.combine(current,neighborhood)
+        elif self.threshold is not None:
+            updated = np.where(neighborhood>=self.threshold,self.value,current)
+        else:
+            updated = neighborhood
+        if self.where is not None:
+            updated = np.where(front[i0:i1,j0:j1,STAT[self.where]]!=0,updated,current)
+        back[i0:i1,j0:j1,STAT[self.target]] = updated
+
+class SquareStencil:
+    '''Runs cellular automaton rules over a whole Tile per tick, with double buffering.
+
+    Every rule reads the Tile as it was at the start of the tick (the front buffer)
+    and writes into a second buffer (the back buffer), so the order squares are
+    updated in never matters. Rules are applied in order, and a rule writing a stat
+    plane that an earlier rule wrote builds on that earlier rule's result.
+
+    With `track_dirty=True` only the bounding box of the squares that changed last
+    tick (grown by the kernels' radius) is updated. Squares outside it can't change,
+    since none of their neighbors did, so a mostly settled world costs almost nothing.
+    Hand edits to the Tile must then be reported with `mark_dirty()`.
+
+    Parameters
+    ----------
+    :rules: A list of `StencilRule` objects
+    :track_dirty: Whether to only update the region near squares that changed last tick
+
+    Methods
+    -------
+    :step: Apply every rule once, returning the new Tile
+    :mark_dirty: Mark squares edited by hand, to be updated next tick
+    '''
+
+    def __init__(self,rules,track_dirty=False):
+
+        self.rules = list(rules)
+        self.track_dirty = track_dirty
+        self.radius = ( max([ rule.radius[0] for rule in self.rules ],default=0),
+                        max([ rule.radius[1] for rule in self.rules ],default=0) )
+        self.dirty = None  # (i0,i1,j0,j1) of the squares that changed last tick, or "all"
+        self._back = None
+        self.mark_dirty()
+
+    def mark_dirty(self,i=None,j=None):
+        '''Mark squares edited by hand, so that they (and their neighbors) are updated next tick.
+
+        :i: An array of i-locations (vertical), or None for every square
+        :j: An array of j-locations (horizontal), or None for every square
+        '''
+
+        if i is None or j is None:
+            self.dirty = 'all'
+        elif self.dirty!='all':
+            i, j = np.atleast_1d(i), np.atleast_1d(j)
+            if i.shape[0]>0:
+                self.dirty = _union(self.dirty,(int(i.min()),int(i.max())+1,int(j.min()),int(j.max())+1))
+
+    def _window(self,height,width):
+        '''Return the `(i0,i1,j0,j1)` window to update this tick, or None if nothing can change.'''
+
+        if not self.track_dirty or self.dirty=='all':
+            return (0,height,0,width)
+        if self.dirty is None:
+            return None
+        i0,i1,j0,j1 = self.dirty
+        ri,rj = self.radius
+        return (max(i0-ri,0),min(i1+ri,height),max(j0-rj,0),min(j1+rj,width))
+
+    def step(self,tile,STAT,in_place=False):
+        '''Apply every rule once.
+
+        :tile: The Tile to update (the front buffer)
+        :STAT: The Grid's stats enum, to look up stat planes by name
+        :in_place: Write the result back into `tile`, instead of swapping buffers (eg: for memory-mapped Tiles)
+        :return: The new Tile, and the `(i0,i1,j0,j1)` bounding box of the squares that changed (or None)
+        '''
+
+        height,width = tile.shape[0], tile.shape[1]
+        window = self._window(height,width)
+        if window is None:
+            return tile, None
+        if self._back is None or self._back.shape!=tile.shape:
+            self._back = tile.copy()
+        i0,i1,j0,j1 = window
+        front, back = tile, self._back
+
+        # the back buffer is a tick behind, but only inside the window (see `mark_dirty()`)
+        for stat in range(front.shape[2]):
+            back[i0:i1,j0:j1,stat] = front[i0:i1,j0:j1,stat]
+        for rule in self.rules:
+            rule.apply(front,back,STAT,i0,i1,j0,j1)
+
+        changed = np.zeros((i1-i0,j1-j0),dtype=bool)
+        for stat in range(front.shape[2]):
+            changed |= (back[i0:i1,j0:j1,stat]!=front[i0:i1,j0:j1,stat])
+        rows, cols = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+        self.dirty = None if rows.shape[0]==0 else (i0+int(rows[0]),i0+int(rows[-1])+1,j0+int(cols[0]),j0+int(cols[-1])+1)
+
+        if in_place:
+            for stat in range(front.shape[2]):
+                front[i0:i1,j0:j1,stat] = back[i0:i1,j0:j1,stat]
+            return front, self.dirty
+        self._back = front
+        return back, self.dirty
+
+def _union(a,b):
+    '''Return the bounding box of two `(i0,i1,j0,j1)` bounding boxes, either of which may be None.'''
+
+    if a is None:
+        return b
+    return (min(a[0],b[0]),max(a[1],b[1]),min(a[2],b[2]),max(a[3],b[3]))
@@ -0,0 +1,58 @@
+'''Save Grid arrays to a directory of `.npy` files and reopen them as memory maps.
+
+A saved Grid is a directory holding one `.npy` file per array (eg: `board.npy`,
+`loc.npy`, & `stats.npy`) and a small `header.json` describing the Grid class,
+its dimensions, its `STAT` names, and each array's shape & dtype.
+
+Reopening a directory memory-maps the `.npy` files instead of reading them, so
+even a multi-GB world opens instantly and its pages are only read from disk when
+they're touched. Any number of processes can open the same directory read-only.
+'''
+
+import os
+import json
+import numpy as np
+
+HEADER_FILE = 'header.json'
+OPEN_MODES = ('r','r+','c')
+
+def save_arrays(path,header,arrays):
+    '''Write arrays to a directory of `.npy` files, along with a JSON header.
+
+    :path: The directory to write to. It's created if it doesn't exist
+    :header: A JSON-serializable dict describing the Grid
+    :arrays: A dict of array names to numpy arrays
+    '''
+
+    os.makedirs(path,exist_ok=True)
+    header = dict(header)
+    header['arrays'] = {}
+    for name,array in arrays.items():
+        array = np.asarray(array)
+        stored = np.lib.format.open_memmap(os.path.join(path,f'{name}.npy'),mode='w+',dtype=array.dtype,shape=array.shape)
+        stored[...] = array
+        stored.flush()
+        del stored
+        header['arrays'][name] = {'shape':list(array.shape),'dtype':array.dtype.str}
+    with open(os.path.join(path,HEADER_FILE),'w') as f:
+        json.dump(header,f,indent=2)
+
+def open_arrays(path,mode='r'):
+    '''Memory-map the arrays in a directory written by `save_arrays()`.
+
+    :path: The directory to read from
+    :mode: "r" for read-only, "r+" to write changes back to disk, or "c" for copy-on-write
+    :return: The header dict, and a dict of array names to `np.memmap` arrays
+    '''
+
+    if mode not in OPEN_MODES:
+        raise Exception(f"Unknown mode '{mode}', expected one of {OPEN_MODES}")
+    with open(os.path.join(path,HEADER_FILE)) as f:
+        header = json.load(f)
+    arrays = {}
+    for name,spec in header['arrays'].items():
+        array = np.load(os.path.join(path,f'{name}.npy'),mmap_mode=mode)
+        if list(array.shape)!=spec['shape'] or array.dtype.str!=spec['dtype']:
+            raise Exception(f"The stored '{name}' array doesn't match the shape & dtype in its header")
+        arrays[name] = array
+    return header, arrays
@@ -1,6 +1,11 @@
 import enum
 import numpy as np
 
+from src.meshgrid.grids.square.sampling import random_grid_locs
+from src.meshgrid.grids.square.storage import save_arrays, open_arrays
+from src.meshgrid.grids.square.stencil import SquareStencil
+from src.meshgrid.grids.square.stats import parse_stats_list, make_stats, stats_list_spec, stats_to_arrays, stats_from_arrays
+
 class SquareTileGrid2D: 
     '''A two-dimensional square-based Grid class with Tiles.
     
@@ -19,36 +24,146 @@ class SquareTileGrid2D:
     :grid_width: The width of the Board, measured in squares
     :grid_height: The height of the Board, measured in squares
     :shape_manager: A shape manager object
-    :stats_list: Labels for the third dimension of the Grid's Tile object
+    :stats_list: Labels for the third dimension of the Grid's Tile object, as names or `(name,dtype)` pairs (default dtype float64)
+    :tile: An optional pre-made Tile array (eg: a memory map) to use instead of allocating one
 
     Methods
     -------
     :random_grid_locs: Returns random `(i,j)` locations for each piece
+    :enable_stencil: Set cellular automaton rules that update the Tile object every tick
+    :step_stencil: Apply the cellular automaton rules to the whole Tile object
+    :mark_dirty: Mark hand-edited squares, so the next tick updates them
+    :save: Save the Tile object to a directory of `.npy` files
+    :open: Open a saved Grid, memory-mapping its Tile object
+    :flush: Write changes to a Grid opened with `mode="r+"` back to disk
     :pixels_to_grid: Convert from screen coordinates to a grid `(i,j)` location
     '''
 
     def __init__(self,grid_width,grid_height,
-                 shape_manager,stats_list):
+                 shape_manager,stats_list,tile=None):
         
         self.width = grid_width
         self.height = grid_height
         
-        self.STAT = enum.IntEnum('StatsEnum', { stat:e for e,stat in enumerate(stats_list) })
+        stat_names,_ = parse_stats_list(stats_list)
+        self.STAT = enum.IntEnum('StatsEnum', { stat:e for e,stat in enumerate(stat_names) })
+        self.stats_list = stats_list_spec(stats_list)
         
-        self.tile = np.zeros((grid_height,grid_width,len(stats_list)))
+        self._owns_tile = tile is None # Tiles we didn't allocate (eg: memory maps) are updated in place
+        if tile is None:
+            self.tile = make_stats((grid_height,grid_width),stats_list,np.float64)
+        elif tile.shape!=(grid_height,grid_width,len(stats_list)):
+            raise Exception("The given Tile array doesn't match the Grid's dimensions")
+        else:
+            self.tile = tile
         self.shape = shape_manager
+        self.stencil = None # cellular automaton rules, see `enable_stencil()`
     
-    def random_grid_locs(self):
-        '''Select random `(i,j)` locations forr the Tile object
+    def random_grid_locs(self,n):
+        '''Select random `(i,j)` locations for the Tile object
         
         This function selects random board locations, without replacement. This means 
         that no two locations are the same.
 
+        :n: The number of locations to select
         :return: A Loc-like 2d numpy array of new location values
         '''
         
-        choices = np.random.choice(self.width*self.height,self.max_units)
-        return np.vstack((choices//self.width, choices-choices//self.width*self.width)).T
+        return random_grid_locs(self.height,self.width,n)
+
+    def enable_stencil(self,rules,track_dirty=False):
+        '''Set cellular automaton rules (eg: fire spreading or heat diffusing) for `step_stencil()`.
+
+        :rules: A list of `StencilRule` objects, applied in order every tick
+        :track_dirty: Whether to only update the region near squares that changed last tick. If so,
+                      call `mark_dirty()` after editing the Tile object by hand
+        '''
+
+        missing = sorted({ stat for rule in rules for stat in rule.stats() if stat not in dir(self.STAT) })
+        if missing:
+            raise Exception(f"The following stats are required by the stencil rules: {', '.join(missing)}")
+        self.stencil = SquareStencil(rules,track_dirty=track_dirty)
+
+    def disable_stencil(self):
+        '''Remove the cellular automaton rules.'''
+
+        self.stencil = None
+
+    def step_stencil(self,ticks=1):
+        '''Apply the cellular automaton rules to the whole Tile object, once per tick.
+
+        Every square is updated from the Tile as it was at the start of the tick, using
+        vectorized slices rather than a loop over squares.
+
+        :ticks: The number of ticks to run
+        :return: The `(i0,i1,j0,j1)` bounding box of the squares that changed in the last tick, or None
+        '''
+
+        if self.stencil is None:
+            raise Exception("Call enable_stencil() before stepping the stencil")
+        changed = None
+        for _ in range(ticks):
+            self.tile, changed = self.stencil.step(self.tile,self.STAT,in_place=not self._owns_tile)
+        return changed
+
+    def mark_dirty(self,i=None,j=None):
+        '''Mark hand-edited squares, so that they (and their neighbors) are updated next tick.
+
+        Only needed when the stencil was enabled with `track_dirty=True`.
+
+        :i: An array of i-locations (vertical), or None for every square
+        :j: An array of j-locations (horizontal), or None for every square
+        '''
+
+        if self.stencil is not None:
+            self.stencil.mark_dirty(i,j)
+
+    def save(self,path):
+        '''Save the Tile object to a directory, along with a small JSON header.
+
+        :path: The directory to save to. It's created if it doesn't exist
+        '''
+
+        save_arrays(path,self._storage_header(),self._storage_arrays())
+
+    @classmethod
+    def open(cls,path,shape_manager,mode='r'):
+        '''Open a Grid saved with `save()`, memory-mapping its Tile object.
+
+        :path: The directory the Grid was saved to
+        :shape_manager: A shape manager object
+        :mode: "r" for read-only, "r+" to write changes back to disk, or "c" for copy-on-write
+        :return: The opened Grid
+        '''
+
+        header,arrays = open_arrays(path,mode)
+        return cls._from_storage(header,shape_manager,arrays)
+
+    def _storage_header(self):
+        '''Return a JSON-serializable description of the Grid, for saving or sharing it.'''
+
+        return {'grid':type(self).__name__,'width':self.width,'height':self.height,
+                'stats':self.stats_list}
+
+    def _storage_arrays(self):
+        '''Return the arrays that hold the Grid's state, by name.'''
+
+        return stats_to_arrays('tile',self.tile,self.stats_list)
+
+    @classmethod
+    def _from_storage(cls,header,shape_manager,arrays):
+        '''Build a Grid over existing arrays, using a header from `_storage_header()`.'''
+
+        if header['grid']!=cls.__name__:
+            raise Exception(f"The stored Grid is a {header['grid']}, not a {cls.__name__}")
+        return cls(header['width'],header['height'],shape_manager,header['stats'],tile=stats_from_arrays('tile',arrays,header['stats']))
+
+    def flush(self):
+        '''Write changes to the Tile object back to disk, for Grids opened with `mode="r+"`.'''
+
+        for array in self._storage_arrays().values():
+            if isinstance(array,np.memmap):
+                array.flush()
 
     def pixels_to_grid(self,x,y,scale):
         '''Convert from screen coordinates to a grid `(i,j)` location.'''
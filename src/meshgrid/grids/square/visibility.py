@@ -0,0 +1,121 @@
+import numpy as np
+
+# (di,dj) of a step away from the viewer, & (di,dj) of a step across, for each of the four quadrants
+QUADRANTS = ( ((-1,0),(0,1)), ((1,0),(0,1)), ((0,1),(1,0)), ((0,-1),(1,0)) )
+
+def shadowcast(opaque,i,j,radius):
+    '''Return every square visible from `(i,j)`, using symmetric shadowcasting.
+
+    Shadowcasting scans outward from the viewer one row at a time in each of the
+    four quadrants, narrowing the range of visible slopes whenever an opaque square
+    casts a shadow. The symmetric variant only reveals a floor square if its center
+    is inside the visible range, so A can see B exactly when B can see A. Opaque
+    squares are revealed (eg: walls are visible), but nothing behind them is.
+    Slopes are kept as integer fractions, so there is no floating point error.
+
+    :opaque: A 2D boolean numpy array, True where a square blocks sight
+    :i: The i-location (vertical) of the viewer
+    :j: The j-location (horizontal) of the viewer
+    :radius: The furthest (Euclidean) distance that can be seen
+    :return: A 2D boolean numpy array, True where a square is visible
+    '''
+
+    height,width = opaque.shape
+    visible = np.zeros((height,width),dtype=bool)
+    visible[i,j] = True
+    radius_squared = radius*radius
+
+    for (ri,rj),(ci,cj) in QUADRANTS:
+        # each row is (depth, start slope numerator & denominator, end slope numerator & denominator)
+        rows = [(1,-1,1,1,1)]
+        while rows:
+            depth,start_n,start_d,end_n,end_d = rows.pop()
+            if depth>radius:
+                continue
+            min_col = (2*depth*start_n+start_d)//(2*start_d)     # round depth*start half up
+            max_col = -((end_d-2*depth*end_n)//(2*end_d))        # round depth*end half down
+            previous = None
+            for col in range(min_col,max_col+1):
+                ti,tj = i+ri*depth+ci*col, j+rj*depth+cj*col
+                in_bounds = (0<=ti<height) and (0<=tj<width)
+                blocked = (not in_bounds) or bool(opaque[ti,tj])
+                if in_bounds and depth*depth+col*col<=radius_squared:
+                    if blocked or (col*start_d>=depth*start_n and col*end_d<=depth*end_n):
+                        visible[ti,tj] = True
+                if previous is True and not blocked:
+                    start_n,start_d = 2*col-1, 2*depth
+                if previous is False and blocked:
+                    rows.append((depth+1,start_n,start_d,2*col-1,2*depth))
+                previous = blocked
+            if previous is False:
+                rows.append((depth+1,start_n,start_d,end_n,end_d))
+    return visible
+
+class SquareFieldOfView:
+    '''Settings & a cache of field-of-view results for a square Grid.
+
+    Computing a field of view costs `O(radius^2)`, so results are cached per viewer
+    position, and a cached result is only thrown away when a square that blocks (or
+    used to block) sight changes within `radius` of that position.
+
+    Grid objects keep their field of view cache in sync automatically when pieces
+    are placed, moved, or removed. See `enable_fov()` on the piece Grids.
+
+    Parameters
+    ----------
+    :radius: The furthest (Euclidean) distance that can be seen
+    :blocking_stats: Stats that make a piece block sight when non-zero. If empty, every piece blocks sight
+    :blocking_layers: On multilayer Grids, the layers whose pieces can block sight (None for every layer)
+
+    Methods
+    -------
+    :clear: Throw away every cached result
+    :get: Return a cached result for a viewer position, or None
+    :store: Cache a result for a viewer position
+    :invalidate: Throw away cached results within `radius` of some squares
+    '''
+
+    def __init__(self,radius,blocking_stats=(),blocking_layers=None):
+
+        self.radius = radius
+        self.blocking_stats = tuple(blocking_stats)
+        self.blocking_layers = None if blocking_layers is None else tuple(blocking_layers)
+        self.clear()
+
+    def clear(self):
+        '''Throw away every cached result.'''
+
+        self._cache = {} # viewer key (starting with its i & j) -> (i0,j0,visible window)
+
+    def __len__(self):
+        '''The length of a field of view is the number of cached results.'''
+
+        return len(self._cache)
+
+    def get(self,key):
+        '''Return the cached `(i0,j0,window)` for a viewer key, or None.'''
+
+        return self._cache.get(key)
+
+    def store(self,key,i0,j0,window):
+        '''Cache the visible squares of a viewer, as a window whose top-left square is `(i0,j0)`.'''
+
+        self._cache[key] = (i0,j0,window)
+
+    def invalidate(self,i,j):
+        '''Throw away cached results for viewers within `radius` squares of any of the given squares.
+
+        :i: An array of i-locations (vertical) of changed squares
+        :j: An array of j-locations (horizontal) of changed squares
+        '''
+
+        i = np.asarray(i).reshape(-1)
+        j = np.asarray(j).reshape(-1)
+        if not self._cache or i.shape[0]==0:
+            return
+        keys = list(self._cache)
+        viewers = np.array([ key[:2] for key in keys ],dtype=np.int64)
+        near = ( (np.abs(viewers[:,0,None]-i[None,:])<=self.radius) &
+                 (np.abs(viewers[:,1,None]-j[None,:])<=self.radius) ).any(axis=1)
+        for n in np.flatnonzero(near):
+            del self._cache[keys[n]]
@@ -1,4 +1,5 @@
 import enum
+import numpy as np
 
 class UnitIDOrderedTurnQueue():
     '''A turn queue whose ordering is based smallest-to-largest unit ID.
@@ -20,22 +21,28 @@ class UnitIDOrderedTurnQueue():
     twice in a row because unit #1 can no longer take a turn.
 
     This turn queue only lets units with the Stat `ALIVE=1` take actions.
+
+    The internal queue is a numpy array of unit IDs with a cursor, so popping is
+    `O(1)`, refilling checks every unit's `ALIVE` stat in one vectorized pass, and
+    units that died since the refill are skipped in vectorized chunks.
     
     Parameters
     ----------
-    :stats: A Stats object (a 2D numpy array) from the game's Grid object
+    :stats: A Stats object (a 2D numpy array or a `StatsTable`) from the game's Grid object
     :STAT_ENUM: The enum used to build the `stats` object passed in the first arg
     
     Methods
     -------
     :pop: Return the ID of the next unit ready to take an in-game action
+    :pop_many: Return the IDs of the next `k` units ready to act, eg: for batched AI processing
     '''
     
     def __init__(self,stats,STAT_ENUM):
         
         self.stats = stats
         self.STAT = STAT_ENUM
-        self._queue = []
+        self._queue = np.zeros(0,dtype=np.int64)
+        self._cursor = 0 # the position in `_queue` of the next unit ID to check
         self._validate_stats_enum(STAT_ENUM)
 
     def _validate_stats_enum(self, STAT_ENUM):
@@ -50,10 +57,12 @@ class UnitIDOrderedTurnQueue():
     def __len__(self):
         '''The length of a turn queue object is returned as the length of its internal queue.
         
+        This counts the unit IDs left in the current round, including any that died since it began.
+
         :return: The length of the current turn queue
         '''
         
-        return len(self._queue)
+        return self._queue.shape[0]-self._cursor
     
     def pop(self):
         '''Return the next unit ID ready to take an action.
@@ -64,29 +73,53 @@ class UnitIDOrderedTurnQueue():
         :return: The next unit ID ready to take an action
         '''
         
-        unit_id = None
-        while unit_id is None:
-            if len(self._queue)==0:
-                self._queue = self._new_queue()
-            unit_id = self._queue.pop(0)
-            unit_id = self._return_None_if_unit_not_alive(unit_id)
+        return int(self.pop_many(1)[0])
+
+    def pop_many(self,k):
+        '''Return the IDs of the next `k` units ready to take an action, in turn order.
 
-        return unit_id
+        This is the same as calling `pop()` `k` times. If fewer than `k` units are left in
+        the current round then the queue is replenished, so a unit can appear more than once.
+
+        :k: The number of unit IDs to return
+        :return: A numpy array of unit IDs
+        '''
+
+        unit_ids = []
+        needed = k
+        chunk_size = max(2*k,64)
+        while needed>0:
+            if len(self)==0:
+                self._queue = self._new_queue()
+                self._cursor = 0
+                if self._queue.shape[0]==0:
+                    raise Exception("No units are alive to take a turn")
+            chunk = self._queue[self._cursor:self._cursor+chunk_size]
+            alive = np.flatnonzero(self._alive(chunk))
+            if alive.shape[0]>=needed:
+                unit_ids.append(chunk[alive[:needed]])
+                self._cursor += int(alive[needed-1])+1
+                needed = 0
+            else:
+                unit_ids.append(chunk[alive])
+                self._cursor += chunk.shape[0]
+                needed -= alive.shape[0]
+                chunk_size *= 2 # runs of dead units are skipped in ever larger chunks
+        return unit_ids[0] if len(unit_ids)==1 else np.concatenate(unit_ids)
     
-    def _return_None_if_unit_not_alive(self,unit_id):
-        '''Determine if a unit is alive, and available to be on the queue.
+    def _alive(self,unit_ids):
+        '''Determine which units are alive, and available to be on the queue.
         
-        :unit_id: The unit ID to check for being alive
-        :return: Returns None if the unit is alive, and the unit's ID otherwise
+        :unit_ids: An array of unit IDs to check for being alive
+        :return: A boolean numpy array, True where a unit is alive
         '''
 
-        return unit_id if self.stats[unit_id,self.STAT.ALIVE] else None
+        return self.stats[unit_ids,self.STAT.ALIVE]!=0
     
     def _new_queue(self):
         '''Create a new internal queue. Typically called when the queue is empty.
         
-        :return: A new turn queue in the form of a python list object
+        :return: A new turn queue in the form of a numpy array of unit IDs
         '''
         
-        return [ unit_id for unit_id in range(self.stats.shape[0])
-                 if self.stats[unit_id,self.STAT.ALIVE] ] 
+        return np.flatnonzero(self.stats[:,self.STAT.ALIVE])
@@ -0,0 +1,132 @@
+import numpy as np
+
+class PhaseTurnQueue():
+    '''A turn queue that hands out a whole cohort of units per tick, eg: one side at a time.
+
+    Turn queues help manage which unit is currently allowed to act. Calling `pop()`
+    on a phase turn queue returns an array of every unit acting in the next phase,
+    so a game can resolve the whole phase with batched Grid operations (eg:
+    `move_pieces()` or `get_nearest_enemies()`) instead of one Python round trip per
+    unit. If a turn queue is emptied it automatically will refill itself.
+
+    Each round, living units are grouped into phases by the value of `group_stat`
+    (eg: SIDE, or an INITIATIVE stat bucketed by `bucket_size`). Phases run in order
+    of that value, ascending by default. Units that die before their phase runs are
+    left out of it.
+
+    Within a phase, units are ordered by `priority_stat` (highest first), and then by
+    unit ID (smallest first), so every phase has a deterministic order. Conflicts
+    within a phase (eg: two units moving into the same square, or attacking the same
+    target) should be resolved in that order, where earlier units win. The
+    `first_claims()` function does this for an array of claimed keys.
+
+    This turn queue only lets units with the Stat `ALIVE=1` take actions.
+
+    Parameters
+    ----------
+    :stats: A Stats object (a 2D numpy array or a `StatsTable`) from the game's Grid object
+    :STAT_ENUM: The enum used to build the `stats` object passed in the first arg
+    :group_stat: The name of the stat that groups units into phases
+    :bucket_size: Units whose `group_stat` values fall in the same bucket of this size share a phase
+    :descending: Whether phases run from the highest `group_stat` value to the lowest
+    :priority_stat: The name of a stat ordering units within a phase (highest first), or None for unit ID order
+
+    Methods
+    -------
+    :pop: Return the IDs of every unit acting in the next phase
+    '''
+
+    def __init__(self,stats,STAT_ENUM,group_stat='SIDE',bucket_size=1,descending=False,priority_stat=None):
+
+        self.stats = stats
+        self.STAT = STAT_ENUM
+        self._validate_stats_enum(STAT_ENUM,group_stat,priority_stat)
+        self.group_stat = STAT_ENUM[group_stat]
+        self.priority_stat = None if priority_stat is None else STAT_ENUM[priority_stat]
+        self.bucket_size = bucket_size
+        self.descending = descending
+        self.phase = None                  # the bucket of the most recently popped phase
+        self._queue = np.zeros(0,dtype=np.int64) # this round's unit IDs, in turn order
+        self._starts = np.zeros(1,dtype=np.int64) # where each phase starts in `_queue`, plus its end
+        self._buckets = np.zeros(0,dtype=np.int64)
+        self._cursor = 0                   # the next phase to run
+
+    def _validate_stats_enum(self,STAT_ENUM,group_stat,priority_stat):
+        '''Ensure that stats used by this class exist (to avoid errors).
+
+        :STAT_ENUM: An enum object used to define a Grid's Stats columns
+        :group_stat: The name of the stat that groups units into phases
+        :priority_stat: The name of the stat ordering units within a phase, or None
+        '''
+
+        required = ['ALIVE',group_stat] + ([] if priority_stat is None else [priority_stat])
+        missing = [ stat for stat in required if stat not in dir(STAT_ENUM) ]
+        if missing:
+            raise Exception(f"The following stats are required when using PhaseTurnQueue: {', '.join(missing)}")
+
+    def __len__(self):
+        '''The length of a phase turn queue is the number of phases left in the current round.
+
+        :return: The length of the current turn queue
+        '''
+
+        return self._buckets.shape[0]-self._cursor
+
+    def pop(self):
+        '''Return the IDs of every unit acting in the next phase, in their order within the phase.
+
+        As is required by all turn queues, `pop()` will automatically replenish
+        the internal turn queue if it ever becomes empty. Phases whose units have
+        all died are skipped.
+
+        :return: A numpy array of unit IDs
+        '''
+
+        while True:
+            if len(self)==0:
+                self._new_queue()
+            start,end = self._starts[self._cursor], self._starts[self._cursor+1]
+            self.phase = int(self._buckets[self._cursor])
+            self._cursor += 1
+            unit_ids = self._queue[start:end]
+            unit_ids = unit_ids[self.stats[unit_ids,self.STAT.ALIVE]!=0]
+            if unit_ids.shape[0]>0:
+                return unit_ids
+
+    def _new_queue(self):
+        '''Sort every living unit into this round's phases. Called when the queue is empty.'''
+
+        unit_ids = np.flatnonzero(self.stats[:,self.STAT.ALIVE])
+        if unit_ids.shape[0]==0:
+            raise Exception("No units are alive to take a turn")
+        buckets = np.floor_divide(self.stats[unit_ids,self.group_stat],self.bucket_size).astype(np.int64)
+        phase_key = -buckets if self.descending else buckets
+        if self.priority_stat is None:
+            order = np.lexsort((unit_ids,phase_key))
+        else:
+            priority = np.asarray(self.stats[unit_ids,self.priority_stat],dtype=np.float64)
+            order = np.lexsort((unit_ids,-priority,phase_key))
+        self._queue = unit_ids[order]
+        buckets = buckets[order]
+        starts = np.flatnonzero(np.r_[True,buckets[1:]!=buckets[:-1]])
+        self._starts = np.r_[starts,buckets.shape[0]].astype(np.int64)
+        self._buckets = buckets[starts]
+        self._cursor = 0
+
+def first_claims(keys):
+    '''Resolve conflicts within a phase, where each unit claims a key (eg: a target square or unit ID).
+
+    Units are expected to be in their order within the phase, as returned by
+    `PhaseTurnQueue.pop()`. The first unit to claim each key wins it.
+
+    :keys: An array of keys, one per unit, or a 2D array with one row of keys per unit
+    :return: A boolean numpy array, True for units that won their claim
+    '''
+
+    keys = np.asarray(keys)
+    if keys.shape[0]==0:
+        return np.zeros(0,dtype=bool)
+    _,first = np.unique(keys,axis=0 if keys.ndim>1 else None,return_index=True)
+    won = np.zeros(keys.shape[0],dtype=bool)
+    won[first] = True
+    return won
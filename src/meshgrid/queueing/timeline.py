@@ -0,0 +1,156 @@
+import heapq
+import numpy as np
+
+class TimelineTurnQueue():
+    '''A turn queue that schedules units on a clock, so faster units act more often.
+
+    Turn queues help manage which unit is currently allowed to act. Calling
+    `pop()` will return the next unit ID ready to act. If a turn queue is
+    emptied it automatically will refill itself with every living unit.
+
+    Unlike an "ordered" turn queue, this turn queue has a sense of "clock time".
+    Every unit waits `scale/SPEED` time between its actions, so a unit with twice
+    the speed of another takes twice as many turns, and a unit dying never gives
+    anyone else extra turns. Ties go to the smallest unit ID.
+
+    Units are kept on a heap of `(time,unit_id,generation)` entries, so `pop()`,
+    `push()`, & `reschedule()` are all `O(log n)`. Instead of searching the heap
+    for a unit's entry, rescheduling bumps the unit's generation, and entries with
+    an old generation (or belonging to dead units) are dropped when they reach the
+    top of the heap.
+
+    This turn queue only lets units with the Stat `ALIVE=1` take actions. Units
+    that come to life after the queue was filled should be added with `push()`.
+
+    Parameters
+    ----------
+    :stats: A Stats object (a 2D numpy array or a `StatsTable`) from the game's Grid object
+    :STAT_ENUM: The enum used to build the `stats` object passed in the first arg
+    :speed_stat: The name of the stat holding each unit's speed, which must be positive
+    :scale: The time a unit with a speed of 1 waits between actions
+
+    Methods
+    -------
+    :pop: Return the ID of the next unit ready to take an in-game action
+    :pop_many: Return the IDs of the next `k` units ready to act, eg: for batched AI processing
+    :push: Schedule a unit's next action (eg: a unit that just came to life)
+    :reschedule: Update when a unit next acts, after its speed changed
+    '''
+
+    def __init__(self,stats,STAT_ENUM,speed_stat='SPEED',scale=100):
+
+        self.stats = stats
+        self.STAT = STAT_ENUM
+        self._validate_stats_enum(STAT_ENUM,speed_stat)
+        self.speed_stat = STAT_ENUM[speed_stat]
+        self.scale = scale
+        self.now = 0           # the time of the most recent action
+        self._queue = []       # a heap of (time,unit_id,generation) entries
+        self._generation = np.zeros(stats.shape[0],dtype=np.int64) # entries with an older generation are stale
+        self._last = np.zeros(stats.shape[0],dtype=np.float64)     # the time each unit was last scheduled from
+        self._scheduled = np.zeros(stats.shape[0],dtype=bool)
+        self._count = 0
+
+    def _validate_stats_enum(self,STAT_ENUM,speed_stat):
+        '''Ensure that stats used by this class exist (to avoid errors).
+
+        :STAT_ENUM: An enum object used to define a Grid's Stats columns
+        :speed_stat: The name of the stat holding each unit's speed
+        '''
+
+        missing = [ stat for stat in ('ALIVE',speed_stat) if stat not in dir(STAT_ENUM) ]
+        if missing:
+            raise Exception(f"The following stats are required when using TimelineTurnQueue: {', '.join(missing)}")
+
+    def __len__(self):
+        '''The length of a turn queue object is the number of units scheduled to act.
+
+        :return: The length of the current turn queue
+        '''
+
+        return self._count
+
+    def pop(self):
+        '''Return the next unit ID ready to take an action, and schedule its following action.
+
+        As is required by all turn queues, `pop()` will automatically replenish
+        the internal turn queue if it ever becomes empty.
+
+        :return: The next unit ID ready to take an action
+        '''
+
+        while True:
+            if not self._queue:
+                self._refill()
+            time,unit_id,generation = heapq.heappop(self._queue)
+            if generation!=self._generation[unit_id]:
+                continue
+            self._scheduled[unit_id] = False
+            self._count -= 1
+            if self.stats[unit_id,self.STAT.ALIVE]:
+                self.now = time
+                self._schedule(unit_id,time)
+                return unit_id
+
+    def pop_many(self,k):
+        '''Return the IDs of the next `k` units ready to take an action, in turn order.
+
+        This is the same as calling `pop()` `k` times, so fast units can appear more than once.
+
+        :k: The number of unit IDs to return
+        :return: A numpy array of unit IDs
+        '''
+
+        return np.array([ self.pop() for _ in range(k) ],dtype=np.int64)
+
+    def push(self,unit_id):
+        '''Schedule a unit to act `scale/SPEED` after the current time, replacing any action it had scheduled.
+
+        :unit_id: The unit ID to schedule
+        '''
+
+        self._schedule(int(unit_id),self.now)
+
+    def reschedule(self,unit_id):
+        '''Update when a unit next acts, after its speed changed (eg: from a haste spell).
+
+        The unit's next action moves to `scale/SPEED` after it last acted (using its new
+        speed), but never earlier than the current time. Units that aren't scheduled are
+        left alone.
+
+        :unit_id: The unit ID whose speed changed
+        '''
+
+        unit_id = int(unit_id)
+        if self._scheduled[unit_id]:
+            self._schedule(unit_id,self._last[unit_id],not_before=self.now)
+
+    def _schedule(self,unit_id,start,not_before=None):
+        '''Push a new heap entry for a unit, making any older entry for it stale.
+
+        :unit_id: The unit ID to schedule
+        :start: The time to wait from, eg: the time the unit last acted
+        :not_before: The earliest time the unit may act, if any
+        '''
+
+        speed = self.stats[unit_id,self.speed_stat]
+        if speed<=0:
+            raise Exception(f"Unit {unit_id} needs a positive speed to be scheduled, not {speed}")
+        time = start+self.scale/speed
+        if not_before is not None:
+            time = max(time,not_before)
+        self._generation[unit_id] += 1
+        self._last[unit_id] = start
+        if not self._scheduled[unit_id]:
+            self._scheduled[unit_id] = True
+            self._count += 1
+        heapq.heappush(self._queue,(float(time),unit_id,int(self._generation[unit_id])))
+
+    def _refill(self):
+        '''Schedule every living unit, starting from the current time. Called when the queue is empty.'''
+
+        unit_ids = np.flatnonzero(self.stats[:,self.STAT.ALIVE])
+        if unit_ids.shape[0]==0:
+            raise Exception("No units are alive to take a turn")
+        for unit_id in unit_ids:
+            self._schedule(int(unit_id),self.now)
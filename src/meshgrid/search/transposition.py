@@ -0,0 +1,105 @@
+import collections
+import numpy as np
+
+class TranspositionTable:
+    '''A bounded cache of search results, keyed by a Grid's Zobrist hash.
+
+    Search-based AIs reach the same Grid state through different move orders.
+    A transposition table remembers the result (eg: an evaluation & best move)
+    computed for a state, so that it can be reused instead of searched again.
+
+    Since the table is bounded, old entries are evicted by one of two policies:
+    * "lru" - when full, the least recently stored or looked-up entry is evicted
+    * "depth" - each hash maps to one of `capacity` fixed slots, and a new entry
+      only replaces the slot's entry if it was searched at least as deeply
+
+    Parameters
+    ----------
+    :capacity: The maximum number of entries
+    :policy: The eviction policy, either "lru" or "depth"
+
+    Methods
+    -------
+    :store: Store a result for a hash, searched to some depth
+    :lookup: Return the stored result for a hash, if it was searched deeply enough
+    :clear: Remove every entry
+    '''
+
+    def __init__(self,capacity,policy='lru'):
+
+        if policy not in ('lru','depth'):
+            raise Exception(f"Unknown eviction policy '{policy}', expected 'lru' or 'depth'")
+        if capacity<1:
+            raise Exception("A transposition table needs a capacity of at least 1")
+        self.capacity = capacity
+        self.policy = policy
+        self.clear()
+
+    def clear(self):
+        '''Remove every entry.'''
+
+        self._entries = collections.OrderedDict() # "lru": key -> (depth,value)
+        self._slot_keys = np.zeros(self.capacity,dtype=np.uint64) # "depth": one entry per slot
+        self._slot_depths = np.zeros(self.capacity,dtype=np.int64)
+        self._slot_values = [None]*self.capacity
+        self._slot_used = np.zeros(self.capacity,dtype=bool)
+
+    def __len__(self):
+        '''The length of a transposition table is the number of entries stored in it.'''
+
+        if self.policy=='lru':
+            return len(self._entries)
+        return int(self._slot_used.sum())
+
+    def __contains__(self,key):
+
+        if self.policy=='lru':
+            return key in self._entries
+        slot = key%self.capacity
+        return bool(self._slot_used[slot]) and int(self._slot_keys[slot])==key
+
+    def store(self,key,value,depth=0):
+        '''Store a result for a hash.
+
+        :key: A Zobrist hash (a non-negative 64-bit int)
+        :value: The result to store
+        :depth: How deeply the result was searched (only used by the "depth" policy & `lookup`)
+        :return: Whether or not the result was stored
+        '''
+
+        if self.policy=='lru':
+            self._entries[key] = (depth,value)
+            self._entries.move_to_end(key)
+            if len(self._entries)>self.capacity:
+                self._entries.popitem(last=False)
+            return True
+
+        slot = key%self.capacity
+        if self._slot_used[slot] and int(self._slot_keys[slot])!=key and self._slot_depths[slot]>depth:
+            return False # keep the deeper result
+        self._slot_keys[slot] = key
+        self._slot_depths[slot] = depth
+        self._slot_values[slot] = value
+        self._slot_used[slot] = True
+        return True
+
+    def lookup(self,key,min_depth=0,default=None):
+        '''Return the result stored for a hash.
+
+        :key: A Zobrist hash (a non-negative 64-bit int)
+        :min_depth: Only return results searched at least this deeply
+        :default: The value returned if there's no (deep enough) result
+        :return: The stored result, or `default`
+        '''
+
+        if self.policy=='lru':
+            entry = self._entries.get(key)
+            if entry is None or entry[0]<min_depth:
+                return default
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        slot = key%self.capacity
+        if key not in self or self._slot_depths[slot]<min_depth:
+            return default
+        return self._slot_values[slot]
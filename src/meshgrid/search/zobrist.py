@@ -0,0 +1,74 @@
+'''Zobrist-style hashing of Grid state, for search-based AIs.
+
+A Zobrist hash XORs together one pseudo-random 64-bit key per occupied board
+square (and optionally per Stats entry), so a single change to the Grid can be
+applied or undone by XORing that entry's key in or out. Rather than storing a
+table of random keys for every `(square,unit ID)` pair, keys are derived on the
+fly with the splitmix64 mixing function, which needs no memory and is
+vectorized with numpy.
+'''
+
+import numpy as np
+
+BOARD_SALT = np.uint64(0x243F6A8885A308D3)
+STATS_SALT = np.uint64(0x13198A2E03707344)
+
+def splitmix64(x):
+    '''Mix an array of 64-bit integers into well-distributed 64-bit keys.
+
+    :x: A numpy array of integers
+    :return: A numpy array of uint64 keys, the same shape as `x`
+    '''
+
+    with np.errstate(over='ignore'): # the arithmetic is meant to wrap around
+        z = np.asarray(x).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+def board_keys(cells,values):
+    '''Return the keys of board squares holding the given values.
+
+    :cells: An array of flat board square indexes
+    :values: An array of the values (unit IDs) held by those squares
+    :return: A numpy array of uint64 keys
+    '''
+
+    cells = np.atleast_1d(cells).astype(np.int64)
+    values = np.broadcast_to(np.asarray(values,dtype=np.int64),cells.shape)
+    with np.errstate(over='ignore'):
+        return splitmix64(splitmix64(cells.astype(np.uint64) ^ BOARD_SALT) + values.astype(np.uint64))
+
+def stats_keys(unit_ids,stat,values):
+    '''Return the keys of Stats entries holding the given values.
+
+    :unit_ids: An array of unit IDs
+    :stat: The Stats column
+    :values: An array of the values held by those entries
+    :return: A numpy array of uint64 keys
+    '''
+
+    unit_ids = np.atleast_1d(unit_ids).astype(np.int64)
+    values = np.broadcast_to(value_bits(values),unit_ids.shape)
+    column = splitmix64(np.uint64(int(stat)) ^ STATS_SALT)
+    with np.errstate(over='ignore'):
+        return splitmix64(splitmix64(unit_ids.astype(np.uint64) ^ column) + values)
+
+def value_bits(values):
+    '''Return Stats values as uint64 bits to hash, without losing the fractions of floats.
+
+    :values: A numpy array of integer, boolean, or floating point values
+    :return: A numpy array of uint64 values, the same shape as `values`
+    '''
+
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype,np.floating):
+        return (values.astype(np.float64)+0.0).view(np.uint64) # adding 0.0 turns -0.0 into 0.0
+    return values.astype(np.int64).astype(np.uint64)
+
+def xor_keys(keys):
+    '''XOR an array of keys together into a single Python int.'''
+
+    if keys.shape[0]==0:
+        return 0
+    return int(np.bitwise_xor.reduce(keys))
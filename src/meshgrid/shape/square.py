@@ -26,6 +26,18 @@ class SquareShapeManager:
     Parameters
     ----------
     :shapes: A list of numpy arrays, where each array is one piece shape
+
+    Methods
+    -------
+    :footprints: Per-shape `(si,sj,bbox)` tuples of square offsets & bounding boxes
+    :edges: Per-shape, per-direction squares entering & leaving the footprint on a one-square move
+    :valid_anchors: Return where a shape fits, given a 2D mask of free squares
+    :gather_cells: Return the `(i,j)` offsets of every square for many shapes at once
+    :shape_coords: Return the on-board `(i,j)` squares covered by a shape
+    :units_in_shape: Return the unique unit IDs found under a shape on a board
+    :units_in_shapes: Batched `units_in_shape` over many shapes at once, as a CSR-style result
+    :enumerate_shape_coords: Yield the on-board `(i,j)` squares covered by a shape
+    :enumerate_units_within_shape: Yield the unit IDs found under a shape on a board (repeats included)
     '''
 
     def __init__(self,shapes:List[np.ndarray]):
@@ -34,6 +46,10 @@ class SquareShapeManager:
         self.J_MAX = 1
         self.START = 2
         self.END   = 3
+
+        # single-square moves: down, up, right, left
+        self.DIRECTIONS = ((1,0),(-1,0),(0,1),(0,-1))
+        self.DIRECTION_INDEX = { direction:d for d,direction in enumerate(self.DIRECTIONS) }
         
         self.shapes = shapes
         
@@ -52,7 +68,173 @@ class SquareShapeManager:
             if shape[i,j]
         ],dtype=np.int32)
 
-    def enumerate_shape_coords(i0,j0,shape_id,board,empty_square=-1):
+        # per-shape contiguous (si,sj) offset arrays & (i_min,j_min,i_max,j_max) bounding boxes
+        self.footprints = [ self._make_footprint(shape_id) for shape_id in range(len(shapes)) ]
+        self.bbox = np.array([ footprint[2] for footprint in self.footprints ],dtype=np.int32).reshape(-1,4)
+
+        # per-shape, per-direction squares entering & leaving the footprint on a single-square move
+        self.edges = [ [ self._make_edges(shape_id,di,dj) for di,dj in self.DIRECTIONS ]
+                       for shape_id in range(len(shapes)) ]
+
+    def _make_footprint(self,shape_id):
+        '''Build the contiguous `(si,sj)` offset arrays & bounding box for one shape.
+
+        :shape_id: The shape to build the footprint for
+        :return: A tuple of `si`, `sj`, and the bounding box `(i_min,j_min,i_max,j_max)`
+        '''
+
+        cells = self.mask[self.info[shape_id,self.START]:self.info[shape_id,self.END]].astype(np.int64)
+        si = np.ascontiguousarray(cells[:,0])
+        sj = np.ascontiguousarray(cells[:,1])
+        if cells.shape[0]==0:
+            return si, sj, (0,0,-1,-1)
+        return si, sj, (int(si.min()),int(sj.min()),int(si.max()),int(sj.max()))
+
+    def _make_edges(self,shape_id,di,dj):
+        '''Build the leading & trailing edge of a shape for a single-square move.
+
+        Offsets are relative to the anchor of the piece *before* the move. When a piece
+        moves by `(di,dj)`, only the entering squares can collide with other pieces, and
+        only the entering & leaving squares change on the Board.
+
+        :shape_id: The shape to build the edges for
+        :di: The change in the i-direction (vertical) of the move
+        :dj: The change in the j-direction (horizontal) of the move
+        :return: A tuple of `enter_si`, `enter_sj`, the entering bounding box, `leave_si`, and `leave_sj`
+        '''
+
+        si,sj,_ = self.footprints[shape_id]
+        before = set(zip(si.tolist(),sj.tolist()))
+        after = set( (i+di,j+dj) for i,j in before )
+        entering = np.array(sorted(after-before),dtype=np.int64).reshape(-1,2)
+        leaving = np.array(sorted(before-after),dtype=np.int64).reshape(-1,2)
+        if entering.shape[0]==0:
+            enter_bbox = (0,0,-1,-1)
+        else:
+            enter_bbox = (int(entering[:,0].min()),int(entering[:,1].min()),int(entering[:,0].max()),int(entering[:,1].max()))
+        return ( np.ascontiguousarray(entering[:,0]), np.ascontiguousarray(entering[:,1]), enter_bbox,
+                 np.ascontiguousarray(leaving[:,0]), np.ascontiguousarray(leaving[:,1]) )
+
+    def valid_anchors(self,shape_id,free):
+        '''Return a boolean map of every anchor `(i,j)` where the shape fits entirely on free squares.
+
+        This is a morphological erosion of `free` by the shape. Shapes that fill their whole
+        bounding box use a summed-area table, so the cost doesn't depend on the shape's size.
+        Other shapes AND together one shifted view of `free` per square of the shape.
+
+        :shape_id: The shape to place
+        :free: A 2D boolean numpy array, True where a square is free
+        :return: A 2D boolean numpy array (same size as `free`) of valid anchor locations
+        '''
+
+        si,sj,(i_min,j_min,i_max,j_max) = self.footprints[shape_id]
+        height,width = free.shape
+        valid = np.zeros((height,width),dtype=bool)
+        # anchors for which every square of the shape's bounding box is on the board
+        a_i0,a_i1 = max(0,-i_min), min(height,height-i_max)
+        a_j0,a_j1 = max(0,-j_min), min(width,width-j_max)
+        if a_i0>=a_i1 or a_j0>=a_j1:
+            return valid
+
+        box_height,box_width = i_max-i_min+1, j_max-j_min+1
+        if si.shape[0]==box_height*box_width:
+            blocked = np.zeros((height+1,width+1),dtype=np.int64)
+            blocked[1:,1:] = np.cumsum(np.cumsum(~free,axis=0),axis=1)
+            top,left = a_i0+i_min, a_j0+j_min
+            bottom,right = a_i1+i_max, a_j1+j_max
+            window = ( blocked[top+box_height:bottom+1,left+box_width:right+1] - blocked[top:bottom+1-box_height,left+box_width:right+1]
+                       - blocked[top+box_height:bottom+1,left:right+1-box_width] + blocked[top:bottom+1-box_height,left:right+1-box_width] )
+            valid[a_i0:a_i1,a_j0:a_j1] = (window==0)
+            return valid
+
+        valid[a_i0:a_i1,a_j0:a_j1] = True
+        for di,dj in zip(si,sj):
+            valid[a_i0:a_i1,a_j0:a_j1] &= free[a_i0+di:a_i1+di,a_j0+dj:a_j1+dj]
+        return valid
+
+    def gather_cells(self,shape_ids):
+        '''Return the `(i,j)` offsets of every square of many shapes, in one numpy pass.
+
+        The result is flattened over all of the given shapes. `owner` holds, for every
+        returned square, the position in `shape_ids` of the shape it belongs to.
+
+        :shape_ids: An array of shape IDs (repeats are allowed, eg: one per unit)
+        :return: The arrays `owner`, `si`, and `sj`
+        '''
+
+        shape_ids = np.asarray(shape_ids,dtype=np.int64).reshape(-1)
+        starts = self.info[shape_ids,self.START].astype(np.int64)
+        counts = self.info[shape_ids,self.END]-starts
+        owner = np.repeat(np.arange(shape_ids.shape[0]),counts)
+        first = np.cumsum(counts)-counts
+        cells = self.mask[np.repeat(starts-first,counts)+np.arange(counts.sum())]
+        return owner, cells[:,0], cells[:,1]
+
+    def shape_coords(self,i0,j0,shape_id,board):
+        '''Return the on-board `(i,j)` squares covered by a shape anchored at `(i0,j0)`.
+
+        :i0: The i-location (vertical) of the shape's anchor
+        :j0: The j-location (horizontal) of the shape's anchor
+        :shape_id: The shape to stamp
+        :board: A 2D Board (only its shape is used)
+        :return: The arrays `i` & `j` of squares, leaving out squares that fall off the board
+        '''
+
+        si,sj,_ = self.footprints[shape_id]
+        ci,cj = i0+si, j0+sj
+        on_board = (ci>=0) & (ci<board.shape[0]) & (cj>=0) & (cj<board.shape[1])
+        return ci[on_board], cj[on_board]
+
+    def units_in_shape(self,i0,j0,shape_id,board,empty_square=-1):
+        '''Return the unique unit IDs found under a shape anchored at `(i0,j0)`, eg: for splash damage.
+
+        Units covering several of the shape's squares are only returned once.
+
+        :i0: The i-location (vertical) of the shape's anchor
+        :j0: The j-location (horizontal) of the shape's anchor
+        :shape_id: The shape to stamp
+        :board: A 2D Board (for multilayer Boards, pass a single layer eg: `board[:,:,layer]`)
+        :empty_square: The value on the Board of an empty square
+        :return: A sorted numpy array of unit IDs
+        '''
+
+        ci,cj = self.shape_coords(i0,j0,shape_id,board)
+        units = np.asarray(board[ci,cj])
+        return np.unique(units[units!=empty_square]).astype(np.int64)
+
+    def units_in_shapes(self,i0,j0,shape_ids,board,empty_square=-1):
+        '''Return the unique unit IDs under each of many shapes, in one numpy pass.
+
+        The result is in compressed sparse row (CSR) form: the unit IDs found under
+        stamp `k` are `unit_ids[offsets[k]:offsets[k+1]]`, sorted & without repeats.
+
+        :i0: An array of anchor i-locations (vertical), one per stamp
+        :j0: An array of anchor j-locations (horizontal), one per stamp
+        :shape_ids: An array of shapes, one per stamp
+        :board: A 2D Board (for multilayer Boards, pass a single layer eg: `board[:,:,layer]`)
+        :empty_square: The value on the Board of an empty square
+        :return: The arrays `offsets` (one longer than the number of stamps) & `unit_ids`
+        '''
+
+        i0 = np.asarray(i0,dtype=np.int64).reshape(-1)
+        j0 = np.asarray(j0,dtype=np.int64).reshape(-1)
+        owner,si,sj = self.gather_cells(np.broadcast_to(shape_ids,i0.shape))
+        ci,cj = i0[owner]+si, j0[owner]+sj
+        on_board = (ci>=0) & (ci<board.shape[0]) & (cj>=0) & (cj<board.shape[1])
+        owner,units = owner[on_board], np.asarray(board[ci[on_board],cj[on_board]]).astype(np.int64)
+        owner,units = owner[units!=empty_square], units[units!=empty_square]
+
+        # sort by (stamp,unit) & drop repeats within each stamp
+        order = np.lexsort((units,owner))
+        owner,units = owner[order], units[order]
+        first = np.ones(owner.shape[0],dtype=bool)
+        first[1:] = (owner[1:]!=owner[:-1]) | (units[1:]!=units[:-1])
+        owner,units = owner[first], units[first]
+        offsets = np.zeros(i0.shape[0]+1,dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(owner,minlength=i0.shape[0]))
+        return offsets, units
+
+    def enumerate_shape_coords(self,i0,j0,shape_id,board,empty_square=-1):
 
         shape_start = self.info[shape_id,self.START]
         shape_end   = self.info[shape_id,self.END]
@@ -0,0 +1,38 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.allocator import UnitIDAllocator
+
+class TestUnitIDAllocator(unittest.TestCase):
+
+    def setUp(self):
+
+        self.allocator = UnitIDAllocator(6,in_use=[0,3])
+
+    def test_allocates_lowest_free_ids_first(self):
+
+        self.assertEqual( self.allocator.free_count(), 4 )
+        self.assertEqual( self.allocator.allocate(), 1 )
+        np.testing.assert_array_equal( self.allocator.allocate_many(2), [2,4] )
+        self.assertEqual( len(self.allocator), 5 )
+        self.assertEqual( self.allocator.allocate(), 5 )
+        with self.assertRaises(Exception):
+            self.allocator.allocate()
+        with self.assertRaises(Exception):
+            self.allocator.allocate_many(1)
+
+    def test_released_ids_are_reused(self):
+
+        np.testing.assert_array_equal( self.allocator.allocate_many(4), [1,2,4,5] )
+        self.allocator.release([4,0])
+        np.testing.assert_array_equal( self.allocator.is_allocated([0,1,4]), [False,True,False] )
+        self.assertEqual( self.allocator.allocate(), 4 )
+        self.assertEqual( self.allocator.allocate(), 0 )
+        self.assertEqual( self.allocator.free_count(), 0 )
+
+    def test_only_ids_in_use_can_be_released(self):
+
+        with self.assertRaises(Exception):
+            self.allocator.release(1)
+        with self.assertRaises(Exception):
+            self.allocator.release([3,3])
+        self.assertEqual( self.allocator.free_count(), 4 )
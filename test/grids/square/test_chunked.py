@@ -0,0 +1,63 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.chunked import ChunkedBoard
+
+class TestChunkedBoard(unittest.TestCase):
+
+    def test_fancy_indexing_matches_dense(self,trials=200):
+
+        for shape in [(13,17),(13,17,3)]:
+            chunked = ChunkedBoard(shape,chunk_size=4)
+            dense = np.zeros(shape,dtype=np.int32)-1
+            for _ in range(trials):
+                index = tuple( np.random.randint(0,dim,5) for dim in shape )
+                values = np.where(np.random.rand(5)<.3,-1,np.random.randint(0,100,5))
+                index = tuple( a[np.unique(np.ravel_multi_index(index,shape),return_index=True)[1]] for a in index )
+                values = values[:index[0].shape[0]]
+                chunked[index] = values
+                dense[index] = values
+                read = tuple( np.random.randint(0,dim,7) for dim in shape )
+                np.testing.assert_array_equal( chunked[read], dense[read] )
+            np.testing.assert_array_equal( chunked.to_dense(), dense )
+            np.testing.assert_array_equal( chunked==-1, dense==-1 )
+            np.testing.assert_array_equal( chunked[1:5,2], dense[1:5,2] )
+            for column,expected in zip(chunked.occupied(),np.nonzero(dense!=-1)+(dense[dense!=-1],)):
+                np.testing.assert_array_equal( column, expected )
+
+    def test_empty_index(self):
+
+        chunked = ChunkedBoard((13,17),chunk_size=4)
+        empty = np.zeros(0,dtype=np.int64)
+        self.assertEqual( chunked[empty,empty].shape, (0,) )
+        chunked[empty,empty] = 5
+        self.assertEqual( len(chunked._chunks), 0 )
+
+    def test_chunks_are_allocated_lazily_and_freed(self):
+
+        board = ChunkedBoard((100_000,100_000),chunk_size=64)
+        self.assertEqual( board.chunk_count(), 0 )
+        self.assertEqual( board[99_999,12_345], -1 )
+        board[np.array([5,6]),np.array([5,70])] = -1 # writing blanks allocates nothing
+        self.assertEqual( board.chunk_count(), 0 )
+        board[np.array([5,6]),np.array([5,70])] = 7
+        self.assertEqual( board.chunk_count(), 2 )
+        self.assertEqual( board.memory_usage(), 2*64*64*4 )
+        self.assertEqual( board[6-100_000,70-100_000], 7 ) # negative indices wrap around
+        board[6,70] = -1
+        self.assertEqual( board.chunk_count(), 1 )
+        board[:] = -1
+        self.assertEqual( board.chunk_count(), 0 )
+        with self.assertRaises(IndexError):
+            board[100_000,0]
+
+    def test_copy_and_assign(self):
+
+        board = ChunkedBoard((10,10),chunk_size=4)
+        board[3,3] = 1
+        copied = board.copy()
+        board[3,3] = 2
+        self.assertEqual( copied[3,3], 1 )
+        board.assign(copied)
+        self.assertEqual( board[3,3], 1 )
+        with self.assertRaises(Exception):
+            board.assign(ChunkedBoard((10,10),chunk_size=5))
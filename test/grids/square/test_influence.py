@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.influence import rasterize_sides, spread_influence, manhattan_distance_planes, SquareInfluenceMaps
+
+class TestInfluence(unittest.TestCase):
+
+    def setUp(self):
+
+        self.pieces = (np.array([0,4,4]),np.array([0,5,5]),np.array([0,2,2]),np.array([1.,2.,3.]),6,7)
+
+    def test_rasterize_sides(self):
+
+        planes = rasterize_sides(*self.pieces)
+        self.assertEqual( planes.shape, (3,6,7) )
+        self.assertEqual( planes[2,4,5], 5 )
+        self.assertEqual( planes[1].sum(), 0 )
+        with self.assertRaises(Exception):
+            rasterize_sides(np.array([0]),np.array([0]),np.array([-1]),np.array([1.]),6,7)
+
+    def test_spread_matches_the_full_kernel(self):
+
+        planes = rasterize_sides(*self.pieces)
+        spread = spread_influence(planes,0.5,radius=3)
+        di,dj = np.abs(np.arange(6)[:,None]-4), np.abs(np.arange(7)[None,:]-5)
+        expected = np.where((di<=3)&(dj<=3),5*0.5**(di+dj),0)
+        np.testing.assert_allclose( spread[2], expected )
+        self.assertEqual( spread[0,0,0], 1 )
+
+    def test_manhattan_distance(self):
+
+        distance = manhattan_distance_planes(rasterize_sides(*self.pieces))
+        np.testing.assert_array_equal( distance[1], -1 )
+        self.assertEqual( distance[0,5,6], 11 )
+        self.assertEqual( distance[2,0,0], 9 )
+        self.assertEqual( distance[2,4,5], 0 )
+
+    def test_maps_are_cached_until_refreshed(self):
+
+        calls = []
+        def sources():
+            calls.append(1)
+            return self.pieces
+        maps = SquareInfluenceMaps(decay=0.5,radius=2)
+        influence = maps.influence(sources)
+        self.assertIs( maps.influence(sources), influence )
+        maps.distance(sources)
+        self.assertEqual( len(calls), 1 )
+        self.assertFalse( influence.flags.writeable )
+        maps.refresh()
+        self.assertIsNot( maps.influence(sources), influence )
+        self.assertEqual( len(calls), 2 )
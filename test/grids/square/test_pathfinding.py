@@ -0,0 +1,55 @@
+import unittest
+import collections
+import numpy as np
+from src.meshgrid.grids.square.pathfinding import bfs_distance_field, descend_field, touching_squares
+
+class TestPathfinding(unittest.TestCase):
+
+    def _brute_force_field(self,passable,sources):
+
+        dist = np.full(passable.shape,-1)
+        queue = collections.deque()
+        for i,j in zip(*np.nonzero(sources & passable)):
+            dist[i,j] = 0
+            queue.append((i,j))
+        while queue:
+            i,j = queue.popleft()
+            for di,dj in [(1,0),(-1,0),(0,1),(0,-1)]:
+                ni,nj = i+di,j+dj
+                if 0<=ni<passable.shape[0] and 0<=nj<passable.shape[1] and passable[ni,nj] and dist[ni,nj]<0:
+                    dist[ni,nj] = dist[i,j]+1
+                    queue.append((ni,nj))
+        return dist
+
+    def test_bfs_distance_field_matches_brute_force(self,trials=50):
+
+        for _ in range(trials):
+            passable = np.random.rand(9,13)<.7
+            sources = np.random.rand(9,13)<.05
+            np.testing.assert_array_equal( bfs_distance_field(passable,sources), self._brute_force_field(passable,sources) )
+
+    def test_bfs_distance_field_max_dist(self):
+
+        passable = np.ones((1,6),dtype=bool)
+        sources = np.zeros((1,6),dtype=bool)
+        sources[0,0] = True
+        np.testing.assert_array_equal( bfs_distance_field(passable,sources,max_dist=2), [[0,1,2,-1,-1,-1]] )
+
+    def test_descend_field(self):
+
+        dist = np.array([
+            [ 2, 1, 0],
+            [-1,-1, 1],
+            [ 4, 3, 2],
+        ])
+        di,dj = descend_field(dist,[0,2,0,1],[0,0,2,0])
+        np.testing.assert_array_equal( di, [0,0,0,-1] ) # unreachable anchors still move downhill
+        np.testing.assert_array_equal( dj, [1,1,0,0] )
+        di,dj = descend_field(dist,[2],[2])
+        np.testing.assert_array_equal( (di,dj), ([-1],[0]) )
+
+    def test_touching_squares(self):
+
+        occupied = np.zeros((3,3),dtype=bool)
+        occupied[1,1] = True
+        np.testing.assert_array_equal( touching_squares(occupied), [[0,1,0],[1,0,1],[0,1,0]] )
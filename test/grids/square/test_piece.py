@@ -1,5 +1,6 @@
  
 import enum
+import tempfile
 import unittest
 import numpy as np
 from src.meshgrid.grids.square.piece import SquarePieceGrid2D
@@ -55,6 +56,140 @@ class TestSquarePieceGrid2D(unittest.TestCase):
         
         self.assertEqual( self.grid.get_nearest_ally(0), (3,3.0) )
 
+    def test_get_nearest_enemy_when_none_exist(self):
+
+        self.grid.stats[:,self.grid.STAT.SIDE] = 0
+        self.assertEqual( self.grid.get_nearest_enemy(0), (-1,1e10) )
+
+    def test_batched_nearest_matches_brute_force(self,trials=50):
+
+        for _ in range(trials):
+            self.grid.stats[:,self.grid.STAT.ALIVE] = np.random.randint(0,2,self.grid.max_units)
+            self.grid.stats[:,self.grid.STAT.SIDE] = np.random.randint(0,2,self.grid.max_units)
+            self.grid.loc = np.random.randint(0,5,(self.grid.max_units,2))
+
+            unit_ids = np.arange(self.grid.max_units)
+            enemy_ids,enemy_dists = self.grid.get_nearest_enemies(unit_ids,chunk_size=2)
+            ally_ids,ally_dists = self.grid.get_nearest_allies(unit_ids,chunk_size=2)
+            for unit_id in unit_ids:
+                for allies,ids,dists in [(False,enemy_ids,enemy_dists),(True,ally_ids,ally_dists)]:
+                    best_id,best_dist = -1,1e10
+                    for other in range(self.grid.max_units):
+                        same_side = self.grid.stats[other,self.grid.STAT.SIDE]==self.grid.stats[unit_id,self.grid.STAT.SIDE]
+                        if ( self.grid.stats[other,self.grid.STAT.ALIVE] and same_side==allies and 
+                             other!=unit_id and self.grid.get_dist(unit_id,other)<best_dist ):
+                            best_id,best_dist = other,self.grid.get_dist(unit_id,other)
+                    self.assertEqual( (ids[unit_id],dists[unit_id]), (best_id,best_dist) )
+
+    def test_spatial_index_matches_brute_force(self,test_steps=200):
+
+        big_grid = SquarePieceGrid2D(grid_width=30,grid_height=20,max_units=40,
+                                     shape_manager=self.shape_manager,stats_list=['ALIVE','SIDE','SHAPE'])
+        big_grid.stats[:,big_grid.STAT.ALIVE] = 1
+        big_grid.stats[:,big_grid.STAT.SIDE] = np.arange(40)%3
+        big_grid.place_pieces_randomly()
+        brute_force = (big_grid.get_nearest_enemies(np.arange(40)),big_grid.get_nearest_allies(np.arange(40)))
+
+        big_grid.enable_spatial_index(bucket_size=4)
+        indexed = (big_grid.get_nearest_enemies(np.arange(40)),big_grid.get_nearest_allies(np.arange(40)))
+        for expected,result in zip(brute_force,indexed):
+            np.testing.assert_array_equal( expected[0], result[0] )
+            np.testing.assert_array_equal( expected[1], result[1] )
+
+        for _ in range(test_steps):
+            unit_id = np.random.randint(40)
+            big_grid.move_piece(unit_id,*np.random.randint(-2,3,2))
+            if np.random.rand()<.05:
+                big_grid.remove_piece(unit_id)
+                big_grid.stats[unit_id,big_grid.STAT.ALIVE] = 0
+            rect = np.sort(np.random.randint(0,30,(2,2)),axis=0)
+            big_grid.spatial, spatial = None, big_grid.spatial
+            expected = (big_grid.get_nearest_enemy(unit_id),big_grid.get_units_in_rect(*rect.ravel()),
+                        big_grid.get_units_within_dist(10,10,5,side=1))
+            big_grid.spatial = spatial
+            result = (big_grid.get_nearest_enemy(unit_id),big_grid.get_units_in_rect(*rect.ravel()),
+                      big_grid.get_units_within_dist(10,10,5,side=1))
+            self.assertEqual( expected[0], result[0] )
+            np.testing.assert_array_equal( expected[1], result[1] )
+            np.testing.assert_array_equal( expected[2], result[2] )
+
+    def _make_big_grid(self,max_units=30,shapes=(0,1,2)):
+
+        big_grid = SquarePieceGrid2D(grid_width=15,grid_height=12,max_units=max_units,
+                                     shape_manager=self.shape_manager,stats_list=['ALIVE','SIDE','SHAPE'])
+        big_grid.stats[:,big_grid.STAT.ALIVE] = 1
+        big_grid.stats[:,big_grid.STAT.SHAPE] = np.array(shapes)[np.arange(max_units)%len(shapes)]
+        return big_grid
+
+    def _assert_board_matches_loc(self,grid,empty_square=-1):
+
+        expected = np.zeros_like(grid.board)+empty_square
+        for unit_id in np.flatnonzero(grid.loc[:,0]>=0):
+            shape = grid.shape.shapes[grid.stats[unit_id,grid.STAT.SHAPE]]
+            i,j = grid.loc[unit_id]
+            expected[i:i+shape.shape[0],j:j+shape.shape[1]][shape] = unit_id
+        np.testing.assert_array_equal( grid.board, expected )
+
+    def test_place_pieces_matches_one_at_a_time_placement(self,trials=20):
+
+        for _ in range(trials):
+            batch_grid = self._make_big_grid()
+            serial_grid = self._make_big_grid()
+            unit_ids = np.random.permutation(30)[:20]
+            i,j = np.random.randint(-1,13,20), np.random.randint(-1,15,20)
+
+            placed = batch_grid.place_pieces(unit_ids,i,j)
+            for n in np.argsort(unit_ids):
+                self.assertEqual( serial_grid.place_piece(unit_ids[n],i[n],j[n]), placed[n] )
+            np.testing.assert_array_equal( batch_grid.board, serial_grid.board )
+            np.testing.assert_array_equal( batch_grid.loc, serial_grid.loc )
+
+    def test_move_pieces_conflicts(self):
+
+        grid = self._make_big_grid(shapes=(0,))
+        grid.place_pieces([0,1,2,3,4],[0,0,0,2,2],[0,1,2,0,2])
+
+        # a row of pieces can all shift right at once, into squares vacated by each other
+        np.testing.assert_array_equal( grid.move_pieces([2,1,0],0,1), [True,True,True] )
+        np.testing.assert_array_equal( grid.board[0,:4], [-1,0,1,2] )
+
+        # units 3 & 4 both want square (2,1): the lowest ID wins
+        np.testing.assert_array_equal( grid.move_pieces([4,3],0,[-1,1]), [False,True] )
+        self.assertEqual( grid.board[2,1], 3 )
+
+        # unit 1 is blocked by unit 3 (not moving), so unit 0 (which wanted unit 1's square) stays put too
+        np.testing.assert_array_equal( grid.move_pieces([0,1],[0,2],[1,-1]), [False,False] )
+        np.testing.assert_array_equal( grid.board[0,:4], [-1,0,1,2] )
+
+        # the "reject" policy moves nothing if a single unit fails
+        np.testing.assert_array_equal( grid.move_pieces([0,4],[1,-3],0,conflict='reject'), [False,False] )
+        np.testing.assert_array_equal( grid.move_pieces([0,4],[1,1],0,conflict='reject'), [True,True] )
+        self._assert_board_matches_loc(grid)
+
+        with self.assertRaises(Exception):
+            grid.move_pieces([0,0],1,0)
+
+    def test_randomized_move_pieces_keeps_board_and_loc_in_sync(self,trials=50):
+
+        grid = self._make_big_grid()
+        grid.place_pieces(np.arange(30),np.random.randint(0,12,30),np.random.randint(0,15,30))
+        for _ in range(trials):
+            unit_ids = np.random.permutation(30)[:np.random.randint(1,30)]
+            di,dj = np.random.randint(-1,2,(2,unit_ids.shape[0]))
+            old_loc = grid.loc.copy()
+            moved = grid.move_pieces(unit_ids,di,dj)
+            np.testing.assert_array_equal( grid.loc[unit_ids[moved]], old_loc[unit_ids[moved]]+np.vstack((di,dj)).T[moved] )
+            np.testing.assert_array_equal( grid.loc[unit_ids[~moved]], old_loc[unit_ids[~moved]] )
+            self._assert_board_matches_loc(grid)
+
+    def test_remove_pieces(self):
+
+        grid = self._make_big_grid()
+        grid.place_pieces([0,1,2],[0,5,8],[0,5,8])
+        np.testing.assert_array_equal( grid.remove_pieces([1,2,3]), [True,True,False] )
+        np.testing.assert_array_equal( grid.loc[[1,2]], -1 )
+        self._assert_board_matches_loc(grid)
+
     def test_move_piece(self,test_steps=1_000,empty_square=-1):
         '''Move unit_id=0 around the board randomly.'''
 
@@ -81,6 +216,27 @@ class TestSquarePieceGrid2D(unittest.TestCase):
                 self.assertEqual( self.grid.loc[0,0], i )
                 self.assertEqual( self.grid.loc[0,1], j )
 
+    def test_pieces_off_the_board_cannot_move(self):
+
+        self.grid.remove_piece(0)
+        board = self.grid.board.copy()
+        for di,dj in [(1,1),(0,1),(2,0)]:
+            self.assertFalse( self.grid.move_piece(0,di,dj) )
+        np.testing.assert_array_equal( self.grid.board, board )
+        np.testing.assert_array_equal( self.grid.loc[0], [-1,-1] )
+
+    def test_single_square_moves_of_multi_square_pieces(self,test_steps=500):
+
+        grid = self._make_big_grid(max_units=12)
+        grid.place_pieces(np.arange(12),np.random.randint(0,12,12),np.random.randint(0,15,12))
+        for _ in range(test_steps):
+            unit_id = np.random.choice(np.flatnonzero(grid.loc[:,0]>=0))
+            di,dj = grid.shape.DIRECTIONS[np.random.randint(4)]
+            i,j = grid.loc[unit_id]
+            expected = grid.piece_can_be_placed_here(unit_id,i+di,j+dj)
+            self.assertEqual( grid.move_piece(unit_id,di,dj), expected )
+            self._assert_board_matches_loc(grid)
+
     def test_remove_and_place_piece(self,test_steps=1_000,empty_square=-1):
         '''Move unit_id=0 around the board randomly.'''
 
@@ -123,6 +279,71 @@ class TestSquarePieceGrid2D(unittest.TestCase):
                 else:
                     self.assertFalse( self.grid.piece_can_be_placed_here(test_piece,i,j) )
 
+    def test_multi_square_piece_can_be_placed_here(self,test_piece=0,empty_square=-1):
+
+        for shape_id in range(len(self.shape_manager.shapes)):
+            self.grid.stats[test_piece,self.grid.STAT.SHAPE] = shape_id
+            shape = self.shape_manager.shapes[shape_id]
+            for i in range(-1,self.grid.board.shape[0]+1):
+                for j in range(-1,self.grid.board.shape[1]+1):
+                    expected = ( i>=0 and j>=0 and i+shape.shape[0]<=self.grid.board.shape[0] and 
+                                 j+shape.shape[1]<=self.grid.board.shape[1] and
+                                 np.isin(self.grid.board[i:i+shape.shape[0],j:j+shape.shape[1]],[empty_square,test_piece]).all() )
+                    self.assertEqual( self.grid.piece_can_be_placed_here(test_piece,i,j), expected )
+
+    def test_valid_anchor_map(self,test_piece=0):
+
+        self.grid.remove_piece(test_piece)
+        for shape_id in range(len(self.shape_manager.shapes)):
+            self.grid.stats[test_piece,self.grid.STAT.SHAPE] = shape_id
+            anchors = self.grid.valid_anchor_map(shape_id)
+            self.assertEqual( anchors.shape, self.grid.board.shape )
+            for i in range(self.grid.board.shape[0]):
+                for j in range(self.grid.board.shape[1]):
+                    self.assertEqual( anchors[i,j], self.grid.piece_can_be_placed_here(test_piece,i,j) )
+
+    def test_cached_valid_anchor_map_is_invalidated_by_board_changes(self):
+
+        anchors = self.grid.cached_valid_anchor_map(0)
+        self.assertIs( self.grid.cached_valid_anchor_map(0), anchors )
+        self.assertFalse( anchors.flags.writeable )
+        self.assertFalse( anchors[2,2] )
+
+        self.grid.move_piece(0,1,0)
+        updated = self.grid.cached_valid_anchor_map(0)
+        self.assertIsNot( updated, anchors )
+        self.assertTrue( updated[2,2] )
+        self.assertFalse( updated[3,2] )
+
+        self.grid.board[0,4] = 3 # hand-made edits need an explicit invalidation
+        self.grid.invalidate_caches()
+        self.assertFalse( self.grid.cached_valid_anchor_map(0)[0,4] )
+
+    def test_place_pieces_randomly_from_anchors(self,trials=20):
+
+        for _ in range(trials):
+            big_grid = self._make_big_grid(max_units=12)
+            big_grid.place_pieces_randomly(mode='anchors')
+            self.assertTrue( (big_grid.loc[:,0]>=0).all() )
+            self._assert_board_matches_loc(big_grid)
+
+        full_grid = SquarePieceGrid2D(grid_width=5,grid_height=5,max_units=25,shape_manager=self.shape_manager,
+                                      stats_list=['ALIVE','SIDE','SHAPE'])
+        full_grid.place_pieces_randomly(mode='anchors') # every square gets used, without any retries
+        np.testing.assert_array_equal( np.sort(full_grid.board.ravel()), np.arange(25) )
+
+        crowded_grid = self._make_big_grid(max_units=21,shapes=(2,))
+        with self.assertRaises(Exception):
+            crowded_grid.place_pieces_randomly(mode='anchors') # at most 20 3x3 pieces fit on a 12x15 board
+
+    def test_random_grid_locs_are_distinct(self):
+
+        big_grid = self._make_big_grid(max_units=180)
+        locs = big_grid.random_grid_locs()
+        self.assertEqual( locs.shape, (180,2) )
+        self.assertEqual( np.unique(locs[:,0]*15+locs[:,1]).shape[0], 180 )
+        self.assertTrue( (locs>=0).all() and (locs[:,0]<12).all() and (locs[:,1]<15).all() )
+
     def test_step_closer(self):
 
         self.assertEqual( self.grid.board[2,2], 0 )
@@ -132,8 +353,241 @@ class TestSquarePieceGrid2D(unittest.TestCase):
         self.assertEqual( self.grid.board[3,3], 0 )
         self.grid.step_closer(0,2) # step up
         self.assertEqual( self.grid.board[2,3], 0 )
-        self.grid.step_closer(0,1) # step left
+        self.assertTrue( self.grid.step_closer(0,1) ) # step left
         self.assertEqual( self.grid.board[2,2], 0 )
+        self.assertFalse( self.grid.step_closer(0,0) ) # already there
+
+    def _make_walled_grid(self):
+
+        grid = SquarePieceGrid2D(grid_width=7,grid_height=5,max_units=6,shape_manager=self.shape_manager,
+                                 stats_list=['ALIVE','SIDE','SHAPE'])
+        grid.stats[:,grid.STAT.ALIVE] = 1
+        grid.stats[:,grid.STAT.SIDE] = [0,1,2,2,2,0]
+        grid.place_pieces([0,1,2,3,4],[2,2,1,2,3],[0,6,3,3,3]) # units 2-4 are a wall between 0 & 1
+        return grid
+
+    def test_step_along_field_paths_around_walls(self):
+
+        grid = self._make_walled_grid()
+        self.assertEqual( grid.distance_field(0,target_side=1,mover_side=0)[2,0], 9 )
+        for _ in range(5):
+            grid.step_closer(0,1)
+        np.testing.assert_array_equal( grid.loc[0], [2,2] ) # step_closer jams against the wall
+
+        grid = self._make_walled_grid()
+        for _ in range(9):
+            self.assertTrue( grid.step_along_field([0],target_side=1)[0] )
+        self.assertEqual( grid.get_dist(0,1), 1 )
+        self.assertFalse( grid.step_along_field([0],target_side=1)[0] ) # already touching the target
+        self._assert_board_matches_loc(grid)
+
+    def test_step_along_field_moves_many_pieces(self,trials=20):
+
+        for _ in range(trials):
+            big_grid = self._make_big_grid(max_units=20,shapes=(0,0,1))
+            big_grid.stats[:,big_grid.STAT.SIDE] = np.arange(20)%2
+            big_grid.place_pieces_randomly(mode='anchors')
+            movers = np.flatnonzero(big_grid.stats[:,big_grid.STAT.SIDE]==0)
+            for _ in range(5):
+                before = [ big_grid.distance_field(shape_id,target_side=1,mover_side=0)[tuple(big_grid.loc[unit_id])]
+                           for unit_id,shape_id in zip(movers,big_grid.stats[movers,big_grid.STAT.SHAPE]) ]
+                fields = { shape_id:big_grid.distance_field(shape_id,target_side=1,mover_side=0) for shape_id in (0,1) }
+                moved = big_grid.step_along_field(movers,target_side=1)
+                for unit_id,was_moved,dist in zip(movers,moved,before):
+                    field = fields[big_grid.stats[unit_id,big_grid.STAT.SHAPE]]
+                    if was_moved:
+                        self.assertEqual( field[tuple(big_grid.loc[unit_id])], dist-1 )
+                self._assert_board_matches_loc(big_grid)
+
+    def test_distance_field_cache(self):
+
+        grid = self._make_walled_grid()
+        field = grid.distance_field(0,target_id=1,mover_side=0)
+        self.assertIs( grid.distance_field(0,target_id=1,mover_side=0), field )
+        self.assertFalse( field.flags.writeable )
+        self.assertEqual( field[2,4], 1 )
+        grid.move_piece(1,-1,0)
+        self.assertEqual( grid.distance_field(0,target_id=1,mover_side=0)[2,4], 2 )
+        with self.assertRaises(Exception):
+            grid.distance_field(0,target_side=1,target_id=1)
+
+    def _random_writes(self,grid,steps=20):
+
+        for _ in range(steps):
+            unit_id = np.random.randint(grid.max_units)
+            choice = np.random.randint(4)
+            if choice==0:
+                grid.move_piece(unit_id,*np.random.randint(-1,2,2))
+            elif choice==1:
+                grid.remove_piece(unit_id)
+            elif choice==2:
+                grid.place_piece(unit_id,*np.random.randint(0,12,2))
+            else:
+                grid.set_stats(unit_id,grid.STAT.SIDE,np.random.randint(2))
+
+    def test_checkpoint_rollback_and_commit(self,trials=20):
+
+        for _ in range(trials):
+            big_grid = self._make_big_grid(max_units=12)
+            big_grid.stats[:,big_grid.STAT.SIDE] = np.arange(12)%2
+            big_grid.place_pieces_randomly(mode='anchors')
+            big_grid.enable_spatial_index(bucket_size=4)
+            original = (big_grid.board.copy(),big_grid.loc.copy(),big_grid.stats.copy())
+
+            outer = big_grid.checkpoint()
+            self._random_writes(big_grid)
+            middle = (big_grid.board.copy(),big_grid.loc.copy(),big_grid.stats.copy())
+            inner = big_grid.checkpoint()
+            self._random_writes(big_grid)
+            big_grid.rollback(inner)
+            for array,expected in zip((big_grid.board,big_grid.loc,big_grid.stats),middle):
+                np.testing.assert_array_equal( array, expected )
+
+            inner = big_grid.checkpoint()
+            self._random_writes(big_grid)
+            big_grid.commit(inner)
+            big_grid.rollback(outer)
+            for array,expected in zip((big_grid.board,big_grid.loc,big_grid.stats),original):
+                np.testing.assert_array_equal( array, expected )
+            self.assertIsNone( big_grid._journal )
+
+            expected_index = sorted(big_grid.spatial._where.items())
+            big_grid.rebuild_spatial_index()
+            self.assertEqual( sorted(big_grid.spatial._where.items()), expected_index )
+            with self.assertRaises(Exception):
+                big_grid.rollback(outer)
+
+    def test_zobrist_hash_is_maintained_incrementally(self,trials=10):
+
+        for _ in range(trials):
+            big_grid = self._make_big_grid(max_units=12)
+            big_grid.enable_zobrist(stats_list=['SIDE'])
+            empty_hash = big_grid.zobrist
+            big_grid.place_pieces_randomly(mode='anchors')
+            start_hash = big_grid.zobrist
+            self.assertNotEqual( start_hash, empty_hash )
+
+            token = big_grid.checkpoint()
+            self._random_writes(big_grid,steps=50)
+            incremental = big_grid.zobrist
+            big_grid.rebuild_zobrist()
+            self.assertEqual( big_grid.zobrist, incremental )
+
+            big_grid.rollback(token)
+            self.assertEqual( big_grid.zobrist, start_hash )
+
+            # a unit ID repeated within one write only keeps its last value, and is hashed once
+            token = big_grid.checkpoint()
+            big_grid.set_stats(np.array([2,2,5]),big_grid.STAT.SIDE,[5,6,7])
+            incremental = big_grid.zobrist
+            big_grid.rebuild_zobrist()
+            self.assertEqual( big_grid.zobrist, incremental )
+            big_grid.rollback(token)
+            self.assertEqual( big_grid.zobrist, start_hash )
+
+        with self.assertRaises(Exception):
+            big_grid.enable_zobrist(stats_list=['HP'])
+
+    def test_zobrist_hash_identifies_positions(self):
+
+        self.grid.enable_zobrist()
+        start_hash = self.grid.zobrist
+        self.grid.move_piece(0,1,0)
+        self.assertNotEqual( self.grid.zobrist, start_hash )
+        self.grid.move_piece(0,-1,0)
+        self.assertEqual( self.grid.zobrist, start_hash )
+        self.grid.set_stats(0,self.grid.STAT.ALIVE,0) # unhashed stats don't change the hash
+        self.assertEqual( self.grid.zobrist, start_hash )
+
+    def test_zobrist_hash_of_float_stats(self):
+
+        grid = SquarePieceGrid2D(5,5,3,self.shape_manager,['ALIVE','SIDE','SHAPE',('HP',np.float32)])
+        grid.enable_zobrist(stats_list=['HP'])
+        grid.set_stats(1,grid.STAT.HP,1.2)
+        low_hash = grid.zobrist
+        grid.set_stats(1,grid.STAT.HP,1.7)
+        self.assertNotEqual( grid.zobrist, low_hash )
+        incremental = grid.zobrist
+        grid.rebuild_zobrist()
+        self.assertEqual( grid.zobrist, incremental )
+        grid.set_stats(1,grid.STAT.HP,1.2)
+        self.assertEqual( grid.zobrist, low_hash )
+
+    def test_chunked_board_backend_matches_dense(self,trials=5):
+
+        for _ in range(trials):
+            dense_grid = self._make_big_grid(max_units=12)
+            chunked_grid = SquarePieceGrid2D(grid_width=15,grid_height=12,max_units=12,shape_manager=self.shape_manager,
+                                             stats_list=['ALIVE','SIDE','SHAPE'],board_backend='chunked',chunk_size=4)
+            chunked_grid.stats[:] = dense_grid.stats
+            for grid in (dense_grid,chunked_grid):
+                grid.enable_zobrist()
+            dense_grid.place_pieces_randomly(mode='anchors')
+            chunked_grid.place_pieces(np.arange(12),dense_grid.loc[:,0],dense_grid.loc[:,1])
+            chunked_grid.snapshot()
+            snapshot_board = chunked_grid.board.to_dense()
+            for _ in range(100):
+                unit_id = np.random.randint(12)
+                di,dj = np.random.randint(-1,2,2)
+                i,j = np.random.randint(0,12,2)
+                self.assertEqual( dense_grid.move_piece(unit_id,di,dj), chunked_grid.move_piece(unit_id,di,dj) )
+                self.assertEqual( dense_grid.piece_can_be_placed_here(unit_id,i,j), chunked_grid.piece_can_be_placed_here(unit_id,i,j) )
+                if np.random.rand()<.1:
+                    dense_grid.remove_piece(unit_id)
+                    chunked_grid.remove_piece(unit_id)
+            np.testing.assert_array_equal( chunked_grid.board.to_dense(), dense_grid.board )
+            np.testing.assert_array_equal( chunked_grid.valid_anchor_map(1), dense_grid.valid_anchor_map(1) )
+            self.assertEqual( chunked_grid.zobrist, dense_grid.zobrist )
+            loc = chunked_grid.loc.copy()
+            chunked_grid.rebuild_loc_from_board()
+            np.testing.assert_array_equal( chunked_grid.loc[np.flatnonzero(dense_grid.stats[:,2]==0)],
+                                           loc[np.flatnonzero(dense_grid.stats[:,2]==0)] )
+            chunked_grid.restore()
+            np.testing.assert_array_equal( chunked_grid.board.to_dense(), snapshot_board )
+
+    def test_chunked_board_backend_handles_empty_batches(self):
+
+        for board_backend in ('dense','chunked'):
+            grid = SquarePieceGrid2D(6,6,4,self.shape_manager,['ALIVE','SIDE','SHAPE'],board_backend=board_backend,chunk_size=4)
+            grid.place_pieces([0],[1],[1])
+            grid.enable_unit_allocator()
+            board = np.asarray(grid.board[np.arange(6)[:,None],np.arange(6)[None,:]])
+
+            grid.remove_pieces([2])                                           # off the Board
+            np.testing.assert_array_equal( grid.place_pieces([1],[20],[0]), [False] ) # out of bounds
+            grid.mark_dirty(unit_ids=[2])
+            np.testing.assert_array_equal( grid.sync(), [2] )
+            np.testing.assert_array_equal( grid.loc[2], [-1,-1] )
+            unit_id = grid.allocate()
+            grid.release(unit_id)
+            self.assertFalse( grid.allocator.is_allocated(unit_id) )
+            np.testing.assert_array_equal( grid.board[np.arange(6)[:,None],np.arange(6)[None,:]], board )
+
+    def test_chunked_board_backend_scales_with_occupied_area(self):
+
+        world = SquarePieceGrid2D(grid_width=100_000,grid_height=100_000,max_units=3,shape_manager=self.shape_manager,
+                                  stats_list=['ALIVE','SIDE','SHAPE'],board_backend='chunked')
+        world.stats[:,world.STAT.SHAPE] = [0,1,2]
+        np.testing.assert_array_equal( world.place_pieces([0,1,2],[10,50_000,99_997],[10,50_000,99_997]), [True,True,True] )
+        self.assertTrue( world.move_piece(2,-1,0) )
+        self.assertFalse( world.move_piece(2,0,1) )
+        self.assertTrue( world.piece_can_be_placed_here(0,99_999,99_999) )
+        self.assertLessEqual( world.board.chunk_count(), 4 )
+        with self.assertRaises(Exception):
+            SquarePieceGrid2D(grid_width=5,grid_height=5,max_units=1,shape_manager=self.shape_manager,
+                              stats_list=['SHAPE'],board_backend='sparse')
+
+    def test_snapshot_and_restore(self):
+
+        self.grid.snapshot()
+        board = self.grid.board
+        expected = (self.grid.board.copy(),self.grid.loc.copy(),self.grid.stats.copy())
+        self.grid.move_piece(0,1,1)
+        self.grid.set_stats(1,self.grid.STAT.ALIVE,0)
+        self.grid.restore()
+        self.assertIs( self.grid.board, board )
+        for array,expected in zip((self.grid.board,self.grid.loc,self.grid.stats),expected):
+            np.testing.assert_array_equal( array, expected )
 
     def test_randomized_rebuild_loc_from_board(self,trials=1000,empty_square=-1,off_board=-1):
 
@@ -166,4 +620,226 @@ class TestSquarePieceGrid2D(unittest.TestCase):
                 i,j = self.grid.loc[unit_id]
                 self.assertEqual( self.grid.board[i,j], unit_id )
             for i,j in empty_squares:
-                self.assertEqual( self.grid.board[i,j], empty_square )
\ No newline at end of file
+                self.assertEqual( self.grid.board[i,j], empty_square )
+    def test_save_and_open_memory_maps_the_grid(self):
+
+        with tempfile.TemporaryDirectory() as path:
+            self.grid.save(path)
+
+            reader = SquarePieceGrid2D.open(path,self.shape_manager)
+            self.assertIsInstance( reader.board, np.memmap )
+            np.testing.assert_array_equal( reader.board, self.grid.board )
+            np.testing.assert_array_equal( reader.loc, self.grid.loc )
+            self.assertEqual( [ stat.name for stat in reader.STAT ], ['ALIVE','SIDE','SHAPE'] )
+            self.assertEqual( reader.get_nearest_enemy(0), self.grid.get_nearest_enemy(0) )
+            with self.assertRaises(ValueError):
+                reader.move_piece(0,1,0) # read-only maps can't be changed
+
+            writer = SquarePieceGrid2D.open(path,self.shape_manager,mode='r+')
+            self.assertTrue( writer.move_piece(0,1,0) )
+            writer.flush()
+            reopened = SquarePieceGrid2D.open(path,self.shape_manager)
+            np.testing.assert_array_equal( reopened.loc[0], [3,2] )
+            self.assertEqual( reopened.board[3,2], 0 )
+            self.assertEqual( reopened.board[2,2], -1 )
+            del reader, writer, reopened
+
+    def test_stats_with_per_stat_dtypes(self):
+
+        stats_list = [('ALIVE',np.bool_),('SIDE',np.int8),('SHAPE',np.uint8),('HP',np.int16)]
+        grid = SquarePieceGrid2D(6,6,4,self.shape_manager,stats_list)
+        self.assertEqual( grid.stats.dtypes, [np.dtype(dtype) for _,dtype in stats_list] )
+        self.assertEqual( grid.stats.nbytes, 4*(1+1+1+2) )
+
+        grid.stats[:,grid.STAT.ALIVE] = True
+        grid.stats[:,grid.STAT.SIDE] = [0,1,1,0]
+        grid.stats[:,grid.STAT.SHAPE] = [0,1,0,0]
+        grid.place_pieces([0,1,2,3],[0,2,5,5],[0,2,5,0])
+        self.assertEqual( grid.get_nearest_enemy(0)[0], 1 )
+        self.assertTrue( grid.move_piece(1,1,1) )
+
+        grid.enable_zobrist(['HP'])
+        grid.snapshot()
+        token = grid.checkpoint()
+        grid.set_stats([0,1],grid.STAT.HP,[300,-5])
+        grid.set_stats(2,grid.STAT.ALIVE,False)
+        self.assertEqual( grid.get_nearest_enemy(0)[0], 1 )
+        grid.rollback(token)
+        np.testing.assert_array_equal( grid.stats[:,grid.STAT.HP], [0,0,0,0] )
+        self.assertTrue( grid.stats[2,grid.STAT.ALIVE] )
+
+        hashed = grid.zobrist
+        grid.set_stats(3,grid.STAT.HP,12)
+        grid.restore()
+        self.assertEqual( grid.stats[3,grid.STAT.HP], 0 )
+        self.assertEqual( grid.zobrist, hashed )
+
+        with tempfile.TemporaryDirectory() as path:
+            grid.save(path)
+            reopened = SquarePieceGrid2D.open(path,self.shape_manager)
+            self.assertEqual( reopened.stats.dtypes, grid.stats.dtypes )
+            np.testing.assert_array_equal( reopened.stats.to_array(), grid.stats.to_array() )
+            self.assertIsInstance( reopened.stats.columns[0], np.memmap )
+            del reopened
+
+    def test_unit_allocator(self):
+
+        with self.assertRaises(Exception):
+            self.grid.allocate()
+
+        self.grid.remove_piece(4)
+        self.grid.enable_unit_allocator()
+        self.assertEqual( self.grid.allocate(), 4 ) # pieces still on the Board keep their IDs
+        with self.assertRaises(Exception):
+            self.grid.allocate()
+
+        self.grid.release([1,3])
+        self.assertEqual( self.grid.board[0,0], -1 )
+        np.testing.assert_array_equal( self.grid.loc[[1,3]], [[-1,-1],[-1,-1]] )
+        self.assertEqual( self.grid.stats[1,self.grid.STAT.SIDE], 1 ) # Stats rows are kept for reuse
+        with self.assertRaises(Exception):
+            self.grid.release(1)
+        np.testing.assert_array_equal( self.grid.allocate_many(2), [1,3] )
+
+    def test_compact_rows_and_cols(self):
+
+        grid = SquarePieceGrid2D(4,5,6,self.shape_manager,['ALIVE','SIDE','SHAPE'])
+        grid.stats[:,grid.STAT.SHAPE] = [0,0,0,1,0,0]
+        grid.place_pieces([0,1,2,3,4],[0,1,2,3,4],[0,1,3,0,2])
+        grid.enable_zobrist()
+        grid.snapshot()
+
+        removed = grid.compact_rows([2,4],direction='down')
+        np.testing.assert_array_equal( removed, [2,3,4] ) # piece #3 crossed row 4
+        np.testing.assert_array_equal( grid.board, [
+            [-1,-1,-1,-1],
+            [-1,-1,-1,-1],
+            [ 0,-1,-1,-1],
+            [-1, 1,-1,-1],
+            [-1,-1,-1,-1],
+        ])
+        np.testing.assert_array_equal( grid.loc[:5], [[2,0],[3,1],[-1,-1],[-1,-1],[-1,-1]] )
+        hashed = grid.zobrist
+        grid.rebuild_zobrist()
+        self.assertEqual( grid.zobrist, hashed )
+
+        grid.restore()
+        removed = grid.compact_cols([1],direction='left')
+        np.testing.assert_array_equal( removed, [1,3] )
+        self.assertEqual( grid.board[2,2], 2 )
+        self.assertEqual( grid.board[4,1], 4 )
+        np.testing.assert_array_equal( grid.loc[[0,2,4]], [[0,0],[2,2],[4,1]] )
+        np.testing.assert_array_equal( grid.compact_rows([]), [] )
+        with self.assertRaises(Exception):
+            grid.compact_rows([0],direction='left')
+        with self.assertRaises(Exception):
+            grid.compact_rows([5])
+
+    def test_rebuilds_use_the_anchors_of_multi_square_pieces(self):
+
+        shape_manager = SquareShapeManager([ np.ones((1,1),dtype=bool), np.ones((2,2),dtype=bool), np.array([[0,1],[0,1],[1,1]],dtype=bool) ])
+        grid = SquarePieceGrid2D(6,6,4,shape_manager,['ALIVE','SIDE','SHAPE'])
+        grid.stats[:,grid.STAT.SHAPE] = [1,2,0,2]
+        grid.place_pieces([0,1,2,3],[0,2,5,0],[0,3,5,3])
+        loc = grid.loc.copy()
+        board = grid.board.copy()
+
+        grid.loc[:] = -1
+        grid.rebuild_loc_from_board()
+        np.testing.assert_array_equal( grid.loc, loc )
+
+        grid.board[:] = -1
+        grid.rebuild_board_from_loc()
+        np.testing.assert_array_equal( grid.board, board )
+
+    def test_sync_updates_only_dirty_pieces(self):
+
+        grid = SquarePieceGrid2D(6,6,4,self.shape_manager,['ALIVE','SIDE','SHAPE'])
+        grid.stats[:,grid.STAT.SHAPE] = [1,0,0,2]
+        grid.place_pieces([0,1,2,3],[0,5,5,2],[0,0,5,3])
+        self.assertEqual( grid.sync().shape[0], 0 )
+        grid.enable_zobrist()
+
+        # move piece #0 one square right, and erase piece #2, by editing the Board by hand
+        grid.mark_dirty(5,5)
+        grid.board[0:2,0] = -1
+        grid.board[0:2,2] = 0
+        grid.board[5,5] = -1
+        grid.mark_dirty([0,1,0,1],[0,0,2,2])
+        grid.loc[1] = [4,4] # a stale Loc that isn't marked dirty is left alone
+        np.testing.assert_array_equal( grid.sync(), [0,2] )
+        np.testing.assert_array_equal( grid.loc, [[0,1],[4,4],[-1,-1],[2,3]] )
+        hashed = grid.zobrist
+        grid.rebuild_zobrist()
+        self.assertEqual( grid.zobrist, hashed )
+
+        # overwriting a multi-square piece: pass its ID along with the squares written
+        grid.board[3,3] = 1
+        grid.board[2:5,3:6][grid.board[2:5,3:6]==3] = -1
+        grid.mark_dirty(3,3,unit_ids=[3])
+        np.testing.assert_array_equal( grid.sync(), [1,3] )
+        np.testing.assert_array_equal( grid.loc[[1,3]], [[3,3],[-1,-1]] )
+
+    def test_field_of_view(self):
+
+        grid = SquarePieceGrid2D(7,7,4,self.shape_manager,['ALIVE','SIDE','SHAPE','OPAQUE'])
+        grid.place_pieces([0,1,2],[3,3,3],[0,2,5])
+        grid.set_stats(1,grid.STAT.OPAQUE,1) # piece #1 is a wall
+        with self.assertRaises(Exception):
+            grid.visible_squares(0)
+        with self.assertRaises(Exception):
+            grid.enable_fov(4,blocking_stats=['WALL'])
+        grid.enable_fov(4,blocking_stats=['OPAQUE'])
+
+        visible = grid.visible_squares(0)
+        self.assertEqual( visible.shape, (7,7) )
+        self.assertTrue( visible[3,2] )         # the wall itself is visible
+        self.assertFalse( visible[3,3] )        # but whatever is behind it isn't
+        self.assertFalse( visible[3,5] )        # and nothing beyond the radius is
+        self.assertTrue( visible[3,1] and visible[1,1] )
+        self.assertEqual( len(grid.fov), 1 )
+
+        # sight is symmetric
+        viewer = grid.visible_squares(2)
+        self.assertFalse( viewer[3,0] )
+        np.testing.assert_array_equal( grid.visible_from([0,2,3]), visible|viewer )
+
+        # moving a piece that doesn't block sight keeps every cached result
+        grid.move_piece(2,1,0)
+        self.assertEqual( len(grid.fov), 2 )
+        # but moving the wall throws away the results within the radius of it
+        grid.move_piece(1,-2,0)
+        self.assertEqual( len(grid.fov), 0 )
+        self.assertTrue( grid.visible_squares(0)[3,3] )
+
+        # as does changing a blocking stat of a piece within the radius
+        grid.set_stats(2,grid.STAT.OPAQUE,1)
+        self.assertEqual( len(grid.fov), 1 )
+        grid.set_stats(1,grid.STAT.OPAQUE,0)
+        self.assertEqual( len(grid.fov), 0 )
+
+    def test_influence_maps(self):
+
+        with self.assertRaises(Exception):
+            self.grid.enable_influence(weight_stat='DMG')
+        self.grid.enable_influence(decay=0.5,radius=4)
+
+        influence = self.grid.influence_maps()
+        self.assertEqual( influence.shape, (2,5,5) )
+        self.assertEqual( self.grid.get_influence(1,0,0), 1+0.5**4 )   # piece #1, and piece #2 four squares away
+        self.assertEqual( self.grid.get_influence(5,0,0), 0 )
+        self.assertEqual( self.grid.get_threat(0), 0.5**4+0.5**2 )     # pieces #1 & #2 are four & two squares away
+        self.assertEqual( self.grid.distance_maps()[0,0,0], 4 )
+        self.assertIs( self.grid.influence_maps(), influence )
+
+        # pieces moving or dying within a tick don't recompute the maps
+        self.grid.set_stats(2,self.grid.STAT.ALIVE,0)
+        self.grid.move_piece(1,1,0)
+        self.grid.step_closer(0,3)
+        self.assertIs( self.grid.influence_maps(), influence )
+        self.assertEqual( self.grid.get_influence(1,0,0), 1+0.5**4 )
+
+        # until the next tick
+        self.grid.refresh_influence()
+        self.assertEqual( self.grid.get_influence(1,0,0), 0.5 )
+        self.assertIsNot( self.grid.influence_maps(), influence )
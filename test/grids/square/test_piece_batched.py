@@ -0,0 +1,149 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.piece import SquarePieceGrid2D
+from src.meshgrid.grids.square.piece_batched import BatchedSquarePieceGrid2D
+from src.meshgrid.shape.square import SquareShapeManager
+
+class TestBatchedSquarePieceGrid2D(unittest.TestCase):
+
+    def setUp(self):
+
+        self.shape_manager = SquareShapeManager([
+            np.ones((1,1),dtype=bool), # this first shape must be 1x1
+            np.ones((2,2),dtype=bool),
+            np.ones((3,3),dtype=bool),
+        ])
+        self.n_envs = 4
+        self.max_units = 12
+
+        self.grid = BatchedSquarePieceGrid2D(n_envs=self.n_envs,grid_width=8,grid_height=6,max_units=self.max_units,
+                                             shape_manager=self.shape_manager,stats_list=['ALIVE','SIDE','SHAPE'])
+        self.singles = [ SquarePieceGrid2D(grid_width=8,grid_height=6,max_units=self.max_units,
+                                           shape_manager=self.shape_manager,stats_list=['ALIVE','SIDE','SHAPE'])
+                         for _ in range(self.n_envs) ]
+        for env_id,single in enumerate(self.singles):
+            stats = np.stack([ np.random.randint(0,2,self.max_units),
+                               np.random.randint(0,2,self.max_units),
+                               np.random.randint(0,2,self.max_units) ],axis=1)
+            self.grid.stats[env_id] = stats
+            single.stats[:] = stats
+
+    def _assert_matches_singles(self):
+
+        for env_id,single in enumerate(self.singles):
+            np.testing.assert_array_equal( self.grid.board[env_id], single.board )
+            np.testing.assert_array_equal( self.grid.loc[env_id], single.loc )
+
+    def _random_batch(self,size):
+
+        pairs = np.random.permutation(self.n_envs*self.max_units)[:size]
+        return pairs//self.max_units, pairs%self.max_units
+
+    def test_batched_operations_match_independent_grids(self,trials=30):
+
+        for _ in range(trials):
+            env_ids,unit_ids = self._random_batch(20)
+            i,j = np.random.randint(-1,7,20), np.random.randint(-1,9,20)
+            placed = self.grid.place_pieces(env_ids,unit_ids,i,j)
+            for env_id,single in enumerate(self.singles):
+                mine = (env_ids==env_id)
+                np.testing.assert_array_equal( placed[mine], single.place_pieces(unit_ids[mine],i[mine],j[mine]) )
+            self._assert_matches_singles()
+
+            env_ids,unit_ids = self._random_batch(30)
+            di,dj = np.random.randint(-1,2,30), np.random.randint(-1,2,30)
+            moved = self.grid.move_pieces(env_ids,unit_ids,di,dj)
+            for env_id,single in enumerate(self.singles):
+                mine = (env_ids==env_id)
+                np.testing.assert_array_equal( moved[mine], single.move_pieces(unit_ids[mine],di[mine],dj[mine]) )
+            self._assert_matches_singles()
+
+            env_ids,unit_ids = self._random_batch(5)
+            removed = self.grid.remove_pieces(env_ids,unit_ids)
+            for env_id,single in enumerate(self.singles):
+                mine = (env_ids==env_id)
+                np.testing.assert_array_equal( removed[mine], single.remove_pieces(unit_ids[mine]) )
+            self._assert_matches_singles()
+
+    def test_nearest_matches_independent_grids(self):
+
+        self.grid.stats[:,:,self.grid.STAT.SHAPE] = 0
+        for env_id,single in enumerate(self.singles):
+            single.stats[:,single.STAT.SHAPE] = 0
+            single.place_pieces_randomly(mode='anchors')
+            self.grid.loc[env_id] = single.loc
+            self.grid.board[env_id] = single.board
+
+        env_ids,unit_ids = np.repeat(np.arange(self.n_envs),self.max_units), np.tile(np.arange(self.max_units),self.n_envs)
+        for allies in [True,False]:
+            ids,dists = self.grid._get_nearest_by_side(env_ids,unit_ids,allies=allies,chunk_size=7)
+            for env_id,single in enumerate(self.singles):
+                mine = (env_ids==env_id)
+                expected = single._get_nearest_by_side(unit_ids[mine],allies=allies)
+                np.testing.assert_array_equal( ids[mine], expected[0] )
+                np.testing.assert_array_equal( dists[mine], expected[1] )
+
+    def test_reject_is_per_environment(self):
+
+        self.grid.stats[:,:,self.grid.STAT.SHAPE] = 0
+        self.grid.place_pieces([0,0,1,1],[0,1,0,1],[0,0,0,0],[0,1,0,1])
+        moved = self.grid.move_pieces([0,0,1,1],[0,1,0,1],[0,0,0,0],[1,1,1,-5],conflict='reject')
+        np.testing.assert_array_equal( moved, [True,True,False,False] )
+        np.testing.assert_array_equal( self.grid.loc[0,:2], [[0,1],[0,2]] )
+        np.testing.assert_array_equal( self.grid.loc[1,:2], [[0,0],[0,1]] )
+
+    def test_piece_can_be_placed_here(self):
+
+        self.grid.stats[:,:,self.grid.STAT.SHAPE] = 1
+        self.grid.place_pieces(0,0,2,2)
+        np.testing.assert_array_equal( self.grid.piece_can_be_placed_here([0,0,0,1,0],[1,1,0,1,1],[1,4,1,1,5],[1,4,1,1,1]),
+                                       [False,True,True,True,False] )
+
+    def test_env_grid_views_one_environment(self):
+
+        single = self.grid.env_grid(2)
+        self.assertTrue( single.place_piece(3,1,1) )
+        np.testing.assert_array_equal( self.grid.loc[2,3], [1,1] )
+        self.assertEqual( self.grid.board[2,1,1], 3 )
+        self.assertTrue( (self.grid.board[[0,1,3]]==-1).all() )
+        for name in ('board','loc','stats'):
+            self.assertTrue( np.shares_memory(getattr(single,name),getattr(self.grid,name)) )
+
+    def test_auto_reset(self):
+
+        resets = []
+        def on_reset(grid,env_ids):
+            resets.append(list(env_ids))
+            grid.stats[env_ids,:,grid.STAT.ALIVE] = 1
+
+        self.grid.on_reset = on_reset
+        self.grid.place_pieces(np.arange(self.n_envs),0,0,0)
+        np.testing.assert_array_equal( self.grid.auto_reset(), [] )
+        self.grid.done[[1,3]] = True
+        np.testing.assert_array_equal( self.grid.auto_reset(), [1,3] )
+        self.assertEqual( resets, [[1,3]] )
+        self.assertFalse( self.grid.done.any() )
+        np.testing.assert_array_equal( self.grid.loc[:,0,0], [0,-1,0,-1] )
+        self.assertTrue( (self.grid.board[[1,3]]==-1).all() )
+        self.assertTrue( (self.grid.stats[[1,3],:,self.grid.STAT.ALIVE]==1).all() )
+
+    def test_stats_with_per_stat_dtypes(self):
+
+        grid = BatchedSquarePieceGrid2D(3,5,5,4,self.shape_manager,[('ALIVE',np.bool_),'SIDE','SHAPE',('HP',np.float32)])
+        self.assertEqual( grid.stats.dtypes, [np.dtype(np.bool_),np.dtype(np.int32),np.dtype(np.int32),np.dtype(np.float32)] )
+        grid.stats[0,[0,1],grid.STAT.ALIVE] = True
+        grid.stats[:,:,grid.STAT.SIDE] = [0,1,0,1]
+        grid.stats[1,2,grid.STAT.HP] = 2.5
+        np.testing.assert_array_equal( grid.place_pieces([0,0,1],[0,1,2],[0,4,2],[0,4,2]), [True,True,True] )
+        ids,dists = grid.get_nearest_enemies([0,0],[0,1])
+        np.testing.assert_array_equal( ids, [1,0] )
+
+        # env_grid() views the typed columns, too
+        single = grid.env_grid(1)
+        self.assertEqual( single.stats[2,single.STAT.HP], 2.5 )
+        single.set_stats(2,single.STAT.HP,4.5)
+        self.assertEqual( grid.stats[1,2,grid.STAT.HP], 4.5 )
+
+        grid.reset([1])
+        self.assertEqual( grid.stats[1,2,grid.STAT.HP], 0 )
+        self.assertEqual( grid.stats[0,0,grid.STAT.ALIVE], True )
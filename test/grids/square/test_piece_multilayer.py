@@ -1,8 +1,10 @@
 import enum
+import tempfile
 import unittest
 import numpy as np
 from src.meshgrid.shape.square import SquareShapeManager
 from src.meshgrid.grids.square.piece_multilayer import SquareMultilayerPieceGrid2D
+from src.meshgrid.grids.square.piece import SquarePieceGrid2D
 
 class TestSquareMultilayerPieceGrid2D(unittest.TestCase):
 
@@ -59,6 +61,167 @@ class TestSquareMultilayerPieceGrid2D(unittest.TestCase):
         
         self.assertEqual( self.grid.get_nearest_ally(0), (3,3.0) )
 
+    def test_batched_nearest_matches_single_unit_queries(self,trials=50):
+
+        for _ in range(trials):
+            self.grid.stats[:,self.grid.STAT.ALIVE] = np.random.randint(0,2,self.grid.max_units)
+            self.grid.stats[:,self.grid.STAT.SIDE] = np.random.randint(0,2,self.grid.max_units)
+            self.grid.loc = np.random.randint(0,2,(self.grid.max_units,3))*[2,2,1]
+
+            unit_ids = np.arange(self.grid.max_units)
+            for ignore_layer in [False,True]:
+                enemy_ids,enemy_dists = self.grid.get_nearest_enemies(unit_ids,ignore_layer=ignore_layer)
+                ally_ids,ally_dists = self.grid.get_nearest_allies(unit_ids,ignore_layer=ignore_layer)
+                for unit_id in unit_ids:
+                    self.assertEqual( self.grid.get_nearest_enemy(unit_id,ignore_layer=ignore_layer), (enemy_ids[unit_id],enemy_dists[unit_id]) )
+                    self.assertEqual( self.grid.get_nearest_ally(unit_id,ignore_layer=ignore_layer), (ally_ids[unit_id],ally_dists[unit_id]) )
+                    if not ignore_layer and enemy_ids[unit_id]!=-1:
+                        self.assertEqual( self.grid.loc[enemy_ids[unit_id],2], self.grid.loc[unit_id,2] )
+
+    def test_spatial_index_matches_brute_force(self):
+
+        big_grid = SquareMultilayerPieceGrid2D(grid_width=30,grid_height=20,max_units=40,shape_manager=self.shape_manager,
+                                               stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        big_grid.stats[:,big_grid.STAT.ALIVE] = 1
+        big_grid.stats[:,big_grid.STAT.SIDE] = np.arange(40)%3
+        big_grid.place_pieces_randomly(layer=0)
+        for unit_id in range(0,40,4):
+            big_grid.remove_piece(unit_id)
+            big_grid.place_piece(unit_id,unit_id//2,unit_id//4,layer=1)
+
+        for ignore_layer in [False,True]:
+            expected = big_grid.get_nearest_enemies(np.arange(40),ignore_layer=ignore_layer)
+            big_grid.enable_spatial_index(bucket_size=3)
+            result = big_grid.get_nearest_enemies(np.arange(40),ignore_layer=ignore_layer)
+            big_grid.disable_spatial_index()
+            np.testing.assert_array_equal( expected[0], result[0] )
+            np.testing.assert_array_equal( expected[1], result[1] )
+
+        expected = big_grid.get_units_within_dist(10,10,6,layer=1)
+        big_grid.enable_spatial_index(bucket_size=3)
+        np.testing.assert_array_equal( expected, big_grid.get_units_within_dist(10,10,6,layer=1) )
+
+    def test_batched_place_move_and_remove(self):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=6,grid_height=6,max_units=4,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.stats[:,grid.STAT.SHAPE] = [1,1,0,0]
+
+        # units 0 & 1 overlap on layer 0 (lowest ID wins), unit 3 uses the other layer
+        np.testing.assert_array_equal( grid.place_pieces([1,0,2,3],[1,0,5,1],[1,0,5,1],layer=[0,0,0,1]), [False,True,True,True] )
+        self.assertEqual( grid.board[1,1,0], 0 )
+        self.assertEqual( grid.board[1,1,1], 3 )
+
+        # pieces move within their own layer
+        np.testing.assert_array_equal( grid.move_pieces([0,3],1,1), [True,True] )
+        np.testing.assert_array_equal( grid.loc[[0,3]], [[1,1,0],[2,2,1]] )
+        self.assertEqual( np.sum(grid.board[:,:,0]==0), 4 )
+        np.testing.assert_array_equal( grid.move_pieces([0],3,3), [False] )
+
+        np.testing.assert_array_equal( grid.remove_pieces([0,1,3]), [True,False,True] )
+        self.assertEqual( np.sum(grid.board!=-1), 1 )
+
+    def test_valid_anchor_map_per_layer(self):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=4,grid_height=3,max_units=2,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.stats[:,grid.STAT.SHAPE] = 1
+        grid.place_piece(0,0,0,layer=1)
+        np.testing.assert_array_equal( grid.valid_anchor_map(1,layer=0), [[1,1,1,0],[1,1,1,0],[0,0,0,0]] )
+        np.testing.assert_array_equal( grid.cached_valid_anchor_map(1,layer=1), [[0,0,1,0],[0,0,1,0],[0,0,0,0]] )
+        np.testing.assert_array_equal( grid.valid_anchor_map(1,layer=1,unit_id=0), [[1,1,1,0],[1,1,1,0],[0,0,0,0]] )
+        grid.move_piece(0,1,0)
+        np.testing.assert_array_equal( grid.cached_valid_anchor_map(1,layer=1), [[0,0,1,0],[0,0,1,0],[0,0,0,0]] )
+        grid.move_piece(0,0,1)
+        np.testing.assert_array_equal( grid.cached_valid_anchor_map(1,layer=1), np.zeros((3,4)) )
+
+    def test_place_pieces_randomly_from_anchors_fills_one_layer(self):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=4,grid_height=3,max_units=12,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.place_pieces_randomly(layer=1,mode='anchors')
+        np.testing.assert_array_equal( np.sort(grid.board[:,:,1].ravel()), np.arange(12) )
+        self.assertTrue( (grid.board[:,:,0]==-1).all() )
+        self.assertTrue( (grid.loc[:,2]==1).all() )
+        with self.assertRaises(Exception):
+            grid.place_pieces_randomly(layer=0,mode='bogus')
+
+    def test_step_along_field_paths_around_walls(self):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=7,grid_height=5,max_units=6,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.stats[:,grid.STAT.ALIVE] = 1
+        grid.stats[:,grid.STAT.SIDE] = [0,1,2,2,2,2]
+        grid.place_pieces([0,1,2,3,4],[2,2,1,2,3],[0,6,3,3,3],layer=1) # units 2-4 are a wall between 0 & 1
+        grid.place_piece(5,0,3,layer=0)                                  # walls on other layers don't block
+        self.assertEqual( grid.distance_field(0,layer=1,target_side=1,mover_side=0)[2,0], 9 )
+        self.assertTrue( (grid.distance_field(0,layer=0,target_side=1,mover_side=0)==-1).all() )
+        for _ in range(9):
+            self.assertTrue( grid.step_along_field([0],target_id=1)[0] )
+        self.assertEqual( grid.get_dist(0,1), 1 )
+        self.assertEqual( grid.loc[0,2], 1 )
+
+    def test_checkpoint_and_rollback(self,test_steps=50):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=4,grid_height=3,max_units=4,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.place_pieces([0,1,2],[0,1,2],[0,1,2],layer=[0,1,1])
+        original = (grid.board.copy(),grid.loc.copy(),grid.stats.copy())
+        token = grid.checkpoint()
+        for _ in range(test_steps):
+            unit_id = np.random.randint(4)
+            grid.move_piece(unit_id,*np.random.randint(-1,2,2),layer=grid.loc[unit_id,2])
+            if np.random.rand()<.2:
+                grid.remove_piece(unit_id)
+                grid.set_stats(unit_id,grid.STAT.SHAPE,np.random.randint(2))
+                grid.place_piece(unit_id,*np.random.randint(0,3,2),layer=np.random.randint(2))
+        grid.rollback(token)
+        for array,expected in zip((grid.board,grid.loc,grid.stats),original):
+            np.testing.assert_array_equal( array, expected )
+
+        grid.snapshot()
+        grid.move_pieces([0,1],1,0)
+        grid.restore()
+        for array,expected in zip((grid.board,grid.loc,grid.stats),original):
+            np.testing.assert_array_equal( array, expected )
+
+    def test_zobrist_hash_is_maintained_incrementally(self,test_steps=100):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=4,grid_height=3,max_units=4,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.enable_zobrist(stats_list=['ALIVE'])
+        grid.place_pieces([0,1],[0,0],[0,0],layer=[0,1])
+        layer_0_hash = grid.zobrist
+        grid.move_piece(0,0,0,layer=0) # a no-op move
+        self.assertEqual( grid.zobrist, layer_0_hash )
+        for _ in range(test_steps):
+            unit_id = np.random.randint(4)
+            grid.move_piece(unit_id,*np.random.randint(-1,2,2),layer=grid.loc[unit_id,2])
+            if np.random.rand()<.2:
+                grid.remove_piece(unit_id)
+                grid.set_stats(unit_id,grid.STAT.ALIVE,np.random.randint(2))
+                grid.place_piece(unit_id,*np.random.randint(0,3,2),layer=np.random.randint(2))
+        grid.set_stats(np.array([1,1]),grid.STAT.ALIVE,[5,6]) # repeated unit IDs are hashed once
+        incremental = grid.zobrist
+        grid.rebuild_zobrist()
+        self.assertEqual( grid.zobrist, incremental )
+
+    def test_chunked_board_backend(self):
+
+        grid = SquareMultilayerPieceGrid2D(grid_width=40,grid_height=30,max_units=3,shape_manager=self.shape_manager,
+                                           stats_list=['ALIVE','SIDE','SHAPE'],layers=2,board_backend='chunked',chunk_size=8)
+        grid.stats[:,grid.STAT.SHAPE] = [0,1,2]
+        grid.place_pieces([0,1,2],[0,10,27],[0,10,37],layer=[0,1,1])
+        self.assertTrue( grid.move_piece(1,4,4) )                    # now at (14,14), inside one chunk
+        self.assertFalse( grid.piece_can_be_placed_here(0,15,15,layer=1) )
+        self.assertTrue( grid.piece_can_be_placed_here(0,15,15,layer=0) )
+        self.assertEqual( grid.board.chunk_count(), 3 )
+        self.assertTrue( grid.move_piece(0,8,0) )                    # (0,0) -> (8,0) frees the first chunk
+        self.assertEqual( grid.board.chunk_count(), 3 )
+        grid.rebuild_loc_from_board()
+        np.testing.assert_array_equal( grid.loc[0], [8,0,0] )
+        self.assertEqual( grid.board[15,15,1], 1 )
+
     def test_move_piece(self,test_steps=1_000,empty_square=-1):
         '''Move unit_id=0 around the board randomly.'''
 
@@ -177,4 +340,134 @@ class TestSquareMultilayerPieceGrid2D(unittest.TestCase):
                 i,j,layer = self.grid.loc[unit_id]
                 self.assertEqual( self.grid.board[i,j,layer], unit_id )
             for i,j,layer in empty_squares:
-                self.assertEqual( self.grid.board[i,j,layer], empty_square )
\ No newline at end of file
+                self.assertEqual( self.grid.board[i,j,layer], empty_square )
+    def test_save_and_open_memory_maps_the_grid(self):
+
+        grid = SquareMultilayerPieceGrid2D(8,6,4,self.shape_manager,['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.stats[:,grid.STAT.SHAPE] = [0,1,2,0]
+        grid.place_pieces([0,1,2],[0,3,0],[0,0,4],layer=[1,0,1])
+        with tempfile.TemporaryDirectory() as path:
+            grid.save(path)
+            with self.assertRaises(Exception):
+                SquarePieceGrid2D.open(path,self.shape_manager)
+
+            copy = SquareMultilayerPieceGrid2D.open(path,self.shape_manager,mode='c')
+            self.assertEqual( copy.layers, 2 )
+            np.testing.assert_array_equal( copy.board, grid.board )
+            np.testing.assert_array_equal( copy.loc, grid.loc )
+            self.assertTrue( copy.move_piece(0,1,0,layer=1) ) # copy-on-write changes stay in memory
+            reopened = SquareMultilayerPieceGrid2D.open(path,self.shape_manager)
+            np.testing.assert_array_equal( reopened.loc[0], [0,0,1] )
+            del copy, reopened
+
+    def test_stats_with_per_stat_dtypes(self):
+
+        grid = SquareMultilayerPieceGrid2D(5,5,3,self.shape_manager,[('ALIVE',np.bool_),'SIDE',('SHAPE',np.uint8)],layers=2)
+        self.assertEqual( grid.stats.dtypes, [np.dtype(np.bool_),np.dtype(np.int32),np.dtype(np.uint8)] )
+        grid.stats[:,grid.STAT.ALIVE] = True
+        grid.stats[:,grid.STAT.SIDE] = [0,1,0]
+        grid.stats[:,grid.STAT.SHAPE] = [1,0,0]
+        grid.place_pieces([0,1,2],[0,4,4],[0,4,0],layer=[0,1,0])
+        self.assertEqual( grid.get_nearest_enemy(0,ignore_layer=True)[0], 1 )
+        grid.snapshot()
+        grid.remove_piece(0)
+        grid.stats[0,grid.STAT.ALIVE] = False
+        grid.restore()
+        self.assertTrue( grid.stats[0,grid.STAT.ALIVE] )
+        self.assertEqual( grid.board[1,1,0], 0 )
+
+    def test_unit_allocator(self):
+
+        self.grid.remove_pieces([2,3])
+        self.grid.enable_unit_allocator(reserved=[3])
+        new_id = self.grid.allocate()
+        self.assertEqual( new_id, 2 )
+        self.assertTrue( self.grid.place_piece(new_id,0,4,layer=0) )
+        self.grid.release(new_id)
+        self.assertEqual( self.grid.board[0,4,0], -1 )
+        self.assertEqual( self.grid.allocate(), 2 )
+
+    def test_compact_rows_and_cols(self):
+
+        token = self.grid.checkpoint()
+        removed = self.grid.compact_rows([1,3],direction='up')
+        np.testing.assert_array_equal( removed, [2] )
+        np.testing.assert_array_equal( self.grid.loc, [[1,2,0],[0,0,0],[-1,-1,-1],[2,1,0],[2,4,0]] )
+        np.testing.assert_array_equal( self.grid.board[3:,:,0], -1 )
+        for unit_id in (0,1,3,4):
+            self.assertEqual( self.grid.board[tuple(self.grid.loc[unit_id])], unit_id )
+        self.grid.rollback(token)
+        self.assertEqual( self.grid.board[1,3,0], 2 )
+
+        removed = self.grid.compact_cols([4,0],direction='right')
+        np.testing.assert_array_equal( removed, [1,4] )
+        np.testing.assert_array_equal( self.grid.loc[[0,2,3]], [[2,3,0],[1,4,0],[4,2,0]] )
+
+    def test_rebuild_and_sync_with_multi_square_pieces(self):
+
+        grid = SquareMultilayerPieceGrid2D(6,6,3,self.shape_manager,['ALIVE','SIDE','SHAPE'],layers=2)
+        grid.stats[:,grid.STAT.SHAPE] = [2,1,0]
+        grid.place_pieces([0,1,2],[1,4,0],[1,4,5],layer=[1,0,1])
+        loc = grid.loc.copy()
+        grid.loc[:] = -1
+        grid.rebuild_loc_from_board()
+        np.testing.assert_array_equal( grid.loc, loc )
+
+        grid.board[4:6,4:6,0] = -1
+        grid.board[0:2,0:2,0] = 1
+        grid.mark_dirty([0,0,1,1],[0,1,0,1],0,unit_ids=[1])
+        np.testing.assert_array_equal( grid.sync(), [1] )
+        np.testing.assert_array_equal( grid.loc, [[1,1,1],[0,0,0],[0,5,1]] )
+
+        board = grid.board.copy()
+        grid.board[:] = -1
+        grid.rebuild_board_from_loc()
+        np.testing.assert_array_equal( grid.board, board )
+
+    def test_field_of_view_with_blocking_layers(self):
+
+        for board_backend in ('dense','chunked'):
+            grid = SquareMultilayerPieceGrid2D(7,7,4,self.shape_manager,['ALIVE','SIDE','SHAPE'],layers=2,
+                                               board_backend=board_backend,chunk_size=4)
+            grid.stats[:,grid.STAT.SHAPE] = 0
+            # piece #1 is a wall on layer 0, and piece #2 is an item on layer 1
+            grid.place_pieces([0,1,2],[3,3,5],[0,2,1],layer=[1,0,1])
+            grid.enable_fov(4,blocking_layers=[0])
+
+            visible = grid.visible_squares(0)
+            self.assertTrue( visible[3,2] )
+            self.assertFalse( visible[3,3] )
+            self.assertTrue( visible[5,1] )
+
+            # pieces on layers that don't block sight never throw away cached results
+            grid.move_piece(2,0,1)
+            self.assertEqual( len(grid.fov), 1 )
+            grid.remove_piece(1)
+            self.assertEqual( len(grid.fov), 0 )
+            self.assertTrue( grid.visible_squares(0)[3,3] )
+            np.testing.assert_array_equal( grid.visible_from([0,1]), grid.visible_squares(0) )
+
+            with self.assertRaises(Exception):
+                grid.enable_fov(4,blocking_layers=[2])
+
+    def test_influence_maps(self):
+
+        grid = SquareMultilayerPieceGrid2D(5,5,3,self.shape_manager,['ALIVE','SIDE','SHAPE','DMG'],layers=2)
+        grid.stats[:,grid.STAT.ALIVE] = 1
+        grid.stats[:,grid.STAT.SIDE] = [0,1,1]
+        grid.stats[:,grid.STAT.DMG] = [1,2,4]
+        grid.place_pieces([0,1,2],[0,4,4],[0,4,4],layer=[0,0,1])
+        grid.enable_influence(weight_stat='DMG',decay=0.5,radius=2)
+
+        self.assertEqual( grid.get_influence(1,4,4), 6 )
+        self.assertEqual( grid.get_influence(1,3,3), 6*0.5**2 )
+        self.assertEqual( grid.get_threat(1), 0 )
+        self.assertEqual( grid.get_threat(0), 0 )
+        np.testing.assert_array_equal( grid.distance_maps()[:,2,2], [4,4] )
+        grid.remove_piece(0)
+        with self.assertRaises(Exception):
+            grid.get_threat(0)
+        self.assertEqual( grid.distance_maps()[0,2,2], 4 ) # still the snapshot from the start of the tick
+        grid.refresh_influence()
+        self.assertEqual( grid.distance_maps().shape, (2,5,5) )
+        np.testing.assert_array_equal( grid.distance_maps()[0], -1 )
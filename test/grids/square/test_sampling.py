@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.sampling import sample_without_replacement, random_grid_locs, AnchorSampler
+from src.meshgrid.shape.square import SquareShapeManager
+
+class TestSampling(unittest.TestCase):
+
+    def setUp(self):
+
+        self.shape_manager = SquareShapeManager([
+            np.ones((1,1),dtype=bool), # this first shape must be 1x1
+            np.ones((2,2),dtype=bool),
+        ])
+
+    def test_sample_without_replacement(self):
+
+        for population,k in [(10,10),(10,3),(1_000_000,50),(5,0)]:
+            chosen = sample_without_replacement(population,k)
+            self.assertEqual( chosen.shape[0], k )
+            self.assertEqual( np.unique(chosen).shape[0], k )
+            self.assertTrue( ((chosen>=0) & (chosen<population)).all() )
+        with self.assertRaises(Exception):
+            sample_without_replacement(4,5)
+
+    def test_random_grid_locs(self):
+
+        locs = random_grid_locs(3,4,12)
+        self.assertEqual( sorted(map(tuple,locs.tolist())), [ (i,j) for i in range(3) for j in range(4) ] )
+
+    def test_anchor_sampler_skips_occupied_anchors(self):
+
+        anchors = np.ones((3,3),dtype=bool)
+        anchors[2,:] = anchors[:,2] = False # valid 2x2 anchors on a 3x3 board
+        sampler = AnchorSampler(self.shape_manager,1,anchors)
+        sampler.occupy(np.array([1]),np.array([1])) # every 2x2 anchor covers the center square
+        self.assertIsNone( sampler.sample() )
+
+        sampler = AnchorSampler(self.shape_manager,0,np.ones((2,2),dtype=bool))
+        seen = set()
+        for _ in range(4):
+            i,j = sampler.sample()
+            seen.add((i,j))
+            sampler.occupy(np.array([i]),np.array([j]))
+        self.assertEqual( seen, {(0,0),(0,1),(1,0),(1,1)} )
+        self.assertIsNone( sampler.sample() )
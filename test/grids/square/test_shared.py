@@ -0,0 +1,79 @@
+import unittest
+import multiprocessing
+import numpy as np
+from src.meshgrid.grids.square.piece import SquarePieceGrid2D
+from src.meshgrid.grids.square.piece_multilayer import SquareMultilayerPieceGrid2D
+from src.meshgrid.grids.square.shared import create_shared_grid, attach_shared_grid
+from src.meshgrid.shape.square import SquareShapeManager
+
+def _count_pieces_in_child(name,queue):
+
+    shape_manager = SquareShapeManager([np.ones((1,1),dtype=bool)])
+    grid,block = attach_shared_grid(SquarePieceGrid2D,name,shape_manager)
+    count = block.read(lambda arrays: int((arrays['board']!=-1).sum()))
+    queue.put( (count,grid.loc[1].tolist(),block.sequence) )
+    del grid
+    block.close()
+
+class TestSharedGridMemory(unittest.TestCase):
+
+    def setUp(self):
+
+        self.shape_manager = SquareShapeManager([
+            np.ones((1,1),dtype=bool), # this first shape must be 1x1
+            np.ones((2,2),dtype=bool),
+        ])
+        grid = SquarePieceGrid2D(6,5,3,self.shape_manager,['ALIVE','SIDE','SHAPE'])
+        grid.stats[:,grid.STAT.SHAPE] = [0,1,0]
+        grid.place_pieces([0,1,2],[0,2,4],[0,3,5])
+        self.grid,self.block = create_shared_grid(grid)
+
+    def tearDown(self):
+
+        del self.grid
+        self.block.close()
+        self.block.unlink()
+
+    def test_attached_grids_share_state(self):
+
+        other,other_block = attach_shared_grid(SquarePieceGrid2D,self.block.name,self.shape_manager)
+        np.testing.assert_array_equal( other.board, self.grid.board )
+        with self.block.writing():
+            self.assertTrue( self.grid.move_piece(1,-1,0) )
+        np.testing.assert_array_equal( other.loc[1], [1,3] )
+        self.assertEqual( other.board[1,3], 1 )
+        self.assertEqual( other_block.sequence, 2 )
+        with self.assertRaises(Exception):
+            other_block.unlink()
+        with self.assertRaises(Exception):
+            attach_shared_grid(SquareMultilayerPieceGrid2D,self.block.name,self.shape_manager)
+        del other
+        other_block.close()
+
+    def test_reads_retry_while_a_write_is_in_progress(self):
+
+        calls = []
+        def read_during_write(arrays):
+            calls.append(1)
+            if len(calls)==1: # simulate the writer updating the Board mid-read
+                with self.block.writing():
+                    arrays['board'][0,0] = -1
+            return arrays['board'][0,0]
+        self.assertEqual( self.block.read(read_during_write), -1 )
+        self.assertEqual( len(calls), 2 )
+
+        with self.block.writing():
+            with self.assertRaises(Exception):
+                self.block.read(lambda arrays: 0,retries=3,wait=0)
+
+    def test_another_process_can_attach_by_name(self):
+
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else multiprocessing.get_context()
+        queue = context.Queue()
+        process = context.Process(target=_count_pieces_in_child,args=(self.block.name,queue))
+        process.start()
+        count,loc,sequence = queue.get(timeout=30)
+        process.join(timeout=30)
+        self.assertEqual( count, 6 )
+        self.assertEqual( loc, [2,3] )
+        self.assertEqual( sequence, 0 )
@@ -0,0 +1,55 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.spatial import SquareSpatialIndex
+
+class TestSquareSpatialIndex(unittest.TestCase):
+
+    def setUp(self):
+
+        self.index = SquareSpatialIndex(grid_height=20,grid_width=30,bucket_size=4)
+        self.locs = { 0:(0,0,0), 1:(19,29,1), 2:(5,5,1), 3:(5,7,0), 4:(10,10,1) } # unit_id: (i,j,side)
+        for unit_id,(i,j,side) in self.locs.items():
+            self.index.update(unit_id,i,j,side)
+
+    def _brute_force_nearest(self,i,j,sides,exclude=None):
+
+        best = (1e10,-1)
+        for unit_id,(ui,uj,side) in self.locs.items():
+            if side in sides and unit_id!=exclude:
+                best = min(best,(abs(ui-i)+abs(uj-j),unit_id))
+        return best[1], best[0]
+
+    def test_nearest_matches_brute_force(self):
+
+        for i in range(-1,21):
+            for j in range(-1,31):
+                for sides in [[0],[1],[0,1]]:
+                    self.assertEqual( self.index.nearest(i,j,sides), self._brute_force_nearest(i,j,sides) )
+
+    def test_nearest_breaks_ties_with_smallest_unit_id(self):
+
+        self.index.update(5,4,6,0) # units 2, 3, & 5 are all 1 square away from (5,6)
+        self.assertEqual( self.index.nearest(5,6,[0,1]), (2,1) )
+        self.assertEqual( self.index.nearest(5,6,[0]), (3,1) )
+
+    def test_nearest_with_nothing_to_find(self):
+
+        self.assertEqual( self.index.nearest(3,3,[7]), (-1,1e10) )
+        self.assertEqual( self.index.nearest(5,7,[0],exclude=3,alive=np.array([0,1,1,1,1])), (-1,1e10) )
+
+    def test_update_and_remove(self):
+
+        self.index.update(2,19,0,1)
+        self.assertEqual( self.index.nearest(18,0,[1]), (2,1) )
+        self.index.remove(2)
+        self.index.remove(2) # removing twice is allowed
+        self.assertNotIn( 2, self.index )
+        self.assertEqual( len(self.index), 4 )
+        self.assertEqual( self.index.nearest(18,0,[1]), (4,18) )
+
+    def test_query_rect(self):
+
+        self.assertEqual( self.index.query_rect(0,0,10,10), [0,2,3,4] )
+        self.assertEqual( self.index.query_rect(0,0,10,10,keys=[1]), [2,4] )
+        self.assertEqual( self.index.query_rect(5,6,5,7), [3] )
+        self.assertEqual( self.index.query_rect(11,11,18,28), [] )
@@ -0,0 +1,57 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.stats import StatsTable, parse_stats_list, make_stats, stats_to_arrays, stats_from_arrays
+
+class TestStatsTable(unittest.TestCase):
+
+    def setUp(self):
+
+        self.stats_list = [('ALIVE',np.bool_),'SIDE',('HP',np.int16)]
+        self.stats = make_stats((6,),self.stats_list,np.int32)
+
+    def test_make_stats_only_builds_tables_when_dtypes_are_given(self):
+
+        plain = make_stats((6,),['ALIVE','SIDE'],np.int32)
+        self.assertIsInstance( plain, np.ndarray )
+        self.assertEqual( plain.shape, (6,2) )
+        self.assertIsInstance( self.stats, StatsTable )
+        self.assertEqual( self.stats.shape, (6,3) )
+        self.assertEqual( self.stats.dtypes, [np.dtype(np.bool_),np.dtype(np.int32),np.dtype(np.int16)] )
+        self.assertEqual( self.stats.nbytes, 6*(1+4+2) )
+        self.assertEqual( parse_stats_list(['A',['B','<i2']]), (['A','B'],[None,np.dtype(np.int16)]) )
+
+    def test_indexing_matches_a_plain_array(self):
+
+        dense = np.zeros((6,3),dtype=np.int32)
+        for stats in (self.stats,dense):
+            stats[:,0] = 1
+            stats[[1,3],0] = 0
+            stats[:,1] = np.arange(6)%2
+            stats[2:4,2] = 40
+            stats[4] = [1,1,7]
+            stats[...,2] += 1
+        np.testing.assert_array_equal( self.stats.to_array(), dense )
+        np.testing.assert_array_equal( self.stats[5], dense[5] )
+        np.testing.assert_array_equal( self.stats[[0,2],1:], dense[[0,2],1:] )
+        self.assertEqual( self.stats[4,2], 8 )
+        self.assertEqual( self.stats[:,0].dtype, np.bool_ )
+        self.assertEqual( self.stats.shape[0], len(self.stats) )
+
+        column = self.stats[:,2] # single stat slices are views, as in numpy
+        column[0] = 99
+        self.assertEqual( self.stats[0,2], 99 )
+
+    def test_copy_assign_and_round_trip_through_arrays(self):
+
+        self.stats[:,2] = [1,2,3,4,5,6]
+        copy = self.stats.copy()
+        self.stats[:,2] = 0
+        self.stats.assign(copy)
+        np.testing.assert_array_equal( self.stats[:,2], [1,2,3,4,5,6] )
+
+        arrays = stats_to_arrays('stats',self.stats,self.stats_list)
+        self.assertEqual( sorted(arrays), ['stats.ALIVE','stats.HP','stats.SIDE'] )
+        rebuilt = stats_from_arrays('stats',arrays,self.stats_list)
+        np.testing.assert_array_equal( rebuilt.to_array(), self.stats.to_array() )
+        with self.assertRaises(Exception):
+            StatsTable([np.zeros(3),np.zeros(4)])
@@ -0,0 +1,75 @@
+import enum
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.stencil import StencilRule, SquareStencil, VON_NEUMANN, MOORE
+
+def life(current,neighbors):
+    return ((neighbors==3) | ((current==1) & (neighbors==2))).astype(current.dtype)
+
+class TestSquareStencil(unittest.TestCase):
+
+    def setUp(self):
+
+        self.STAT = enum.IntEnum('StatsEnum', {'ALIVE':0,'FIRE':1,'FUEL':2})
+        self.tile = np.zeros((8,8,3))
+
+    def test_neighborhoods(self):
+
+        plane = np.arange(16).reshape(4,4)
+        np.testing.assert_array_equal( StencilRule('A',kernel=VON_NEUMANN).neighborhood(plane,0,2,0,2), [[5,7],[13,20]] )
+        np.testing.assert_array_equal( StencilRule('A',reduce='max').neighborhood(plane,2,4,2,4), [[15,15],[15,14]] )
+        np.testing.assert_array_equal( StencilRule('A',reduce='min',fill=99).neighborhood(plane,0,1,0,4), [[1,0,1,2]] )
+        with self.assertRaises(Exception):
+            StencilRule('A',reduce='mean')
+
+    def test_game_of_life_blinker(self):
+
+        self.tile[3,2:5,self.STAT.ALIVE] = 1
+        stencil = SquareStencil([StencilRule('ALIVE',combine=life)])
+        tile, changed = stencil.step(self.tile,self.STAT)
+        np.testing.assert_array_equal( np.argwhere(tile[:,:,self.STAT.ALIVE]), [[2,3],[3,3],[4,3]] )
+        self.assertEqual( changed, (2,5,2,5) )
+        np.testing.assert_array_equal( self.tile[3,2:5,self.STAT.ALIVE], [1,1,1] ) # the old front buffer is untouched
+        tile, _ = stencil.step(tile,self.STAT)
+        np.testing.assert_array_equal( np.argwhere(tile[:,:,self.STAT.ALIVE]), [[3,2],[3,3],[3,4]] )
+
+    def test_fire_spreads_only_onto_fuel(self):
+
+        self.tile[:,:4,self.STAT.FUEL] = 1
+        self.tile[0,0,self.STAT.FIRE] = 1
+        stencil = SquareStencil([StencilRule('FIRE',kernel=VON_NEUMANN,reduce='max',threshold=1,value=1,where='FUEL')])
+        tile = self.tile
+        for _ in range(20):
+            tile, _ = stencil.step(tile,self.STAT)
+        np.testing.assert_array_equal( tile[:,:,self.STAT.FIRE], tile[:,:,self.STAT.FUEL] )
+
+    def test_dirty_tracking_matches_full_updates(self):
+
+        rng = np.random.default_rng(1)
+        self.tile[:,:,self.STAT.ALIVE] = rng.random((8,8))<0.4
+        rules = [StencilRule('ALIVE',combine=life)]
+        full, dirty = SquareStencil(rules), SquareStencil(rules,track_dirty=True)
+        a, b = self.tile.copy(), self.tile.copy()
+        for tick in range(30):
+            if tick==10:
+                for tile,stencil in ((a,full),(b,dirty)):
+                    tile[0:3,0:3,self.STAT.ALIVE] = [[0,1,0],[0,0,1],[1,1,1]]
+                    stencil.mark_dirty([0,2],[0,2])
+            a, _ = full.step(a,self.STAT)
+            b, changed = dirty.step(b,self.STAT)
+            np.testing.assert_array_equal( a, b )
+
+        # once a world settles nothing is updated at all
+        still = np.zeros((8,8,3))
+        still[1:3,1:3,self.STAT.ALIVE] = 1
+        dirty = SquareStencil(rules,track_dirty=True)
+        still, changed = dirty.step(still,self.STAT)
+        self.assertIsNone( changed )
+        self.assertIsNone( dirty._window(8,8) )
+
+    def test_in_place(self):
+
+        self.tile[3,2:5,self.STAT.ALIVE] = 1
+        tile, _ = SquareStencil([StencilRule('ALIVE',combine=life)]).step(self.tile,self.STAT,in_place=True)
+        self.assertIs( tile, self.tile )
+        np.testing.assert_array_equal( self.tile[2:5,3,self.STAT.ALIVE], [1,1,1] )
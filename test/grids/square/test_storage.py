@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.storage import save_arrays, open_arrays
+from src.meshgrid.grids.square.tile import SquareTileGrid2D
+from src.meshgrid.shape.square import SquareShapeManager
+
+class TestStorage(unittest.TestCase):
+
+    def test_arrays_round_trip_as_memory_maps(self):
+
+        board = np.arange(12,dtype=np.int32).reshape(3,4)
+        stats = np.ones((5,2),dtype=np.int16)
+        with tempfile.TemporaryDirectory() as path:
+            save_arrays(path,{'grid':'Example'},{'board':board,'stats':stats})
+            self.assertTrue( os.path.exists(os.path.join(path,'header.json')) )
+
+            header,arrays = open_arrays(path)
+            self.assertEqual( header['grid'], 'Example' )
+            self.assertEqual( header['arrays']['stats'], {'shape':[5,2],'dtype':stats.dtype.str} )
+            self.assertIsInstance( arrays['board'], np.memmap )
+            np.testing.assert_array_equal( arrays['board'], board )
+            self.assertEqual( arrays['stats'].dtype, np.int16 )
+            with self.assertRaises(Exception):
+                open_arrays(path,mode='w')
+            del arrays
+
+    def test_tile_grid_save_and_open(self):
+
+        shape_manager = SquareShapeManager([np.ones((1,1),dtype=bool)])
+        grid = SquareTileGrid2D(4,3,shape_manager,['HEIGHT','WATER'])
+        grid.tile[...,grid.STAT.WATER] = 2.5
+        with tempfile.TemporaryDirectory() as path:
+            grid.save(path)
+            writer = SquareTileGrid2D.open(path,shape_manager,mode='r+')
+            writer.tile[1,2,writer.STAT.HEIGHT] = 7
+            writer.flush()
+
+            reader = SquareTileGrid2D.open(path,shape_manager)
+            self.assertEqual( reader.tile.shape, (3,4,2) )
+            self.assertEqual( reader.tile[1,2,reader.STAT.HEIGHT], 7 )
+            self.assertEqual( reader.tile[0,0,reader.STAT.WATER], 2.5 )
+            del writer, reader
+
+    def test_tile_grid_with_per_stat_dtypes(self):
+
+        shape_manager = SquareShapeManager([np.ones((1,1),dtype=bool)])
+        grid = SquareTileGrid2D(4,3,shape_manager,[('WALL',np.bool_),'HEIGHT',('TERRAIN',np.uint8)])
+        self.assertEqual( grid.tile.nbytes, 12*(1+8+1) )
+        grid.tile[0,1,grid.STAT.WALL] = True
+        grid.tile[...,grid.STAT.TERRAIN] = 3
+        with tempfile.TemporaryDirectory() as path:
+            grid.save(path)
+            reader = SquareTileGrid2D.open(path,shape_manager)
+            self.assertEqual( reader.tile.dtypes, grid.tile.dtypes )
+            self.assertTrue( reader.tile[0,1,reader.STAT.WALL] )
+            np.testing.assert_array_equal( reader.tile[2,3], [0,0,3] )
+            del reader
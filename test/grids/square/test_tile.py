@@ -1,8 +1,7 @@
-# TODO: This is a placeholder file until Tile Grids have functionality to test 
-
 import unittest
 import numpy as np
 from src.meshgrid.grids.square.tile import SquareTileGrid2D
+from src.meshgrid.grids.square.stencil import StencilRule
 from src.meshgrid.shape.square import SquareShapeManager
 
 class TestSquareTileGrid2D(unittest.TestCase):
@@ -18,9 +17,26 @@ class TestSquareTileGrid2D(unittest.TestCase):
         self.grid = SquareTileGrid2D(
             grid_width = 5,
             grid_height = 5,
-            max_units = 5,
             shape_manager = self.shape_manager,
-            stats_list = []
+            stats_list = ['HEAT',('WALL',np.bool_)]
         )
 
-        self.grid.tiles[:] = -1
\ No newline at end of file
+    def test_step_stencil(self):
+
+        with self.assertRaises(Exception):
+            self.grid.step_stencil()
+        with self.assertRaises(Exception):
+            self.grid.enable_stencil([StencilRule('FIRE')])
+
+        # heat spreads out evenly, except into walls
+        blur = np.full((3,3),1/9)
+        walls_are_cold = StencilRule('HEAT',source='WALL',kernel=[[1]],threshold=1,value=0)
+        self.grid.enable_stencil([StencilRule('HEAT',kernel=blur),walls_are_cold],track_dirty=True)
+        self.grid.tile[:,2,self.grid.STAT.WALL] = True
+        self.grid.tile[2,0,self.grid.STAT.HEAT] = 9
+        self.grid.mark_dirty(2,0)
+        self.assertEqual( self.grid.step_stencil(), (1,4,0,2) )
+        np.testing.assert_allclose( self.grid.tile[1:4,0:3,self.grid.STAT.HEAT], [[1,1,0],[1,1,0],[1,1,0]] )
+        self.grid.step_stencil(ticks=10)
+        np.testing.assert_array_equal( self.grid.tile[:,2:,self.grid.STAT.HEAT], 0 )
+        self.assertTrue( self.grid.tile[:,:2,self.grid.STAT.HEAT].sum()>0 )
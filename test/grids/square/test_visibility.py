@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from src.meshgrid.grids.square.visibility import shadowcast, SquareFieldOfView
+
+class TestShadowcast(unittest.TestCase):
+
+    def setUp(self):
+
+        self.opaque = np.zeros((9,9),dtype=bool)
+        self.opaque[4,6] = True
+        self.opaque[1:3,1] = True
+
+    def test_walls_cast_shadows(self):
+
+        visible = shadowcast(self.opaque,4,4,radius=8)
+        self.assertTrue( visible[4,4] )
+        self.assertTrue( visible[4,6] )
+        self.assertFalse( visible[4,7] or visible[4,8] )
+        self.assertFalse( visible[0,0] )
+        self.assertTrue( visible[0,4] and visible[8,8] )
+
+    def test_radius(self):
+
+        visible = shadowcast(np.zeros((9,9),dtype=bool),4,4,radius=2)
+        self.assertEqual( visible.sum(), 13 )
+        self.assertTrue( visible[4,6] )
+        self.assertFalse( visible[6,6] )
+
+    def test_sight_is_symmetric(self):
+
+        rng = np.random.default_rng(0)
+        opaque = rng.random((12,12))<0.25
+        floor = np.argwhere(~opaque)
+        visible = { (i,j):shadowcast(opaque,i,j,radius=6) for i,j in floor }
+        for a in visible:
+            for b in visible:
+                self.assertEqual( visible[a][b], visible[b][a] )
+
+class TestSquareFieldOfView(unittest.TestCase):
+
+    def test_invalidate_only_drops_nearby_results(self):
+
+        fov = SquareFieldOfView(3)
+        fov.store((0,0,0),0,0,np.ones((4,4),dtype=bool))
+        fov.store((10,10,0),7,7,np.ones((7,7),dtype=bool))
+        self.assertEqual( len(fov), 2 )
+        fov.invalidate([],[])
+        fov.invalidate([7,2],[8,7])
+        self.assertEqual( len(fov), 1 )
+        self.assertIsNone( fov.get((10,10,0)) )
+        self.assertEqual( fov.get((0,0,0))[:2], (0,0) )
+        fov.clear()
+        self.assertEqual( len(fov), 0 )
@@ -2,6 +2,7 @@ import enum
 import unittest
 import numpy as np
 from src.meshgrid.queueing.discrete import UnitIDOrderedTurnQueue
+from src.meshgrid.grids.square.stats import make_stats
 
 class TestUnitIDOrderedTurnQueue(unittest.TestCase):
 
@@ -29,4 +30,38 @@ class TestUnitIDOrderedTurnQueue(unittest.TestCase):
             for _ in range(queue_length): # pop until empty
                 self.queue_obj.pop()
                 print( self.queue_obj )
-                self.assertGreater( len(self.queue_obj), 0 )
\ No newline at end of file
+                self.assertGreater( len(self.queue_obj), 0 )
+
+    def test_works_with_stats_tables(self):
+
+        STAT_ENUM = enum.IntEnum('StatsEnum', {'HP':0,'ALIVE':1})
+        stats = make_stats((4,),[('HP',np.int16),('ALIVE',np.bool_)],np.int32)
+        stats[:,STAT_ENUM.ALIVE] = [True,False,True,True]
+        queue = UnitIDOrderedTurnQueue(stats,STAT_ENUM)
+        self.assertEqual( [ queue.pop() for _ in range(4) ], [0,2,3,0] )
+
+    def test_pop_many_skips_dead_units(self):
+
+        self.queue_obj.stats[[1,4,5,6,7],self.queue_obj.STAT.ALIVE] = 0
+        np.testing.assert_array_equal( self.queue_obj.pop_many(3), [0,2,3] )
+        self.assertEqual( len(self.queue_obj), 2 )
+        self.queue_obj.stats[8,self.queue_obj.STAT.ALIVE] = 0 # units that die mid-round lose their turn
+        self.assertEqual( self.queue_obj.pop(), 9 )
+        np.testing.assert_array_equal( self.queue_obj.pop_many(4), [0,2,3,9] )
+
+    def test_pop_with_no_living_units(self):
+
+        self.queue_obj.stats[:,self.queue_obj.STAT.ALIVE] = 0
+        with self.assertRaises(Exception):
+            self.queue_obj.pop()
+
+    def test_long_runs_of_dead_units(self):
+
+        STAT_ENUM = enum.IntEnum('StatsEnum', {'ALIVE':0})
+        stats = np.zeros((100000,1))
+        stats[[5,99999],STAT_ENUM.ALIVE] = 1
+        queue = UnitIDOrderedTurnQueue(stats,STAT_ENUM)
+        self.assertEqual( queue.pop(), 5 )
+        stats[:,STAT_ENUM.ALIVE] = 1
+        stats[5:99999,STAT_ENUM.ALIVE] = 0
+        np.testing.assert_array_equal( queue.pop_many(3), [99999,0,1] )
@@ -0,0 +1,53 @@
+import enum
+import unittest
+import numpy as np
+from src.meshgrid.queueing.phase import PhaseTurnQueue, first_claims
+
+class TestPhaseTurnQueue(unittest.TestCase):
+
+    def setUp(self):
+
+        self.STAT = enum.IntEnum('StatsEnum', {'ALIVE':0,'SIDE':1,'INITIATIVE':2})
+        self.stats = np.ones((6,3),dtype=np.int32)
+        self.stats[:,self.STAT.SIDE] = [0,1,0,1,0,1]
+        self.stats[:,self.STAT.INITIATIVE] = [3,9,12,4,3,15]
+        self.queue_obj = PhaseTurnQueue(self.stats,self.STAT)
+
+    def test_requires_stats(self):
+
+        with self.assertRaises(Exception):
+            PhaseTurnQueue(self.stats,self.STAT,priority_stat='SPEED')
+
+    def test_phases_by_side(self):
+
+        np.testing.assert_array_equal( self.queue_obj.pop(), [0,2,4] )
+        self.assertEqual( self.queue_obj.phase, 0 )
+        self.assertEqual( len(self.queue_obj), 1 )
+        self.stats[3,self.STAT.ALIVE] = 0 # units that die before their phase lose their turn
+        np.testing.assert_array_equal( self.queue_obj.pop(), [1,5] )
+        np.testing.assert_array_equal( self.queue_obj.pop(), [0,2,4] )
+
+        # phases whose units all died are skipped
+        self.stats[[1,5],self.STAT.ALIVE] = 0
+        np.testing.assert_array_equal( self.queue_obj.pop(), [0,2,4] )
+        self.assertEqual( self.queue_obj.phase, 0 )
+
+        self.stats[:,self.STAT.ALIVE] = 0
+        with self.assertRaises(Exception):
+            self.queue_obj.pop()
+
+    def test_initiative_buckets_and_priority(self):
+
+        queue = PhaseTurnQueue(self.stats,self.STAT,group_stat='INITIATIVE',bucket_size=5,descending=True,priority_stat='INITIATIVE')
+        phases = [ queue.pop() for _ in range(3) ]
+        np.testing.assert_array_equal( phases[0], [5] )
+        np.testing.assert_array_equal( phases[1], [2] )
+        np.testing.assert_array_equal( phases[2], [1] )
+        np.testing.assert_array_equal( queue.pop(), [3,0,4] ) # ties are broken by unit ID
+        self.assertEqual( queue.phase, 0 )
+
+    def test_first_claims(self):
+
+        np.testing.assert_array_equal( first_claims([7,3,7,1,3]), [True,True,False,True,False] )
+        np.testing.assert_array_equal( first_claims([[0,1],[1,0],[0,1]]), [True,True,False] )
+        self.assertEqual( first_claims([]).shape, (0,) )
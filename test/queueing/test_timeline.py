@@ -0,0 +1,57 @@
+import enum
+import unittest
+import numpy as np
+from src.meshgrid.queueing.timeline import TimelineTurnQueue
+
+class TestTimelineTurnQueue(unittest.TestCase):
+
+    def setUp(self):
+
+        self.STAT = enum.IntEnum('StatsEnum', {'ALIVE':0,'SPEED':1})
+        self.stats = np.ones((4,2))
+        self.stats[:,self.STAT.SPEED] = [1,2,1,4]
+        self.queue_obj = TimelineTurnQueue(self.stats,self.STAT)
+
+    def test_requires_stats(self):
+
+        with self.assertRaises(Exception):
+            TimelineTurnQueue(self.stats,enum.IntEnum('StatsEnum', {'ALIVE':0}))
+        with self.assertRaises(Exception):
+            TimelineTurnQueue(self.stats,self.STAT,speed_stat='INITIATIVE')
+
+    def test_faster_units_act_more_often(self):
+
+        turns = self.queue_obj.pop_many(16)
+        np.testing.assert_array_equal( np.bincount(turns), [2,4,2,8] )
+        np.testing.assert_array_equal( turns[:4], [3,1,3,3] )
+        self.assertEqual( len(self.queue_obj), 4 )
+        self.assertEqual( self.queue_obj.now, 200 )
+
+    def test_dead_units_are_dropped_lazily(self):
+
+        self.queue_obj.pop()
+        self.stats[[1,3],self.STAT.ALIVE] = 0
+        np.testing.assert_array_equal( self.queue_obj.pop_many(4), [0,2,0,2] )
+        self.assertEqual( len(self.queue_obj), 2 )
+
+        # a unit that comes back to life has to be pushed again
+        self.stats[3,self.STAT.ALIVE] = 1
+        self.queue_obj.push(3)
+        self.assertEqual( self.queue_obj.pop(), 3 )
+
+        self.stats[:,self.STAT.ALIVE] = 0
+        with self.assertRaises(Exception):
+            self.queue_obj.pop()
+
+    def test_reschedule_after_a_speed_change(self):
+
+        self.assertEqual( self.queue_obj.pop(), 3 )  # unit #3 acts at 25, and is next due at 50
+        self.stats[0,self.STAT.SPEED] = 10           # unit #0 was due at 100, now it's due at 10 (but not before 25)
+        self.queue_obj.reschedule(0)
+        self.assertEqual( self.queue_obj.pop(), 0 )
+        self.assertEqual( self.queue_obj.now, 25 )
+        self.assertEqual( len(self.queue_obj), 4 )
+
+        self.stats[2,self.STAT.SPEED] = 0
+        with self.assertRaises(Exception):
+            self.queue_obj.reschedule(2)
@@ -0,0 +1,45 @@
+import unittest
+from src.meshgrid.search.transposition import TranspositionTable
+
+class TestTranspositionTable(unittest.TestCase):
+
+    def test_lru_eviction(self):
+
+        table = TranspositionTable(capacity=2,policy='lru')
+        table.store(10,'a')
+        table.store(11,'b')
+        self.assertEqual( table.lookup(10), 'a' ) # 11 is now the least recently used
+        table.store(12,'c')
+        self.assertEqual( len(table), 2 )
+        self.assertNotIn( 11, table )
+        self.assertEqual( table.lookup(11,default='missing'), 'missing' )
+        self.assertEqual( (table.lookup(10),table.lookup(12)), ('a','c') )
+
+    def test_depth_preferred_eviction(self):
+
+        table = TranspositionTable(capacity=4,policy='depth')
+        self.assertTrue( table.store(1,'shallow',depth=1) )
+        self.assertTrue( table.store(5,'deep',depth=3) )       # 5 shares a slot with 1
+        self.assertFalse( table.store(9,'shallower',depth=2) ) # the deeper result is kept
+        self.assertNotIn( 1, table )
+        self.assertEqual( table.lookup(5), 'deep' )
+        self.assertTrue( table.store(5,'updated',depth=0) )    # the same key is always replaced
+        self.assertEqual( table.lookup(5), 'updated' )
+        self.assertEqual( len(table), 1 )
+
+    def test_min_depth(self):
+
+        for policy in ['lru','depth']:
+            table = TranspositionTable(capacity=8,policy=policy)
+            table.store(2**63+7,'result',depth=2)
+            self.assertEqual( table.lookup(2**63+7,min_depth=2), 'result' )
+            self.assertIsNone( table.lookup(2**63+7,min_depth=3) )
+            table.clear()
+            self.assertEqual( len(table), 0 )
+
+    def test_invalid_arguments(self):
+
+        with self.assertRaises(Exception):
+            TranspositionTable(capacity=8,policy='fifo')
+        with self.assertRaises(Exception):
+            TranspositionTable(capacity=0)
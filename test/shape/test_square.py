@@ -0,0 +1,101 @@
+import unittest
+import numpy as np
+from src.meshgrid.shape.square import SquareShapeManager
+
+class TestSquareShapeManager(unittest.TestCase):
+
+    def setUp(self):
+
+        self.shapes = [
+            np.ones((1,1),dtype=bool),
+            np.ones((2,3),dtype=bool),
+            np.array([
+                [0,1],
+                [1,1],
+                [0,1],
+            ],dtype=bool),
+        ]
+        self.shape_manager = SquareShapeManager(self.shapes)
+
+    def test_footprints_match_shapes(self):
+
+        for shape_id,shape in enumerate(self.shapes):
+            si,sj,bbox = self.shape_manager.footprints[shape_id]
+            expected = np.zeros_like(shape)
+            expected[si,sj] = True
+            np.testing.assert_array_equal( expected, shape )
+            self.assertTrue( si.flags['C_CONTIGUOUS'] and sj.flags['C_CONTIGUOUS'] )
+            self.assertEqual( bbox, (si.min(),sj.min(),si.max(),sj.max()) )
+
+        self.assertEqual( self.shape_manager.footprints[2][2], (0,0,2,1) )
+        np.testing.assert_array_equal( self.shape_manager.bbox, [[0,0,0,0],[0,0,1,2],[0,0,2,1]] )
+
+    def test_gather_cells(self):
+
+        shape_ids = [2,0,2,1]
+        owner,si,sj = self.shape_manager.gather_cells(shape_ids)
+        for n,shape_id in enumerate(shape_ids):
+            expected_si,expected_sj,_ = self.shape_manager.footprints[shape_id]
+            np.testing.assert_array_equal( si[owner==n], expected_si )
+            np.testing.assert_array_equal( sj[owner==n], expected_sj )
+        self.assertEqual( owner.shape[0], 4+1+4+6 )
+
+    def test_edges_match_shifted_footprints(self):
+
+        for shape_id,shape in enumerate(self.shapes):
+            si,sj,_ = self.shape_manager.footprints[shape_id]
+            for d,(di,dj) in enumerate(self.shape_manager.DIRECTIONS):
+                enter_si,enter_sj,enter_bbox,leave_si,leave_sj = self.shape_manager.edges[shape_id][d]
+
+                # moving = (old footprint - leaving squares) + entering squares
+                before = set(zip(si,sj))
+                after = set(zip(si+di,sj+dj))
+                self.assertEqual( set(zip(enter_si,enter_sj)), after-before )
+                self.assertEqual( set(zip(leave_si,leave_sj)), before-after )
+                self.assertEqual( enter_bbox, (enter_si.min(),enter_sj.min(),enter_si.max(),enter_sj.max()) )
+
+        # a 2x3 rectangle moving right enters a single column of 2 squares
+        enter_si,enter_sj,_,leave_si,leave_sj = self.shape_manager.edges[1][self.shape_manager.DIRECTION_INDEX[(0,1)]]
+        np.testing.assert_array_equal( enter_sj, [3,3] )
+        np.testing.assert_array_equal( leave_sj, [0,0] )
+
+    def test_valid_anchors_matches_brute_force(self,trials=20):
+
+        for _ in range(trials):
+            free = np.random.rand(7,9)<.8
+            for shape_id,shape in enumerate(self.shapes):
+                expected = np.zeros_like(free)
+                for i in range(free.shape[0]-shape.shape[0]+1):
+                    for j in range(free.shape[1]-shape.shape[1]+1):
+                        expected[i,j] = free[i:i+shape.shape[0],j:j+shape.shape[1]][shape].all()
+                np.testing.assert_array_equal( self.shape_manager.valid_anchors(shape_id,free), expected )
+
+    def test_units_in_shape(self):
+
+        board = np.array([
+            [ 0, 0,-1, 2],
+            [ 0, 0,-1,-1],
+            [-1, 1, 1,-1],
+        ])
+        np.testing.assert_array_equal( self.shape_manager.units_in_shape(0,0,1,board), [0] ) # no repeats
+        np.testing.assert_array_equal( self.shape_manager.units_in_shape(1,0,1,board), [0,1] )
+        np.testing.assert_array_equal( self.shape_manager.units_in_shape(0,2,2,board), [2] )
+        np.testing.assert_array_equal( self.shape_manager.units_in_shape(1,1,2,board), [1] )
+        np.testing.assert_array_equal( self.shape_manager.units_in_shape(2,3,1,board), [] ) # mostly off the board
+        self.assertEqual( list(self.shape_manager.enumerate_shape_coords(2,2,2,board)), [(2,3)] )
+        ci,cj = self.shape_manager.shape_coords(2,2,2,board)
+        np.testing.assert_array_equal( ci, [2] )
+        np.testing.assert_array_equal( cj, [3] )
+
+    def test_units_in_shapes_matches_units_in_shape(self,trials=20):
+
+        for _ in range(trials):
+            board = np.random.randint(-1,6,size=(6,7))
+            i0 = np.random.randint(-2,7,size=15)
+            j0 = np.random.randint(-2,8,size=15)
+            shape_ids = np.random.randint(0,len(self.shapes),size=15)
+            offsets,unit_ids = self.shape_manager.units_in_shapes(i0,j0,shape_ids,board)
+            self.assertEqual( offsets.shape[0], 16 )
+            for k in range(15):
+                np.testing.assert_array_equal( unit_ids[offsets[k]:offsets[k+1]],
+                                               self.shape_manager.units_in_shape(i0[k],j0[k],shape_ids[k],board) )